@@ -0,0 +1,186 @@
+"""
+Checkpointer cho ReActGraph: lưu state của graph theo conversation (thread_id).
+
+Mỗi lượt chỉ cần thêm câu hỏi mới vào thread đã lưu thay vì dựng lại toàn bộ lịch sử từ
+collection `messages`; tool call và kết quả tool của các lượt trước cũng được giữ lại.
+Backend chọn bằng AGENT_CHECKPOINTER:
+- "memory" (mặc định): BoundedMemorySaver trong process, mất khi restart (khi đó lịch sử được nạp lại từ Mongo).
+  Giữ tối đa AGENT_CHECKPOINT_MAX_THREADS thread (LRU), thread không dùng quá AGENT_CHECKPOINT_TTL_SECONDS
+  bị xoá, và mỗi thread chỉ giữ checkpoint mới nhất
+- "sqlite": AsyncSqliteSaver, file tại AGENT_CHECKPOINT_SQLITE_PATH (cần langgraph-checkpoint-sqlite)
+- "mongodb": AsyncMongoDBSaver trên MONGODB_URL (cần langgraph-checkpoint-mongodb)
+- "none": không lưu state
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = logging.getLogger(__name__)
+
+# Số message tối đa giữ trong state của một thread
+MAX_STATE_MESSAGES = int(os.environ.get("AGENT_MAX_STATE_MESSAGES", "40"))
+# Id (và name) của message chứa bản tóm tắt hội thoại: bản mới ghi đè bản cũ tại chỗ trong state
+SUMMARY_MESSAGE_ID = "conversation_summary"
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver có giới hạn: LRU + TTL theo thread_id, mỗi thread chỉ giữ checkpoint mới nhất."""
+
+    def __init__(self, max_threads: int = 1000, ttl_seconds: float = 86400.0, **kwargs):
+        """
+        Args:
+            max_threads: Số thread tối đa giữ state, thread dùng lâu nhất bị xoá trước
+            ttl_seconds: Thread không được đọc/ghi trong khoảng này bị xoá
+        """
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    def _drop_thread(self, thread_id: str) -> None:
+        # Như delete_thread của các bản langgraph mới (bản được pin chưa chắc có)
+        self.storage.pop(thread_id, None)
+        for key in [k for k in self.writes if k[0] == thread_id]:
+            del self.writes[key]
+        for key in [k for k in self.blobs if k[0] == thread_id]:
+            del self.blobs[key]
+
+    def _is_expired(self, thread_id: str, now: float) -> bool:
+        last_used = self._last_used.get(thread_id)
+        return last_used is not None and now - last_used > self.ttl_seconds
+
+    def _touch(self, thread_id: str) -> None:
+        now = time.time()
+        with self._lru_lock:
+            self._last_used[thread_id] = now
+            self._last_used.move_to_end(thread_id)
+            evicted = [t for t in self._last_used if self._is_expired(t, now)]
+            for t in evicted:
+                del self._last_used[t]
+            while len(self._last_used) > self.max_threads:
+                evicted.append(self._last_used.popitem(last=False)[0])
+        for t in evicted:
+            self._drop_thread(t)
+            logger.info(f"Evicted checkpoint of thread {t}")
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, channel_versions: dict) -> None:
+        """Bỏ các checkpoint cũ của thread, chỉ giữ checkpoint vừa ghi và blob nó tham chiếu."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for old_id in [i for i in checkpoints if i != checkpoint_id]:
+            del checkpoints[old_id]
+            self.writes.pop((thread_id, checkpoint_ns, old_id), None)
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns
+                    and channel_versions.get(k[2]) != k[3]]:
+            del self.blobs[key]
+
+    def get_tuple(self, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        # storage là defaultdict: không đọc thread chưa có để tránh tạo entry rỗng cho mỗi lần kiểm tra
+        if thread_id not in self.storage:
+            return None
+        with self._lru_lock:
+            expired = self._is_expired(thread_id, time.time())
+        if expired:
+            with self._lru_lock:
+                self._last_used.pop(thread_id, None)
+            self._drop_thread(thread_id)
+            return None
+        self._touch(thread_id)
+        return super().get_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        self._prune(thread_id, config["configurable"]["checkpoint_ns"], checkpoint["id"],
+                    checkpoint["channel_versions"])
+        self._touch(thread_id)
+        return next_config
+
+
+def _create_memory_saver() -> BaseCheckpointSaver:
+    return BoundedMemorySaver(max_threads=int(os.environ.get("AGENT_CHECKPOINT_MAX_THREADS", "1000")),
+                              ttl_seconds=float(os.environ.get("AGENT_CHECKPOINT_TTL_SECONDS", "86400")))
+
+
+def _create_sqlite_saver() -> BaseCheckpointSaver:
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    path = os.environ.get("AGENT_CHECKPOINT_SQLITE_PATH", "./checkpoints/agent.sqlite")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Kết nối được mở lần đầu khi saver được dùng (AsyncSqliteSaver.setup)
+    return AsyncSqliteSaver(aiosqlite.connect(path))
+
+
+def _create_mongodb_saver() -> BaseCheckpointSaver:
+    from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGODB_URL", "mongodb://localhost:27017"))
+    return AsyncMongoDBSaver(client, db_name=os.environ.get("MONGODB_DB_NAME", "ai_chat"))
+
+
+def create_checkpointer(kind: Optional[str] = None) -> Optional[BaseCheckpointSaver]:
+    """
+    Tạo checkpointer theo cấu hình.
+
+    Args:
+        kind: "memory", "sqlite", "mongodb" hoặc "none"; mặc định đọc từ AGENT_CHECKPOINTER
+
+    Returns:
+        Optional[BaseCheckpointSaver]: Checkpointer, hoặc None nếu tắt
+    """
+    kind = (kind or os.environ.get("AGENT_CHECKPOINTER", "memory")).lower()
+    if kind == "none":
+        return None
+    try:
+        if kind == "sqlite":
+            return _create_sqlite_saver()
+        if kind == "mongodb":
+            return _create_mongodb_saver()
+    except ImportError as e:
+        logger.warning(f"Checkpointer '{kind}' is not available ({e}), falling back to MemorySaver")
+    return _create_memory_saver()
+
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_created = False
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Checkpointer dùng chung trong process để state không mất khi ReActGraph được tạo lại."""
+    global _checkpointer, _checkpointer_created
+    if not _checkpointer_created:
+        _checkpointer = create_checkpointer()
+        _checkpointer_created = True
+    return _checkpointer
+
+
+def trim_state_messages(messages: Sequence[BaseMessage], max_messages: int = MAX_STATE_MESSAGES) -> List[RemoveMessage]:
+    """
+    Xoá các message cũ nhất khi state vượt quá giới hạn.
+
+    Điểm cắt luôn nằm ở một HumanMessage để không tách AIMessage có tool_calls khỏi ToolMessage
+    tương ứng (Gemini từ chối lịch sử có tool result mồ côi). Message tóm tắt (SUMMARY_MESSAGE_ID)
+    không bị xoá: các lượt bị cắt đã được gộp vào bản tóm tắt trong Mongo (backend.memory).
+
+    Returns:
+        List[RemoveMessage]: Các lệnh xoá dùng với reducer add_messages
+    """
+    if len(messages) <= max_messages:
+        return []
+    cut = len(messages) - max_messages
+    while cut < len(messages) - 1 and not isinstance(messages[cut], HumanMessage):
+        cut += 1
+    return [RemoveMessage(id=message.id) for message in messages[:cut]
+            if message.id and message.id != SUMMARY_MESSAGE_ID]
@@ -0,0 +1,122 @@
+"""
+Bộ phân loại local quyết định câu hỏi mới nhất có cần viết lại theo ngữ cảnh hội thoại hay không.
+
+summarize_conversation tốn một lượt gọi Gemini chỉ để biến câu hỏi thành câu độc lập.
+Phần lớn câu hỏi đã tự đủ nghĩa (có mã sinh viên, là câu hỏi đầu tiên sau lời chào, hoặc
+đủ dài và không có đại từ/cụm từ tham chiếu), khi đó có thể bỏ qua lượt gọi này. Các
+trường hợp không rõ ràng được quyết định bằng độ tương đồng embedding với lượt trước
+(bật bằng CONTEXTUALIZER_EMBEDDINGS=true), nếu không có embedding thì vẫn viết lại cho an toàn.
+"""
+import logging
+import math
+import os
+import re
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+# Không dùng \b: backend ghép "My student code is CT060110" liền với nội dung câu hỏi
+STUDENT_CODE_PATTERN = re.compile(r"(?<![A-Za-z0-9])[A-Za-z]{2}\d{6}(?!\d)")
+
+# Phần đầu backend (api/chat.py) ghép vào mọi câu hỏi của người dùng đã lưu mã sinh viên
+STUDENT_CODE_PREFIX = re.compile(r"^\s*My student code is [A-Za-z]{2}\d{6}", re.IGNORECASE)
+
+# Các cụm từ cho thấy câu hỏi tham chiếu tới lượt trước (so khớp trên chuỗi đã bỏ dấu)
+FOLLOW_UP_PATTERNS = [
+    r"\b(do|nay|kia|ay|tren)\b\s*[?.!]*$",
+    r"\b(mon|ky|hoc ky|nam|ban|sinh vien|quy dinh|dieu|diem) (do|nay|kia|ay|tren)\b",
+    r"\bthe con\b", r"\bcon\b.*\bthi sao\b", r"\bthi sao\b", r"\bcai do\b", r"\bnhu vay\b",
+    r"\bnhu tren\b", r"\bvua roi\b", r"\bvua noi\b", r"\bcau truoc\b", r"\bnguoi do\b",
+    r"\b(no|ban ay|anh ay|chi ay)\b",
+    r"\b(it|its|that|those|these|them|they|he|she|his|her)\b", r"\bwhat about\b", r"\bhow about\b",
+    r"^(and|also|then|va|con)\b",
+]
+_FOLLOW_UP_RE = re.compile("|".join(FOLLOW_UP_PATTERNS))
+
+GREETING_PATTERN = re.compile(
+    r"^(xin chao|chao|hello|hi|hey|alo|cam on|thanks|thank you|ok|oke|okay)\b[\s\w]{0,20}[.!?]*$")
+
+MIN_STANDALONE_WORDS = int(os.environ.get("CONTEXTUALIZER_MIN_WORDS", "6"))
+MIN_AMBIGUOUS_WORDS = 3
+SIMILARITY_THRESHOLD = float(os.environ.get("CONTEXTUALIZER_SIMILARITY_THRESHOLD", "0.6"))
+
+
+def fold_text(text: str) -> str:
+    """Bỏ dấu tiếng Việt, chuyển chữ thường và gộp khoảng trắng."""
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def user_text(message: BaseMessage) -> str:
+    """Nội dung người dùng gõ, bỏ phần mã sinh viên do backend ghép vào đầu câu hỏi."""
+    return STUDENT_CODE_PREFIX.sub("", str(message.content)).strip()
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class QueryContextualizer:
+    """Quyết định có cần gọi LLM để viết lại câu hỏi theo lịch sử hội thoại hay không."""
+
+    def __init__(self, embeddings: Optional[Embeddings] = None):
+        self.embeddings = embeddings
+
+    def needs_contextualization(self, messages: List[BaseMessage]) -> Tuple[bool, str]:
+        """
+        Args:
+            messages: Lịch sử hội thoại, phần tử cuối là câu hỏi mới nhất
+
+        Returns:
+            Tuple[bool, str]: (có cần viết lại hay không, lý do để log/trace)
+        """
+        if not messages:
+            return False, "empty"
+        # Mã sinh viên trong phần đầu do backend ghép không cho biết câu hỏi có tự đủ nghĩa hay không
+        latest_text = user_text(messages[-1])
+        latest = fold_text(latest_text)
+        history = [m for m in messages[:-1] if isinstance(m, (HumanMessage, AIMessage)) and m.content]
+        if not history:
+            return False, "no_history"
+        if all(GREETING_PATTERN.match(fold_text(user_text(m))) for m in history if isinstance(m, HumanMessage)):
+            return False, "after_greeting"
+        if _FOLLOW_UP_RE.search(latest):
+            return True, "follow_up_marker"
+        if STUDENT_CODE_PATTERN.search(latest):
+            return False, "student_code"
+
+        words = len(latest.split())
+        if words >= MIN_STANDALONE_WORDS:
+            return False, "long_query"
+        if words < MIN_AMBIGUOUS_WORDS or self.embeddings is None:
+            return True, "short_query"
+        return self._embedding_decision(latest_text, history)
+
+    def _embedding_decision(self, latest: str, history: List[BaseMessage]) -> Tuple[bool, str]:
+        try:
+            previous = str(history[-1].content)[:1000]
+            latest_vector, previous_vector = self.embeddings.embed_documents([latest, previous])
+            similarity = _cosine(latest_vector, previous_vector)
+        except Exception as e:
+            logger.warning(f"Contextualizer embedding failed, falling back to rewrite: {e}")
+            return True, "embedding_error"
+        # Câu ngắn nhưng gần nghĩa với lượt trước thường là câu hỏi nối tiếp
+        return (True, "similar_to_previous") if similarity >= SIMILARITY_THRESHOLD else (False, "unrelated_to_previous")
+
+
+def _create_contextualizer() -> QueryContextualizer:
+    embeddings = None
+    if os.environ.get("CONTEXTUALIZER_EMBEDDINGS", "false").lower() in ("1", "true", "yes"):
+        from llm.llm_factory import LLMFactory
+        embeddings = LLMFactory.create_embeddings()
+    return QueryContextualizer(embeddings)
+
+
+contextualizer = _create_contextualizer()
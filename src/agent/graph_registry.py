@@ -0,0 +1,93 @@
+"""
+Registry các LangGraph graph đã compile.
+
+Mỗi graph chỉ được compile một lần trong process và được dùng lại khi ReActGraph hay
+KMAChatAgent được tạo lại (ví dụ khi rebuild chỉ mục RAG): node của graph không giữ state
+riêng của instance, instance cần dùng được truyền qua config lúc invoke. Sơ đồ Mermaid
+không còn được sinh khi khởi động mà chỉ qua lệnh:
+
+    python -m agent.graph_registry [--out-dir mermaid]
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import typer
+
+logger = logging.getLogger(__name__)
+
+MERMAID_DIR = Path(__file__).parent.parent.parent.absolute() / "mermaid"
+
+
+class GraphRegistry:
+    """Cache graph đã compile theo key (tên graph và cấu hình compile)."""
+
+    def __init__(self):
+        self._graphs: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compile(self, key: Hashable, builder: Callable[[], Any]) -> Any:
+        """
+        Lấy graph đã compile, hoặc gọi builder để compile nếu chưa có.
+
+        Args:
+            key: Khoá của graph, ví dụ ("react", id(checkpointer))
+            builder: Hàm trả về graph đã compile
+
+        Returns:
+            Graph đã compile (CompiledStateGraph)
+        """
+        graph = self._graphs.get(key)
+        if graph is not None:
+            return graph
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is None:
+                logger.info(f"Compiling graph {key}")
+                graph = builder()
+                self._graphs[key] = graph
+        return graph
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Xoá một graph (hoặc toàn bộ) để lần dùng tiếp theo compile lại."""
+        with self._lock:
+            if key is None:
+                self._graphs.clear()
+            else:
+                self._graphs.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._graphs)
+
+
+graph_registry = GraphRegistry()
+
+
+def write_mermaid(graph: Any, path: Path) -> str:
+    """Sinh sơ đồ Mermaid của graph và ghi ra file."""
+    mermaid_diagram = graph.get_graph().draw_mermaid()
+    os.makedirs(path.parent, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(mermaid_diagram)
+    return mermaid_diagram
+
+
+cli = typer.Typer()
+
+
+@cli.command()
+def render(out_dir: Path = MERMAID_DIR):
+    """Render the Mermaid diagrams of the agent graphs"""
+    from agent.supervisor_agent import build_react_graph
+    from rag.rag_graph import build_rag_graph
+
+    for name, graph in (("react_mermaid.mmd", build_react_graph()), ("rag_mermaid.mmd", build_rag_graph())):
+        write_mermaid(graph, out_dir / name)
+        typer.echo(f"Saved {out_dir / name}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,142 @@
+"""
+Định tuyến ý định ở đầu ReActGraph cho các yêu cầu tra cứu trực tiếp.
+
+Nhiều câu hỏi chỉ tương ứng với một hành động cố định: "điểm của tôi kỳ 1 2024-2025" khi đã
+có mã sinh viên, "điểm trung bình của CT060110", hay một câu hỏi thuần về quy định. Với các
+câu này, router gọi thẳng tool (get_student_scores, get_student_gpa, RAG) rồi để
+node agent chỉ còn một lượt LLM để diễn đạt câu trả lời; câu hỏi quy định trả về luôn câu
+trả lời của RAG. Câu hỏi không khớp rõ ràng một ý định hoặc cần ngữ cảnh hội thoại vẫn đi
+qua vòng summarize → agent → action như cũ.
+"""
+import logging
+import os
+import re
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from agent.contextualizer import STUDENT_CODE_PATTERN, STUDENT_CODE_PREFIX, contextualizer, fold_text
+
+logger = logging.getLogger(__name__)
+
+# "ky 1 2024-2025", "hoc ki 2 nam 2023 - 2024", "ki1-2024-2025", "semester 1 2024/2025"
+SEMESTER_PATTERN = re.compile(r"\b(?:hoc )?(?:ky|ki|k|semester)\s*([12])\D{0,12}?(\d{4})\s*[-/]\s*(\d{4})\b")
+
+GPA_KEYWORDS = ("diem trung binh", "trung binh tich luy", "gpa", "cpa", "average score", "average grade")
+SCORE_KEYWORDS = ("diem", "bang diem", "ket qua hoc tap", "score", "grade", "transcript")
+INFO_KEYWORDS = ("thong tin sinh vien", "thong tin cua", "ho ten", "ho va ten", "lop nao", "student info",
+                 "information")
+REGULATION_KEYWORDS = ("quy dinh", "quy che", "chinh sach", "hoc phi", "tot nghiep", "hoc bong", "ky luat",
+                       "canh bao hoc tap", "thoi hoc", "tin chi toi thieu", "dang ky hoc", "regulation",
+                       "policy", "tuition", "scholarship", "graduation")
+
+
+@dataclass
+class Intent:
+    """Kết quả định tuyến: tên ý định và tham số đã trích xuất."""
+    name: str
+    reason: str
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+def _has_any(text: str, keywords) -> bool:
+    return any(re.search(rf"\b{re.escape(k)}\b", text) for k in keywords)
+
+
+def may_need_regulations(query: str) -> bool:
+    """Câu hỏi có thể dẫn tới tool RAG: không phải tra cứu điểm/thông tin của một sinh viên cụ thể."""
+    text = fold_text(STUDENT_CODE_PATTERN.sub(lambda m: f" {m.group(0)} ", query))
+    if _has_any(text, REGULATION_KEYWORDS):
+        return True
+    return not (STUDENT_CODE_PATTERN.search(query) and _has_any(text, GPA_KEYWORDS + SCORE_KEYWORDS + INFO_KEYWORDS))
+
+
+def is_router_enabled() -> bool:
+    return os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class IntentRouter:
+    """Phân loại câu hỏi bằng pattern và thực thi trực tiếp tool tương ứng."""
+
+    def classify(self, messages: List[BaseMessage]) -> Intent:
+        """
+        Args:
+            messages: Lịch sử hội thoại, phần tử cuối là câu hỏi mới nhất
+
+        Returns:
+            Intent: "scores", "gpa", "student_info", "regulation" hoặc "agent" (đi vòng ReAct)
+        """
+        if not messages:
+            return Intent("agent", "empty")
+        needs_context, reason = contextualizer.needs_contextualization(list(messages))
+        if needs_context:
+            return Intent("agent", f"needs_context:{reason}")
+
+        raw = str(messages[-1].content)
+        # Tách mã sinh viên khỏi chữ liền sau (backend ghép "My student code is ..." không có khoảng trắng)
+        text = fold_text(STUDENT_CODE_PATTERN.sub(lambda m: f" {m.group(0)} ", raw))
+        question = STUDENT_CODE_PREFIX.sub("", raw).strip()
+        code_match = STUDENT_CODE_PATTERN.search(raw)
+        student_code = code_match.group(0).upper() if code_match else None
+        semester_match = SEMESTER_PATTERN.search(text)
+        semester = (f"ki{semester_match.group(1)}-{semester_match.group(2)}-{semester_match.group(3)}"
+                    if semester_match else None)
+
+        candidates = []
+        if student_code and _has_any(text, GPA_KEYWORDS):
+            candidates.append(Intent("gpa", "gpa_keywords", {"student_code": student_code, "semester": semester}))
+        elif student_code and _has_any(text, SCORE_KEYWORDS):
+            candidates.append(Intent("scores", "score_keywords", {"student_code": student_code, "semester": semester}))
+        if student_code and _has_any(text, INFO_KEYWORDS):
+            candidates.append(Intent("student_info", "info_keywords", {"student_code": student_code}))
+        if _has_any(text, REGULATION_KEYWORDS) and not _has_any(text, GPA_KEYWORDS + SCORE_KEYWORDS):
+            candidates.append(Intent("regulation", "regulation_keywords", {"query": question}))
+
+        # Không khớp hoặc khớp nhiều ý định: để agent tự lập kế hoạch
+        if len(candidates) != 1:
+            return Intent("agent", "no_match" if not candidates else "ambiguous")
+        return candidates[0]
+
+    @staticmethod
+    async def _call(tools_by_name: Dict[str, BaseTool], name: str, args: Dict[str, Any],
+                    config: Optional[RunnableConfig]) -> List[BaseMessage]:
+        """Gọi một tool và trả về cặp AIMessage(tool_call) + ToolMessage như vòng ReAct tạo ra."""
+        call_id = f"route_{uuid.uuid4().hex[:12]}"
+        args = {k: v for k, v in args.items() if v is not None}
+        tool_call = AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+        try:
+            result = await tools_by_name[name].ainvoke(args, config)
+            content, status = (result if isinstance(result, str) else str(result)), "success"
+        except Exception as e:
+            content, status = f"Error: {repr(e)}", "error"
+        return [tool_call, ToolMessage(content=content, name=name, tool_call_id=call_id, status=status)]
+
+    async def dispatch(self, intent: Intent, tools_by_name: Dict[str, BaseTool],
+                       config: Optional[RunnableConfig] = None) -> List[BaseMessage]:
+        """
+        Thực thi tool cho ý định đã phân loại.
+
+        Returns:
+            List[BaseMessage]: Các message cần thêm vào state. Với câu hỏi quy định là câu trả lời
+            cuối cùng của RAG; với các ý định khác là cặp tool call/kết quả để agent diễn đạt.
+        """
+        if intent.name == "regulation":
+            messages = await self._call(tools_by_name, "search_kma_regulations", intent.args, config)
+            if messages[-1].status == "error" or str(messages[-1].content).startswith("Error"):
+                # RAG lỗi: trả lại kết quả tool để agent xử lý như vòng ReAct bình thường
+                return messages
+            return [AIMessage(content=messages[-1].content)]
+        if intent.name == "student_info":
+            return await self._call(tools_by_name, "get_student_info", intent.args, config)
+
+        if intent.name == "gpa":
+            # GPA tính sẵn bằng SQL, không phải đưa toàn bộ bảng điểm qua LLM
+            return await self._call(tools_by_name, "get_student_gpa", intent.args, config)
+        return await self._call(tools_by_name, "get_student_scores", intent.args, config)
+
+
+intent_router = IntentRouter()
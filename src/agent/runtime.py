@@ -0,0 +1,274 @@
+"""
+Agent runtime: toàn bộ thành phần phục vụ một cấu hình của agent.
+
+Mỗi AgentRuntime sở hữu retriever và KMAChatAgent của chỉ mục mình dùng, các LLM client,
+bộ tool (tool RAG gắn với chính runtime này) và tool executor. Graph đã compile được dùng
+chung (graph_registry), runtime được chọn cho từng request và truyền vào graph qua
+config["configurable"]["agent_runtime"]. Runtime được định danh bởi RuntimeKey (model,
+phiên bản chỉ mục, tenant) và giữ trong một LRU (AGENT_MAX_RUNTIMES), nên một process có
+thể phục vụ nhiều chỉ mục/model/tenant mà không phải nạp lại mỗi request. Khi chỉ mục được
+build lại, phiên bản chỉ mục đổi theo thời điểm ghi file và request tiếp theo dùng runtime mới.
+
+Tenant "default" dùng data/ và vector_db/ ở gốc project; tenant khác dùng
+<AGENT_TENANTS_DIR>/<tenant>/data và <AGENT_TENANTS_DIR>/<tenant>/vector_db.
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig
+
+from agent.tool_executor import ParallelToolExecutor
+from llm.config import LLMConfig, get_routed_llm
+from rag.prefetch import SpeculativeRAG, get_speculative_mode, prefetch_key
+from rag.rag_graph import KMAChatAgent
+from rag.retriever import create_hybrid_retriever
+from rag.tool import create_rag_tool, prefetch_regulations
+from score import (calculate_average_scores, get_class_scores, get_student_gpa, get_student_info,
+                   get_student_scores)
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_CONFIG_KEY = "agent_runtime"
+# Định danh riêng của mỗi lượt chạy graph: kết quả SpeculativeRAG chỉ dùng lại trong đúng lượt đó
+SPECULATION_SCOPE_CONFIG_KEY = "speculation_scope"
+DEFAULT_TENANT = "default"
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Load prompts
+prompts_dir = os.path.join(os.path.dirname(__file__), "prompts")
+with open(os.path.join(prompts_dir, "system_prompt.txt"), "r", encoding="utf-8") as f:
+    react_prompt = f.read().strip()
+
+
+def get_tool_descriptions(tools_list: list) -> str:
+    return "\n".join([
+        f"- {tool.name}: {tool.description} (args: {tool.args_schema.schema()['properties'].keys() if tool.args_schema else 'None'})"
+        for tool in tools_list])
+
+
+def index_paths(tenant: str) -> Tuple[Path, Path]:
+    """
+    Đường dẫn chỉ mục và dữ liệu của tenant.
+
+    Returns:
+        Tuple[Path, Path]: (thư mục vector_db, thư mục data)
+    """
+    if tenant == DEFAULT_TENANT:
+        return PROJECT_ROOT / "vector_db", PROJECT_ROOT / "data"
+    if not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant: {tenant}")
+    root = Path(os.environ.get("AGENT_TENANTS_DIR", PROJECT_ROOT / "tenants")) / tenant
+    return root / "vector_db", root / "data"
+
+
+def index_version(tenant: str) -> str:
+    """Phiên bản chỉ mục: thời điểm ghi file FAISS mới nhất, đổi sau mỗi lần build lại."""
+    vector_db_path, _ = index_paths(tenant)
+    mtimes = [path.stat().st_mtime_ns for path in (vector_db_path / "index.faiss", vector_db_path / "index.pkl")
+              if path.exists()]
+    return str(max(mtimes)) if mtimes else "missing"
+
+
+@dataclass
+class Speculation:
+    """Lượt chạy trước tool RAG gắn với một lượt LLM của agent."""
+    mode: str
+    query: str
+    scope: str
+    handle: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class RuntimeKey:
+    """Định danh cấu hình của một runtime."""
+    model: str
+    index: str
+    tenant: str = DEFAULT_TENANT
+
+
+class AgentRuntime:
+    """Retriever, LLM client, tool và tool executor của một cấu hình agent."""
+
+    def __init__(self, key: RuntimeKey):
+        """
+        Args:
+            key: Model, phiên bản chỉ mục và tenant của runtime
+        """
+        self.key = key
+        # Tool RAG gắn với runtime này; các tool tra cứu điểm/sinh viên không có state riêng
+        self.rag_tool = create_rag_tool(self)
+        self.tools = [get_student_scores, get_student_info, get_student_gpa, get_class_scores, calculate_average_scores,
+                      self.rag_tool]
+        self.tools_by_name = {tool.name: tool for tool in self.tools}
+        # Các tool call trong cùng một lượt được chạy song song, mỗi tool có deadline riêng
+        self.tool_node = ParallelToolExecutor(self.tools)
+
+        # System prefix dựng một lần cho runtime: giống hệt nhau ở mọi lượt nên provider có thể
+        # cache phần prefix (Gemini implicit caching, KV cache của Ollama)
+        self.system_prefix = react_prompt.format(tool_descriptions=get_tool_descriptions(self.tools))
+        self.agent_prompt = ChatPromptTemplate.from_messages(
+            [SystemMessage(content=self.system_prefix),
+             MessagesPlaceholder(variable_name="messages"), ])
+
+        self._rag_agent: Optional[KMAChatAgent] = None
+        self._agent_chain = None
+        self._speculative_rag: Optional[SpeculativeRAG] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_rag_agent(self) -> Optional[KMAChatAgent]:
+        """KMAChatAgent nếu đã được nạp, không tạo mới."""
+        return self._rag_agent
+
+    def get_rag_agent(self) -> KMAChatAgent:
+        """Tạo (lần đầu) KMAChatAgent với retriever của chỉ mục thuộc runtime."""
+        if self._rag_agent is None:
+            # Warmup và request đầu tiên có thể cùng gọi từ hai thread
+            with self._lock:
+                if self._rag_agent is None:
+                    vector_db_path, data_dir = index_paths(self.key.tenant)
+                    retriever, _ = create_hybrid_retriever(vector_db_path=str(vector_db_path), data_dir=str(data_dir))
+                    self._rag_agent = KMAChatAgent(model_name=self.key.model, custom_retriever=retriever)
+                    logger.info(f"Loaded RAG agent for runtime {self.key}")
+        return self._rag_agent
+
+    def get_agent_chain(self):
+        """Chain prompt | model đã bind tools của runtime, chỉ tạo một lần."""
+        if self._agent_chain is None:
+            self._agent_chain = self.agent_prompt | get_routed_llm(model_name=self.key.model).bind_tools(self.tools)
+        return self._agent_chain
+
+    def prefetch(self, query: str) -> None:
+        """Truy xuất suy đoán cho câu hỏi nếu RAG agent đã được nạp."""
+        prefetch_regulations(query, runtime=self)
+
+    def speculate(self, query: str, scope: Optional[str]) -> Optional[Speculation]:
+        """
+        Chạy trước tool RAG trên câu hỏi trong lúc agent LLM đang quyết định (RAG_SPECULATIVE_MODE).
+
+        Chỉ chạy khi RAG agent đã được nạp, để không chặn lượt LLM bằng việc nạp chỉ mục, và khi
+        lượt chạy có scope (speculation_scope), để câu trả lời không bị request khác lấy mất.
+        """
+        mode = get_speculative_mode()
+        agent = self._rag_agent
+        if mode == "off" or agent is None or scope is None or not prefetch_key(query):
+            return None
+        if mode == "retrieve":
+            agent.prefetcher.submit(query)
+            return Speculation(mode, query, scope)
+        if self._speculative_rag is None:
+            self._speculative_rag = SpeculativeRAG(agent.chat)
+        return Speculation(mode, query, scope, self._speculative_rag.start(query, scope))
+
+    def resolve_speculation(self, speculation: Optional[Speculation], response: BaseMessage) -> None:
+        """Giữ kết quả chạy trước nếu agent gọi tool RAG với đúng câu hỏi đó, nếu không thì huỷ."""
+        if speculation is None:
+            return
+        queries = [call["args"].get("query", "") for call in getattr(response, "tool_calls", None) or []
+                   if call["name"] == self.rag_tool.name]
+        if prefetch_key(speculation.query) in {prefetch_key(query) for query in queries}:
+            return
+        if speculation.mode == "retrieve":
+            if self._rag_agent is not None:
+                self._rag_agent.prefetcher.discard(speculation.query)
+        elif self._speculative_rag is not None:
+            self._speculative_rag.cancel(speculation.handle)
+
+    def claim_speculation(self, query: str, scope: Optional[str]):
+        """Future của câu trả lời RAG đã chạy trước cho đúng câu hỏi này trong lượt chạy scope, hoặc None."""
+        if self._speculative_rag is None or scope is None:
+            return None
+        return self._speculative_rag.claim(query, scope)
+
+    def warm_up(self) -> None:
+        """Nạp trước LLM client, retriever và corpus."""
+        self.get_agent_chain()
+        self.get_rag_agent()
+
+
+class RuntimeRegistry:
+    """LRU các runtime đang nóng, chọn theo (model, phiên bản chỉ mục, tenant)."""
+
+    def __init__(self, max_runtimes: int = 4):
+        """
+        Args:
+            max_runtimes: Số runtime tối đa giữ trong bộ nhớ, runtime dùng lâu nhất bị loại trước
+        """
+        self.max_runtimes = max_runtimes
+        self._runtimes: "OrderedDict[RuntimeKey, AgentRuntime]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, tenant: Optional[str] = None, model: Optional[str] = None) -> RuntimeKey:
+        tenant = tenant or DEFAULT_TENANT
+        # Tenant chưa có chỉ mục không được tạo runtime (mỗi runtime mới đẩy runtime đang nóng khỏi LRU)
+        if tenant != DEFAULT_TENANT and not index_paths(tenant)[0].is_dir():
+            raise ValueError(f"Tenant {tenant} has no index")
+        return RuntimeKey(model=model or LLMConfig.DEFAULT_GEMINI_MODEL, index=index_version(tenant), tenant=tenant)
+
+    def get(self, tenant: Optional[str] = None, model: Optional[str] = None) -> AgentRuntime:
+        """
+        Lấy runtime cho cấu hình hiện tại, tạo mới nếu chưa có.
+
+        Args:
+            tenant: Tenant của request, mặc định "default"
+            model: Tên model Gemini, mặc định LLMConfig.DEFAULT_GEMINI_MODEL
+
+        Returns:
+            AgentRuntime: Runtime của cấu hình; KMAChatAgent được nạp khi dùng lần đầu
+
+        Raises:
+            ValueError: Tên tenant không hợp lệ hoặc tenant chưa có thư mục vector_db
+        """
+        key = self.key_for(tenant, model)
+        with self._lock:
+            runtime = self._runtimes.get(key)
+            if runtime is None:
+                runtime = AgentRuntime(key)
+                self._runtimes[key] = runtime
+                # Runtime của phiên bản chỉ mục cũ không còn được chọn, bỏ đi ngay
+                for stale in [k for k in self._runtimes if k.tenant == key.tenant and k.model == key.model
+                              and k.index != key.index]:
+                    del self._runtimes[stale]
+                while len(self._runtimes) > self.max_runtimes:
+                    evicted, _ = self._runtimes.popitem(last=False)
+                    logger.info(f"Evicted agent runtime {evicted}")
+            self._runtimes.move_to_end(key)
+        return runtime
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """Bỏ các runtime của tenant (hoặc tất cả), ví dụ sau khi build lại chỉ mục."""
+        with self._lock:
+            for key in [k for k in self._runtimes if tenant is None or k.tenant == tenant]:
+                del self._runtimes[key]
+
+    def stats(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [{"model": k.model, "index": k.index, "tenant": k.tenant,
+                     "rag_loaded": str(r.loaded_rag_agent is not None).lower()} for k, r in self._runtimes.items()]
+
+
+runtime_registry = RuntimeRegistry(max_runtimes=int(os.environ.get("AGENT_MAX_RUNTIMES", "4")))
+
+
+def get_runtime(tenant: Optional[str] = None, model: Optional[str] = None) -> AgentRuntime:
+    return runtime_registry.get(tenant=tenant, model=model)
+
+
+def speculation_scope(config: Optional[RunnableConfig]) -> Optional[str]:
+    """Scope SpeculativeRAG của lượt chạy graph, None nếu caller không đặt."""
+    return ((config or {}).get("configurable") or {}).get(SPECULATION_SCOPE_CONFIG_KEY)
+
+
+def runtime_from_config(config: Optional[RunnableConfig]) -> AgentRuntime:
+    """Runtime được chọn cho lượt chạy graph, mặc định là runtime mặc định của process."""
+    runtime = ((config or {}).get("configurable") or {}).get(RUNTIME_CONFIG_KEY)
+    return runtime if runtime is not None else get_runtime()
@@ -8,3 +8,5 @@ from pydantic import BaseModel, Field
 # --- Định nghĩa State ---
 class MyAgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # Ý định do intent router phân loại cho lượt hiện tại (None: đi vòng ReAct đầy đủ)
+    intent: Optional[Dict[str, Any]]
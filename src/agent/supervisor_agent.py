@@ -1,18 +1,24 @@
+import asyncio
 import logging
 import os
-from pathlib import Path
-from typing import List
+import uuid
+import weakref
+from typing import List, Optional
 
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 
+from agent.checkpoint import get_checkpointer, trim_state_messages
+from agent.contextualizer import contextualizer
+from agent.graph_registry import MERMAID_DIR, graph_registry, write_mermaid
+from agent.intent_router import STUDENT_CODE_PREFIX, Intent, intent_router, is_router_enabled, may_need_regulations
+from agent.runtime import (RUNTIME_CONFIG_KEY, SPECULATION_SCOPE_CONFIG_KEY, AgentRuntime, get_runtime,
+                           runtime_from_config, speculation_scope)
 from agent.state import MyAgentState
 from llm.config import get_gemini_llm, get_llm
-from rag import create_rag_tool
-from score import get_student_scores, get_student_info, calculate_average_scores
+from telemetry import TracingCallbackHandler, increment, span
 
 load_dotenv()
 
@@ -20,26 +26,6 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Define tools
-score_tool = get_student_scores
-student_info_tool = get_student_info
-rag_tool = create_rag_tool()
-calculator_tool = calculate_average_scores
-
-# Get all tools
-tools = [score_tool, student_info_tool, calculator_tool, rag_tool]
-
-# Load prompts
-prompts_dir = os.path.join(os.path.dirname(__file__), "prompts")
-with open(os.path.join(prompts_dir, "system_prompt.txt"), "r", encoding="utf-8") as f:
-    react_prompt = f.read().strip()
-
-
-def get_tool_descriptions(tools_list: list) -> str:
-    return "\n".join([
-        f"- {tool.name}: {tool.description} (args: {tool.args_schema.schema()['properties'].keys() if tool.args_schema else 'None'})"
-        for tool in tools_list])
-
 # Query reformulation prompt
 conversational_prompt = """
     Given a chat history between an AI chatbot and user
@@ -59,7 +45,21 @@ conversational_prompt = """
     """
 
 
-async def summarize_conversation(state: MyAgentState) -> MyAgentState:
+def _prefetch_regulations(query: str, config: RunnableConfig) -> None:
+    """
+    Truy xuất suy đoán trên câu hỏi mà agent sẽ nhận (đã viết lại nếu cần), trong lúc agent LLM quyết định.
+
+    Câu hỏi gốc trước khi viết lại hiếm khi giống câu agent truyền cho tool RAG nên không prefetch.
+    """
+    if not isinstance(query, str) or not may_need_regulations(query):
+        return
+    try:
+        runtime_from_config(config).prefetch(query)
+    except Exception as e:
+        logger.warning(f"Speculative retrieval could not start: {e}")
+
+
+async def summarize_conversation(state: MyAgentState, config: RunnableConfig) -> MyAgentState:
     """
     Summarize conversation history to provide context for the next query.
     This helps the model understand the conversation flow.
@@ -71,9 +71,18 @@ async def summarize_conversation(state: MyAgentState) -> MyAgentState:
     # If there are fewer than 3 messages, no need to summarize
     if len(messages) < 1:
         return state
+
+    # Câu hỏi đã tự đủ nghĩa thì bỏ qua lượt gọi LLM viết lại
+    needs_rewrite, reason = contextualizer.needs_contextualization(list(messages))
+    increment(f"contextualizer.{'rewrite' if needs_rewrite else 'skip'}.{reason}")
+    if not needs_rewrite:
+        logger.info(f"--- AGENT: Skipping contextualization ({reason}) ---")
+        # Câu hỏi đi thẳng tới agent nên có thể truy xuất trước ngay
+        _prefetch_regulations(messages[-1].content, config)
+        return state
     
     # The conversational context prompt helps rewrite the latest query with context
-    llm = get_gemini_llm()
+    llm = get_gemini_llm(cache=True)
     
     # Format the chat history for the summarization prompt
     chat_history = []
@@ -97,49 +106,84 @@ async def summarize_conversation(state: MyAgentState) -> MyAgentState:
     
     # Invoke the rewriting prompt with the formatted chat history
     try:
-        standalone_query = llm.invoke(
+        standalone_query = await llm.ainvoke(
             conversational_prompt.format(
                 chat_history=chat_history_str,
                 question=latest_query
             )
         )
         
-        # Replace the latest message with the reformulated query
-        contextual_message = HumanMessage(content=standalone_query.content)
+        # Replace the latest message with the reformulated query (cùng id để add_messages thay thế tại chỗ)
+        contextual_message = HumanMessage(content=standalone_query.content, id=messages[-1].id)
+        _prefetch_regulations(contextual_message.content, config)
 
         logger.info("--- AGENT: Contextual message ---")
         logger.info(f"Contextual message: {contextual_message}")
         
-        # Return new state with all previous messages and the reformulated query
-        return {"messages": messages[:-1] + [contextual_message]}
+        # Return new state with the reformulated query replacing the latest message
+        return {"messages": [contextual_message]}
     except Exception as e:
         logger.error(f"Error summarizing conversation: {e}")
         # If summarization fails, continue with original messages
         return state
 
 
-async def call_model_no_human_loop(state: MyAgentState) -> MyAgentState:
+async def call_model_no_human_loop(state: MyAgentState, config: RunnableConfig) -> MyAgentState:
     logger.info("--- AGENT (No Human Loop): Calling LLM ---")
 
-    # Prepare the prompts
-    prompt = ChatPromptTemplate.from_messages(
-        [("system", react_prompt.format(tool_descriptions=get_tool_descriptions(tools))),
-         MessagesPlaceholder(variable_name="messages"), ])
+    runtime = runtime_from_config(config)
+    # Prompt và model đã bind tools được dựng sẵn cho runtime, prefix giữ nguyên giữa các lượt
+    chains = runtime.get_agent_chain()
 
-    # Bind tools and structured output
-    model_with_tools = get_gemini_llm().bind_tools(tools)
-    chains = prompt | model_with_tools
+    # Lượt LLM đầu tiên của câu hỏi: chạy trước tool RAG song song để che độ trễ truy xuất
+    speculation = None
+    last_message = state["messages"][-1] if state["messages"] else None
+    if isinstance(last_message, HumanMessage) and may_need_regulations(str(last_message.content)):
+        speculation = runtime.speculate(STUDENT_CODE_PREFIX.sub("", str(last_message.content)).strip(),
+                                        speculation_scope(config))
 
     try:
-        response = chains.invoke({"messages": state["messages"]})
+        response = await chains.ainvoke({"messages": state["messages"]})
+        runtime.resolve_speculation(speculation, response)
         return {"messages": state['messages'] + [response]}
 
     except Exception as e:
         logger.error(f"Error invoking LLM: {e}")
+        runtime.resolve_speculation(speculation, AIMessage(content=""))
         error_message = AIMessage(content=f"An error occurred with the LLM: {e}")
         return {"messages": state['messages'] + [error_message]}
 
 
+async def route_query(state: MyAgentState) -> MyAgentState:
+    """Phân loại câu hỏi; các tra cứu trực tiếp bỏ qua summarize và lượt lập kế hoạch của agent."""
+    # State được lưu qua checkpointer nên cắt bớt các lượt cũ nhất trước khi xử lý
+    removals = trim_state_messages(state["messages"])
+    if not is_router_enabled():
+        return {"messages": removals, "intent": None}
+    intent = intent_router.classify(state["messages"])
+    increment(f"intent_router.{intent.name}")
+    logger.info(f"--- AGENT: Routed query to '{intent.name}' ({intent.reason}) ---")
+    return {"messages": removals, "intent": {"name": intent.name, "reason": intent.reason, "args": intent.args}}
+
+
+def route_next(state: MyAgentState):
+    intent = state.get("intent")
+    return "direct" if intent and intent["name"] != "agent" else "summarize"
+
+
+async def direct_dispatch(state: MyAgentState, config: RunnableConfig) -> MyAgentState:
+    """Gọi thẳng tool theo ý định đã phân loại."""
+    intent = Intent(**state["intent"])
+    messages = await intent_router.dispatch(intent, runtime_from_config(config).tools_by_name, config)
+    return {"messages": messages}
+
+
+def after_direct(state: MyAgentState):
+    # Câu trả lời RAG đã là câu trả lời cuối; kết quả tool khác cần một lượt LLM để diễn đạt
+    last_message = state["messages"][-1]
+    return "agent" if isinstance(last_message, ToolMessage) else END
+
+
 def should_continue_no_human_loop(state: MyAgentState):
     print("--- AGENT (No Human Loop): Deciding next step ---")
     last_message = state['messages'][-1] if state['messages'] else None
@@ -152,107 +196,176 @@ def should_continue_no_human_loop(state: MyAgentState):
     return END
 
 
-tool_node = ToolNode(tools)
+async def tool_node(state: MyAgentState, config: RunnableConfig) -> MyAgentState:
+    """Chạy các tool call bằng tool executor của runtime (song song, mỗi tool có deadline riêng)."""
+    return await runtime_from_config(config).tool_node(state, config)
+
+
+def _compile_react_graph(checkpointer=None):
+    logger.info("___Creating workflow graph___")
+
+    workflow = StateGraph(MyAgentState)
+    workflow.add_node("route", route_query)
+    workflow.add_node("direct", direct_dispatch)
+    workflow.add_node("summarize", summarize_conversation)
+    workflow.add_node("agent", call_model_no_human_loop)
+    workflow.add_node("action", tool_node)
+
+    # Set entry point to the intent router: tra cứu trực tiếp đi qua "direct", còn lại đi vòng ReAct
+    workflow.set_entry_point("route")
+    workflow.add_conditional_edges("route", route_next, {"direct": "direct", "summarize": "summarize"})
+    workflow.add_conditional_edges("direct", after_direct, {"agent": "agent", END: END})
+
+    # After summarization, always go to agent
+    workflow.add_edge("summarize", "agent")
+
+    # From agent, conditionally go to action or end
+    workflow.add_conditional_edges("agent", should_continue_no_human_loop, {"action": "action", END: END})
+
+    # From action, always go back to agent
+    workflow.add_edge("action", "agent")
+
+    graph = workflow.compile(checkpointer=checkpointer)
+    logger.info("___Finished creating workflow graph___")
+    return graph
+
+
+def build_react_graph(checkpointer=None):
+    """
+    Lấy ReActGraph đã compile từ graph_registry, compile lần đầu nếu chưa có.
+
+    Args:
+        checkpointer: Checkpointer gắn với graph, None cho graph không lưu state
+
+    Returns:
+        CompiledStateGraph: Graph dùng chung giữa các instance ReActGraph
+    """
+    key = ("react", id(checkpointer) if checkpointer is not None else None)
+    return graph_registry.get_or_compile(key, lambda: _compile_react_graph(checkpointer))
 
 
 class ReActGraph:
-    def __init__(self):
+    def __init__(self, checkpointer=None, runtime: Optional[AgentRuntime] = None):
+        """
+        Args:
+            checkpointer: Checkpointer lưu state theo conversation, mặc định dùng chung trong process
+            runtime: AgentRuntime cố định cho graph này; mặc định chọn runtime hiện hành ở mỗi lượt
+                (để chỉ mục vừa build lại được dùng ngay)
+        """
         self.workflow = None
+        # Graph không lưu state, dùng cho quick chat và các lời gọi không có conversation id
+        self.stateless_workflow = None
+        self.checkpointer = checkpointer if checkpointer is not None else get_checkpointer()
+        self.runtime = runtime
         self.state = MyAgentState
-        self.tools = tools
         self.call_model_no_human_loop = call_model_no_human_loop
         self.tool_node = tool_node
         self.should_continue_no_human_loop = should_continue_no_human_loop
         self.conversation_memory = []
+        self._thread_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
 
-    def create_graph(self):
-        # Create the state graph
-        logger.info("___Creating workflow graph___")
+    @property
+    def tools(self):
+        return self._resolve_runtime(None).tools
 
-        workflow = StateGraph(self.state)
-        workflow.add_node("summarize", summarize_conversation)
-        workflow.add_node("agent", self.call_model_no_human_loop)
-        workflow.add_node("action", self.tool_node)
-        
-        # Set entry point to the summarization node
-        workflow.set_entry_point("summarize")
-        
-        # After summarization, always go to agent
-        workflow.add_edge("summarize", "agent")
-        
-        # From agent, conditionally go to action or end
-        workflow.add_conditional_edges("agent", self.should_continue_no_human_loop, {"action": "action", END: END})
-        
-        # From action, always go back to agent
-        workflow.add_edge("action", "agent")
-        
-        self.workflow = workflow.compile()
+    def _resolve_runtime(self, runtime: Optional[AgentRuntime]) -> AgentRuntime:
+        if runtime is not None:
+            return runtime
+        return self.runtime if self.runtime is not None else get_runtime()
 
-        logger.info("___Finished creating workflow graph___")
+    def create_graph(self):
+        # Graph đã compile được cache trong graph_registry nên tạo lại ReActGraph không compile lại
+        self.workflow = build_react_graph(self.checkpointer)
+        self.stateless_workflow = build_react_graph(None) if self.checkpointer is not None else self.workflow
         return self.workflow
 
     def print_mermaid(self):
-        # Generate and log the Mermaid diagram
+        """Ghi sơ đồ Mermaid của graph ra mermaid/react_mermaid.mmd (dùng qua `python -m agent.graph_registry`)."""
+        if self.workflow is None:
+            self.create_graph()
         try:
-            logger.info("___Printing mermaid graph___")
-            mermaid_diagram = self.workflow.get_graph().draw_mermaid()
-            logger.info("Mermaid diagram:")
-            logger.info(mermaid_diagram)
-
-
-            logger.info("___Saving mermaid graph to file___")
-            current_dir = Path(__file__).parent.absolute()
-            project_root = current_dir.parent.parent
-            mermaid_dir_path = os.path.join(project_root, "mermaid")
-            mermaid_path = os.path.join(mermaid_dir_path, "react_mermaid.mmd")
-
-            ## Save the diagram to a file
-            with open(mermaid_path, "w") as f:
-                f.write(mermaid_diagram)
-                f.close()
-
-            logger.info("___Finished printing mermaid graph___")
-
+            write_mermaid(self.workflow, MERMAID_DIR / "react_mermaid.mmd")
+            logger.info("___Saved mermaid graph to file___")
         except Exception as e:
-            print(f"Error generating Mermaid diagram: {str(e)}")
+            logger.error(f"Error generating Mermaid diagram: {str(e)}")
 
-    async def chat(self, init: str):
+    async def chat(self, init: str, runtime: Optional[AgentRuntime] = None):
         """Legacy method for single message processing, maintained for backward compatibility"""
         initial_state = {"messages": [HumanMessage(content=init)]}
 
         if self.workflow is None:
             self.create_graph()
-            self.print_mermaid()
 
-        result = await self.workflow.ainvoke(initial_state)
+        with span("agent.chat", kind="request"):
+            result = await self.stateless_workflow.ainvoke(
+                initial_state, config={"callbacks": [TracingCallbackHandler()],
+                                       "configurable": {RUNTIME_CONFIG_KEY: self._resolve_runtime(runtime),
+                                                        SPECULATION_SCOPE_CONFIG_KEY: uuid.uuid4().hex}})
         current_messages = result['messages']
 
         return current_messages
+
+    def thread_lock(self, thread_id: str) -> asyncio.Lock:
+        """
+        Lock của một conversation: hai lượt đồng thời trên cùng thread_id sẽ cùng đọc một checkpoint
+        và ghi đè state của nhau, nên caller giữ lock này suốt lượt (kiểm tra checkpoint + chat_with_memory).
+        """
+        lock = self._thread_locks.get(thread_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._thread_locks[thread_id] = lock
+        return lock
+
+    async def has_checkpoint(self, thread_id: str) -> bool:
+        """Kiểm tra thread đã có state được lưu hay chưa (khi chưa có, caller cần nạp lịch sử)."""
+        if self.checkpointer is None:
+            return False
+        if self.workflow is None:
+            self.create_graph()
+        snapshot = await self.workflow.aget_state({"configurable": {"thread_id": thread_id}})
+        return bool(snapshot.values.get("messages"))
         
-    async def chat_with_memory(self, conversation_history: List[BaseMessage], query: str) -> List[BaseMessage]:
+    async def chat_with_memory(self, conversation_history: List[BaseMessage], query: str,
+                               thread_id: Optional[str] = None,
+                               runtime: Optional[AgentRuntime] = None,
+                               has_checkpoint: Optional[bool] = None,
+                               summary: Optional[BaseMessage] = None) -> List[BaseMessage]:
         """
         Process a query while maintaining conversation history.
         
         Args:
-            conversation_history: Previous messages in the conversation
+            conversation_history: Previous messages in the conversation, chỉ dùng khi thread chưa có checkpoint
             query: The new user query to process
+            thread_id: Optional conversation id; khi có, state được lưu và tiếp tục qua checkpointer
+            runtime: AgentRuntime cho lượt này (model, chỉ mục, tenant); mặc định như khi khởi tạo
+            has_checkpoint: Kết quả has_checkpoint(thread_id) nếu caller đã kiểm tra, để không đọc lại state
+            summary: Bản tóm tắt mới nhất của conversation; với thread đã có checkpoint được ghi đè
+                vào state (cùng id) để các lượt đã bị cắt khỏi state vẫn còn trong ngữ cảnh
             
         Returns:
             Updated conversation history with the agent's response
         """
-        # Add the new query to the conversation history
-        updated_history = conversation_history.copy() + [HumanMessage(content=query)]
-        
-        # Prepare the initial state with the full conversation history
-        initial_state = {"messages": updated_history}
-        
         # Create the workflow if it doesn't exist
         if self.workflow is None:
             self.create_graph()
-            self.print_mermaid()
-            
-        # Execute the workflow
-        result = await self.workflow.ainvoke(initial_state)
+
+        config = {"callbacks": [TracingCallbackHandler()],
+                  "configurable": {RUNTIME_CONFIG_KEY: self._resolve_runtime(runtime),
+                                   SPECULATION_SCOPE_CONFIG_KEY: uuid.uuid4().hex}}
+        workflow = self.stateless_workflow
+        new_messages = conversation_history.copy() + [HumanMessage(content=query)]
+        if thread_id is not None and self.checkpointer is not None:
+            workflow = self.workflow
+            config["configurable"]["thread_id"] = thread_id
+            # Thread đã có state: chỉ thêm câu hỏi mới, không dựng lại lịch sử
+            if has_checkpoint is None:
+                has_checkpoint = await self.has_checkpoint(thread_id)
+            if has_checkpoint:
+                new_messages = ([summary] if summary is not None else []) + [HumanMessage(content=query)]
+
+        # Execute the workflow, mỗi node/tool/LLM call được ghi thành span con của request
+        with span("agent.chat_with_memory", kind="request", new_messages=len(new_messages)):
+            result = await workflow.ainvoke({"messages": new_messages}, config=config)
         
         # Return the updated conversation history
         return result['messages']
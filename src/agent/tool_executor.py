@@ -0,0 +1,101 @@
+"""
+Action node chạy song song các tool call trong một lượt của ReActGraph.
+
+Khi LLM trả về nhiều tool call cùng lúc (ví dụ get_student_info + get_student_scores +
+search_kma_regulations), các tool async được chạy đồng thời, tool sync chạy trong một
+thread pool giới hạn, mỗi tool có deadline riêng. Tool lỗi hoặc quá hạn chỉ trả về
+ToolMessage lỗi cho chính tool đó; các kết quả còn lại vẫn được dùng. Thời gian một lượt
+bằng thời gian của tool chậm nhất thay vì tổng thời gian.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.tools import BaseTool
+
+from telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT_SECONDS", "30"))
+
+
+def _parse_tool_timeouts(raw: Optional[str]) -> Dict[str, float]:
+    """Đọc TOOL_TIMEOUTS dạng "search_kma_regulations=45,get_student_scores=10"."""
+    timeouts = {}
+    for item in (raw or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            timeouts[name.strip()] = float(value)
+    return timeouts
+
+
+class ParallelToolExecutor:
+    """Thay thế ToolNode: chạy các tool call của AIMessage cuối cùng đồng thời."""
+
+    def __init__(self, tools: Sequence[BaseTool], default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+                 timeouts: Optional[Dict[str, float]] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            tools: Danh sách tool mà agent có thể gọi
+            default_timeout: Deadline (giây) cho mỗi tool call
+            timeouts: Deadline riêng theo tên tool, mặc định đọc từ TOOL_TIMEOUTS
+            max_workers: Số thread tối đa cho tool sync, mặc định đọc từ TOOL_MAX_WORKERS
+        """
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts if timeouts is not None else _parse_tool_timeouts(os.environ.get("TOOL_TIMEOUTS"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.environ.get("TOOL_MAX_WORKERS", "8")),
+            thread_name_prefix="tool")
+
+    def _timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    async def _invoke(self, tool: BaseTool, args: Dict[str, Any], config: Optional[RunnableConfig]) -> Any:
+        # Tool có coroutine chạy trên event loop; tool sync chạy trong thread pool giới hạn
+        if getattr(tool, "coroutine", None) is not None:
+            return await tool.ainvoke(args, config)
+        return await run_in_executor(self.executor, tool.invoke, args, config)
+
+    async def _run_one(self, call: Dict[str, Any], config: Optional[RunnableConfig]) -> ToolMessage:
+        name = call["name"]
+        start = time.perf_counter()
+        tool = self.tools_by_name.get(name)
+        status = "success"
+        if tool is None:
+            content, status = f"Error: {name} is not a valid tool, try one of {list(self.tools_by_name)}.", "error"
+        else:
+            timeout = self._timeout_for(name)
+            try:
+                result = await asyncio.wait_for(self._invoke(tool, call.get("args", {}), config), timeout=timeout)
+                content = result if isinstance(result, str) else str(result)
+            except asyncio.TimeoutError:
+                increment(f"tool.{name}.timeout")
+                content, status = f"Error: tool {name} did not finish within {timeout:g}s.", "error"
+            except Exception as e:
+                increment(f"tool.{name}.error")
+                content, status = f"Error: {repr(e)}\n Please fix your mistakes.", "error"
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Tool {name} finished with status={status} in {latency_ms:.0f}ms")
+        return ToolMessage(content=content, name=name, tool_call_id=call["id"], status=status,
+                           response_metadata={"latency_ms": round(latency_ms, 2)})
+
+    async def __call__(self, state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, List[ToolMessage]]:
+        last_message = state["messages"][-1]
+        tool_calls = last_message.tool_calls if isinstance(last_message, AIMessage) else []
+        if not tool_calls:
+            return {"messages": []}
+
+        start = time.perf_counter()
+        tool_messages = await asyncio.gather(*(self._run_one(call, config) for call in tool_calls))
+        logger.info(f"Executed {len(tool_calls)} tool call(s) in {(time.perf_counter() - start) * 1000:.0f}ms")
+        # Giữ đúng thứ tự tool call để khớp tool_call_id khi gửi lại cho LLM
+        return {"messages": list(tool_messages)}
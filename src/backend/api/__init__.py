@@ -6,6 +6,8 @@ from .auth import router as auth_router
 from .rate_limit import router as rate_limit_router
 from .models import router as models_router
 from .admin_rag import router as admin_rag_router
+from .traces import router as traces_router
+from .scores import router as scores_router
 
 # Create main router
 router = APIRouter()
@@ -18,5 +20,7 @@ router.include_router(auth_router, prefix="/auth", tags=["auth"])
 router.include_router(rate_limit_router, prefix="", tags=["rate_limit"])
 router.include_router(models_router, prefix="/models", tags=["models"])
 router.include_router(admin_rag_router, prefix="/admin/rag", tags=["admin_rag"])
+router.include_router(traces_router, prefix="/admin/traces", tags=["admin_traces"])
+router.include_router(scores_router, prefix="/admin/scores", tags=["admin_scores"])
 
 __all__ = ["router"]
\ No newline at end of file
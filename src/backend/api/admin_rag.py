@@ -4,6 +4,7 @@ API endpoints for managing RAG training data
 This module provides API endpoints for uploading files to the data directory
 for RAG training, listing available training files, and deleting training files.
 """
+import asyncio
 import logging
 import os
 import sys
@@ -351,19 +352,14 @@ async def rebuild_rag_index(current_user: dict = Depends(get_current_user)):
         
         logger.info(f"RAG index rebuilt successfully with {len(chunks)} chunks")
         
-        # Tải lại ReActGraph để sử dụng chỉ mục mới
-        from backend.api.chat import agent
-        from agent.supervisor_agent import ReActGraph
-        
-        # Khởi tạo lại agent với chỉ mục mới
-        new_agent = ReActGraph()
-        new_agent.create_graph()
-        
-        # Gán lại biến toàn cục agent trong module chat
-        import backend.api.chat
-        backend.api.chat.agent = new_agent
-        
-        logger.info("ReActGraph agent reinitialized with new index")
+        # Phiên bản chỉ mục đổi theo file vừa ghi nên request tiếp theo chọn runtime mới;
+        # bỏ runtime cũ và nạp trước runtime mới để request đầu tiên không phải chờ
+        from agent.runtime import DEFAULT_TENANT, get_runtime, runtime_registry
+
+        runtime_registry.invalidate(DEFAULT_TENANT)
+        await asyncio.to_thread(lambda: get_runtime().warm_up())
+
+        logger.info("Agent runtime reloaded with new index")
         
         return {
             "success": True,
@@ -1,26 +1,21 @@
+import asyncio
 import logging
 import os
 import sys
+import threading
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query, status, Header, Depends
 from langchain_core.messages import HumanMessage, AIMessage
 
 # Add the parent directory to sys.path to import our agent
-print(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from agent.supervisor_agent import ReActGraph
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-agent = ReActGraph()
-agent.create_graph()
-agent.print_mermaid()
-
 from ..db.mongodb import MongoDB, mongodb
 
 
@@ -35,12 +30,52 @@ from backend.models.user import UserResponse
 from backend.models.responses import BaseResponse
 from backend.auth.dependencies import require_auth
 from backend.api.rate_limit import check_rate_limit
+from backend.memory import conversation_memory
+from telemetry import span
 
 router = APIRouter()
 
-agent = ReActGraph()
-agent.create_graph()
-agent.print_mermaid()
+# ReActGraph (và các tool, RAG) được tạo khi dùng lần đầu hoặc trong warmup sau khi server
+# đã nhận kết nối (backend.startup). Graph được compile một lần và cache trong graph_registry;
+# sơ đồ Mermaid chỉ sinh qua `python -m agent.graph_registry`
+agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """Get or create the shared ReActGraph"""
+    global agent
+    if agent is None:
+        with _agent_lock:
+            if agent is None:
+                from agent.supervisor_agent import ReActGraph
+
+                new_agent = ReActGraph()
+                new_agent.create_graph()
+                agent = new_agent
+    return agent
+
+
+async def aget_agent():
+    """Như get_agent nhưng nạp trong worker thread để không chặn event loop ở lần đầu"""
+    if agent is not None:
+        return agent
+    return await asyncio.to_thread(get_agent)
+
+
+def select_runtime(current_user: dict):
+    """
+    Chọn AgentRuntime (retriever, LLM client, tool) cho request theo tenant của người dùng.
+
+    Tenant lấy từ bản ghi người dùng đã xác thực (admin gán), không từ header do client gửi.
+    """
+    from agent.runtime import get_runtime
+
+    try:
+        return get_runtime(tenant=current_user.get("tenant"))
+    except ValueError as e:
+        logger.error(f"Cannot select agent runtime for user {current_user.get('_id')}: {e}")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
 
 # Helper function to check if ObjectId is valid
 def validate_object_id(id: str):
@@ -306,9 +341,10 @@ async def query_ai(
     conv_id = validate_object_id(conversation_id)
 
     # Check if conversation exists and belongs to the user
-    conversation = await mongodb.db.conversations.find_one(
-        {"_id": conv_id}
-    )
+    with span("mongo.find_conversation", kind="db"):
+        conversation = await mongodb.db.conversations.find_one(
+            {"_id": conv_id}
+        )
 
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -341,30 +377,38 @@ async def query_ai(
         "created_at": now
     }
 
-    await mongodb.db.messages.insert_one(new_message)
+    with span("mongo.save_user_message", kind="db"):
+        await mongodb.db.messages.insert_one(new_message)
 
-    # Update the conversation's updated_at timestamp
-    await mongodb.db.conversations.update_one(
-        {"_id": conv_id},
-        {"$set": {"updated_at": now}}
-    )
+        # Update the conversation's updated_at timestamp
+        await mongodb.db.conversations.update_one(
+            {"_id": conv_id},
+            {"$set": {"updated_at": now}}
+        )
 
-    # Get all previous messages from this conversation
-    cursor = mongodb.db.messages.find(
-        {"conversation_id": conv_id}
-    ).sort("created_at", 1)
-    
-    # Convert DB messages to langchain message format
-    conversation_history = []
-    async for msg in cursor:
-        if msg["is_user"]:
-            conversation_history.append(HumanMessage(content=msg["content"]))
+    # State của graph được lưu theo conversation id; chỉ nạp lịch sử từ Mongo khi chưa có checkpoint
+    chat_agent = await aget_agent()
+    runtime = select_runtime(current_user)
+    conversation_history = [HumanMessage(content=content)]
+    # Các lượt của cùng một conversation chạy lần lượt (trong process này) để không ghi đè checkpoint của nhau
+    async with chat_agent.thread_lock(conversation_id):
+        has_checkpoint = await chat_agent.has_checkpoint(conversation_id)
+        summary = None
+        if has_checkpoint:
+            # Các lượt cũ đã bị cắt khỏi state: đưa bản tóm tắt mới nhất vào state thay cho chúng
+            with span("mongo.load_summary", kind="db"):
+                summary = await conversation_memory.load_summary(mongodb.db, conv_id)
         else:
-            conversation_history.append(AIMessage(content=msg["content"]))
+            # Lịch sử có giới hạn: bản tóm tắt cuốn chiếu + các lượt gần nhất (gồm cả message vừa lưu)
+            with span("mongo.load_history", kind="db") as history_span:
+                conversation_history = await conversation_memory.load(mongodb.db, conv_id)
+                history_span.set_attribute("messages", len(conversation_history))
 
-    # Use the chat_with_memory method to get a response with context
-    logger.info(f"Processing query with memory: {content}")
-    updated_history = await agent.chat_with_memory(conversation_history[:-1], content)
+        # Use the chat_with_memory method to get a response with context
+        logger.info(f"Processing query with memory: {content}")
+        updated_history = await chat_agent.chat_with_memory(conversation_history[:-1], content,
+                                                            thread_id=conversation_id, runtime=runtime,
+                                                            has_checkpoint=has_checkpoint, summary=summary)
     
     # The last message in the updated history is the AI's response
     ai_response = updated_history[-1].content
@@ -380,15 +424,20 @@ async def query_ai(
         "created_at": now
     }
 
-    result = await mongodb.db.messages.insert_one(new_ai_message)
+    with span("mongo.save_ai_message", kind="db"):
+        result = await mongodb.db.messages.insert_one(new_ai_message)
 
-    # Update the conversation's updated_at timestamp
-    await mongodb.db.conversations.update_one(
-        {"_id": conv_id},
-        {"$set": {"updated_at": now}}
-    )
+        # Update the conversation's updated_at timestamp
+        await mongodb.db.conversations.update_one(
+            {"_id": conv_id},
+            {"$set": {"updated_at": now}}
+        )
+
+        created_message = await mongodb.db.messages.find_one({"_id": result.inserted_id})
 
-    created_message = await mongodb.db.messages.find_one({"_id": result.inserted_id})
+    # Gộp các lượt cũ vào bản tóm tắt ở background, kể cả khi có checkpointer: state bị cắt
+    # bớt và checkpoint có thể bị xoá, khi đó bản tóm tắt là phần còn lại của các lượt cũ
+    conversation_memory.schedule_update(mongodb.db, conv_id)
 
     response_data = MessageResponse(
         _id=str(created_message["_id"]),
@@ -449,7 +498,8 @@ async def quick_chat(
     else:
         content = message.content
 
-    response = await agent.chat_with_memory([], content)
+    chat_agent = await aget_agent()
+    response = await chat_agent.chat_with_memory([], content, runtime=select_runtime(current_user))
     
     # The last message in the response is the AI's answer
     ai_response = response[-1].content
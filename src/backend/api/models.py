@@ -12,6 +12,7 @@ class ModelType(str, Enum):
     HUGGINGFACE = "huggingface"
     OLLAMA = "ollama"
     GEMINI = "gemini"
+    FAKE = "fake"
     OTHER = "other"
 
 router = APIRouter()
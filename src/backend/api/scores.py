@@ -0,0 +1,184 @@
+"""
+API endpoints quản trị dữ liệu điểm (chỉ admin)
+
+Import điểm hàng loạt từ file CSV/XLSX qua score.importer (COPY vào bảng staging rồi upsert)
+và tra cứu điểm của cả lớp/nhiều sinh viên trong một truy vấn, trả về dạng NDJSON theo luồng.
+Báo cáo GPA cả lớp và dự phóng GPA dùng score.gpa_engine (tính vector hoá bằng NumPy).
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.auth.jwt import get_current_user
+from score.class_tool import MAX_BATCH_STUDENTS, SEMESTER_PATTERN
+from score.gpa_engine import class_report, gpa_engine, student_arrays
+from score.importer import ImportFileError, ScoreImporter
+from score.student_tool import global_db
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+ALLOWED_EXTENSIONS = (".csv", ".xlsx", ".xlsm")
+
+
+class PlannedCourse(BaseModel):
+    credits: float = Field(..., gt=0, description="Số tín chỉ của môn dự kiến")
+    score: float = Field(..., ge=0, le=10, description="Điểm dự kiến (thang 10)")
+
+
+class WhatIfRequest(BaseModel):
+    student_code: str
+    planned: List[PlannedCourse] = []
+    target_gpa: Optional[float] = Field(None, ge=0, le=10, description="GPA mục tiêu (thang 10)")
+    remaining_credits: Optional[float] = Field(None, gt=0, description="Số tín chỉ còn lại (mặc định: tổng planned)")
+
+
+def _validate_selection(student_class: Optional[str], student_codes: Optional[List[str]],
+                        semester: Optional[str]) -> None:
+    if bool(student_class) == bool(student_codes):
+        raise HTTPException(status_code=400, detail="Provide either student_class or student_codes")
+    if student_codes and len(student_codes) > MAX_BATCH_STUDENTS:
+        raise HTTPException(status_code=400, detail=f"Too many students, at most {MAX_BATCH_STUDENTS} per request")
+    if semester and not SEMESTER_PATTERN.match(semester):
+        raise HTTPException(status_code=400, detail="Semester must be in format ki1-2024-2025, k2-2024-2025, etc.")
+
+
+def _require_admin(current_user: dict) -> None:
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can manage scores")
+
+
+def _save_upload(file: UploadFile, suffix: str) -> str:
+    # Ghi file upload ra đĩa theo từng khối, không đọc cả file vào bộ nhớ
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(file.file, temp_file)
+        return temp_file.name
+
+
+@router.post("/import", response_model=Dict[str, Any])
+async def import_scores(
+    file: UploadFile = File(...),
+    batch_size: int = Query(5000, ge=100, le=100000, description="Số dòng mỗi lô COPY"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import file điểm CSV/XLSX (dòng đầu là tên cột: student_code, subject_id, semester, ...)
+
+    Args:
+        file: File điểm .csv hoặc .xlsx
+        batch_size: Số dòng đọc và COPY mỗi lô
+
+    Returns:
+        Số dòng đã đọc, chèn mới, cập nhật, không đổi, bị loại và lỗi của từng dòng bị loại
+    """
+    _require_admin(current_user)
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    if suffix not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {suffix} (expected .csv or .xlsx)")
+
+    temp_path = await asyncio.to_thread(_save_upload, file, suffix)
+    try:
+        result = await ScoreImporter(batch_size=batch_size).import_file(temp_path)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Score import of {file.filename} failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Score import failed: {str(e)}")
+    finally:
+        os.unlink(temp_path)
+
+    logger.info(f"Score import of {file.filename} by {current_user['username']}: {result.inserted} inserted, "
+                f"{result.updated} updated, {result.rows_rejected} rejected")
+    return {"success": True, "filename": file.filename, **result.to_dict()}
+
+
+async def _stream_groups(student_codes: Optional[List[str]], student_class: Optional[str],
+                         semester: Optional[str]) -> AsyncIterator[str]:
+    count = 0
+    try:
+        async for group in global_db.db.iter_scores_many(student_codes=student_codes, student_class=student_class,
+                                                         semester=semester):
+            count += 1
+            yield json.dumps(group, ensure_ascii=False) + "\n"
+    except Exception as e:
+        # Response đã bắt đầu gửi, lỗi được báo ở dòng cuối
+        logger.error(f"Batch score lookup failed after {count} students: {e}")
+        yield json.dumps({"error": str(e), "students": count}) + "\n"
+        return
+    yield json.dumps({"done": True, "students": count}) + "\n"
+
+
+@router.get("/batch")
+async def get_scores_batch(
+    student_class: Optional[str] = Query(None, description="Lớp cần tra cứu"),
+    student_codes: Optional[List[str]] = Query(None, description="Danh sách mã sinh viên (lặp lại tham số)"),
+    semester: Optional[str] = Query(None, description="Học kỳ, ví dụ ki1-2024-2025"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Điểm của cả lớp hoặc nhiều sinh viên trong một truy vấn, trả về NDJSON theo luồng
+
+    Mỗi dòng là điểm của một sinh viên (student_code, student_name, student_class, scores);
+    dòng cuối là {"done": true, "students": n}, hoặc {"error": ...} nếu truy vấn lỗi giữa chừng.
+    """
+    _require_admin(current_user)
+    _validate_selection(student_class, student_codes, semester)
+
+    return StreamingResponse(_stream_groups(student_codes, student_class, semester),
+                             media_type="application/x-ndjson")
+
+
+@router.get("/report", response_model=Dict[str, Any])
+async def get_class_report(
+    student_class: Optional[str] = Query(None, description="Lớp cần báo cáo"),
+    student_codes: Optional[List[str]] = Query(None, description="Danh sách mã sinh viên (lặp lại tham số)"),
+    semester: Optional[str] = Query(None, description="Học kỳ, ví dụ ki1-2024-2025"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Báo cáo GPA của cả lớp hoặc nhiều sinh viên
+
+    Returns:
+        students (GPA thang 10/4, tín chỉ, xếp loại, hạng), statistics (trung bình, trung vị,
+        độ lệch chuẩn, phân vị, phân bố xếp loại/điểm chữ) và summary theo học kỳ
+    """
+    _require_admin(current_user)
+    _validate_selection(student_class, student_codes, semester)
+    try:
+        return await class_report(global_db.db, student_class=student_class, student_codes=student_codes,
+                                  semester=semester)
+    except Exception as e:
+        logger.error(f"Class report failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Class report failed: {str(e)}")
+
+
+@router.post("/what-if", response_model=Dict[str, Any])
+async def project_gpa(request: WhatIfRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Dự phóng GPA tích luỹ của một sinh viên sau các môn dự kiến
+
+    Returns:
+        current, projected (GPA thang 10/4) và required_average_10 (điểm trung bình cần đạt trên
+        số tín chỉ còn lại để đạt target_gpa)
+    """
+    _require_admin(current_user)
+    try:
+        arrays = await student_arrays(global_db.db, request.student_code)
+    except Exception as e:
+        logger.error(f"What-if projection for {request.student_code} failed: {e}")
+        raise HTTPException(status_code=500, detail=f"What-if projection failed: {str(e)}")
+    if not len(arrays) and not request.planned:
+        raise HTTPException(status_code=404, detail=f"No scores found for student {request.student_code}")
+
+    projection = gpa_engine.what_if(arrays, [course.model_dump() for course in request.planned],
+                                    target_gpa_10=request.target_gpa, remaining_credits=request.remaining_credits)
+    return {"student_code": request.student_code, **projection}
@@ -0,0 +1,63 @@
+"""
+API endpoints cho dữ liệu tracing (chỉ admin)
+
+Tổng hợp latency/token theo từng bước (HTTP, Mongo, graph node, tool, retriever, LLM),
+các counter như cache hit, và xem lại các span/trace gần đây.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from backend.auth.jwt import get_current_user
+from rag.prefetch import speculation_stats
+from telemetry import recorder
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _require_admin(current_user: dict) -> None:
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only administrators can view traces")
+
+
+@router.get("/summary", response_model=Dict[str, Any])
+async def get_trace_summary(current_user: dict = Depends(get_current_user)):
+    """Thống kê avg/p50/p95/max latency, lỗi và token cho từng bước, kèm các counter và tỷ lệ trúng prefetch"""
+    _require_admin(current_user)
+    summary = recorder.summary()
+    summary["speculation"] = speculation_stats(summary["counters"])
+    return summary
+
+
+@router.get("/recent", response_model=Dict[str, Any])
+async def get_recent_spans(
+    limit: int = Query(100, ge=1, le=1000),
+    kind: Optional[str] = Query(None, description="Lọc theo loại span: http, request, graph, node, tool, retriever, llm, db"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Các span kết thúc gần đây nhất (mới nhất trước)"""
+    _require_admin(current_user)
+    spans = recorder.recent(limit=limit, kind=kind)
+    return {"spans": spans, "count": len(spans)}
+
+
+@router.get("/{trace_id}", response_model=Dict[str, Any])
+async def get_trace(trace_id: str, current_user: dict = Depends(get_current_user)):
+    """Toàn bộ span của một trace, sắp xếp theo thời điểm bắt đầu"""
+    _require_admin(current_user)
+    spans = recorder.trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+@router.delete("", response_model=Dict[str, Any])
+async def reset_traces(current_user: dict = Depends(get_current_user)):
+    """Xoá dữ liệu tracing đang giữ trong bộ nhớ"""
+    _require_admin(current_user)
+    recorder.reset()
+    logger.info("Trace recorder reset")
+    return {"success": True}
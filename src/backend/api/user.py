@@ -299,6 +299,7 @@ async def get_all_users(current_user = Depends(require_auth)):
             "name": user.get("student_name", ""),
             "studentClass": user.get("student_class", ""),
             "role": user.get("role", "user"),
+            "tenant": user.get("tenant"),
             "isActive": user.get("is_active", True),
             "lastLogin": user.get("last_login"),
             "createdAt": user.get("created_at"),
@@ -361,6 +362,10 @@ async def update_user(
     if "role" in user_update:
         update_data["role"] = user_update["role"]
     
+    if "tenant" in user_update:
+        # Tenant quyết định chỉ mục mà người dùng được truy vấn nên chỉ admin gán
+        update_data["tenant"] = user_update["tenant"] or None
+
     if "isActive" in user_update:
         update_data["is_active"] = user_update["isActive"]
     
@@ -150,6 +150,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
         "student_name": user.get("student_name"),
         "student_class": user.get("student_class"),
         "role": user.get("role", "user"),  # Thêm trường role, mặc định là "user"
+        "tenant": user.get("tenant"),  # Chỉ mục tài liệu của người dùng, None là tenant mặc định
         "email": user.get("email"),
         "created_at": user["created_at"],
         "updated_at": user.get("updated_at", now)
@@ -53,6 +53,13 @@ class MongoDB:
             logger.info("Created index for rate_limits collection on user_id field")
         except Exception as e:
             logger.warning(f"Error creating index for rate_limits: {e}")
+
+        # Index cho việc tải các message gần nhất của một conversation
+        try:
+            await cls.db.messages.create_index([("conversation_id", 1), ("created_at", -1)])
+            logger.info("Created index for messages collection on conversation_id, created_at")
+        except Exception as e:
+            logger.warning(f"Error creating index for messages: {e}")
     
     @classmethod
     async def close_mongodb_connection(cls):
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 
@@ -12,6 +13,8 @@ from .db.mongodb import MongoDB, mongodb, get_db
 # from db.mongodb import MongoDB, mongodb
 from .models.responses import BaseResponse
 from .api import router as api_router
+from .startup import warmup
+from telemetry import recorder, span
 # from models.responses import BaseResponse
 # from api.chat import router as chat_router
 # from api.user import router as user_router
@@ -46,6 +49,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Mỗi HTTP request là một trace; span của Mongo, graph node, tool và LLM là span con
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with span(f"{request.method} {request.url.path}", kind="http") as request_span:
+        response = await call_next(request)
+        request_span.set_attribute("status_code", response.status_code)
+        # Gom thống kê theo route template thay vì path có chứa id
+        route = request.scope.get("route")
+        if route is not None:
+            request_span.name = f"{request.method} {route.path}"
+        return response
+
 # Include routers
 app.include_router(api_router, prefix="/api", tags=["api"])
 
@@ -84,12 +99,45 @@ async def startup_db_client():
         raise Exception("Failed to connect to MongoDB. Application cannot start.")
 
 
+@app.on_event("startup")
+async def startup_postgres_pool():
+    # Pool asyncpg sống suốt vòng đời backend; các tool điểm/sinh viên dùng lại kết nối đã mở
+    from score.student_tool import global_db
+    try:
+        await global_db.connect()
+    except Exception as e:
+        logger.warning(f"PostgreSQL pool could not be opened at startup, retrying on first use: {e}")
+
+
+@app.on_event("startup")
+async def start_warmup():
+    # Chỉ lên lịch: agent và RAG được nạp ở background trong khi server đã nhận kết nối
+    warmup.start()
+
+
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     from backend.db.mongodb import MongoDB
+    await warmup.stop()
     await MongoDB.close_mongodb_connection()
 
+
+@app.on_event("shutdown")
+async def shutdown_postgres_pool():
+    try:
+        from score.student_tool import global_db
+        await global_db.close()
+    except Exception as e:
+        logger.warning(f"Error closing PostgreSQL pool: {e}")
+
+
+@app.on_event("shutdown")
+async def flush_traces():
+    # Thread ghi JSONL là daemon: không chờ thì các span cuối bị mất khi process thoát
+    if not await asyncio.to_thread(recorder.flush):
+        logger.warning("Trace exporter did not finish writing queued spans before shutdown")
+
 @app.get("/", response_model=BaseResponse)
 async def root():
     return BaseResponse(
@@ -98,38 +146,65 @@ async def root():
         data=None
     )
 
-@app.get("/health", response_model=BaseResponse)
-async def health_check():
-    """Health check endpoint for monitoring backend status"""
+async def _mongodb_status() -> dict:
     try:
         # Sử dụng hàm helper get_db để kiểm tra kết nối
         db = await get_db()
         collections = await db.list_collection_names()
-        
-        db_status = {
-            "connected": True,
-            "collections": collections
-        }
-        
-        return BaseResponse(
-            statusCode=status.HTTP_200_OK,
-            message="Service is healthy",
-            data=db_status
-        )
+        return {"connected": True, "collections": collections}
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}", exc_info=True)
-        return BaseResponse(
-            statusCode=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            message=f"Service has issues: {str(e)}",
-            data=None
-        )
+        return {"connected": False, "error": str(e)}
+
+
+async def _postgres_status() -> dict:
+    try:
+        from score.student_tool import global_db
+        return await global_db.health_check()
+    except Exception as e:
+        return {"connected": False, "error": str(e)}
+
+
+@app.get("/health/live", response_model=BaseResponse)
+async def liveness_check():
+    """Liveness: process còn sống và event loop còn phản hồi, không kiểm tra phụ thuộc"""
     return BaseResponse(
         statusCode=status.HTTP_200_OK,
-        message="Backend is healthy",
+        message="Backend is alive",
+        data={"status": "online", "version": app.version}
+    )
+
+
+@app.get("/health/ready", response_model=BaseResponse)
+async def readiness_check():
+    """Readiness: Mongo kết nối được và agent/RAG đã warmup xong; trả 503 khi chưa sẵn sàng"""
+    mongodb_status = await _mongodb_status()
+    ready = mongodb_status["connected"] and warmup.ready
+    status_code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(
+        status_code=status_code,
+        content=BaseResponse(
+            statusCode=status_code,
+            message="Service is ready" if ready else "Service is not ready",
+            data={"mongodb": mongodb_status, "warmup": warmup.status()}
+        ).model_dump(),
+    )
+
+
+@app.get("/health", response_model=BaseResponse)
+async def health_check():
+    """Health check endpoint for monitoring backend status (liveness và readiness tách riêng)"""
+    mongodb_status = await _mongodb_status()
+    ready = mongodb_status["connected"] and warmup.ready
+    return BaseResponse(
+        statusCode=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        message="Service is healthy" if ready else "Service is alive but not ready",
         data={
-            "status": "online",
-            "timestamp": "2025-08-03",
-            "version": "1.0.0"
+            "live": True,
+            "ready": ready,
+            "mongodb": mongodb_status,
+            "postgres": await _postgres_status(),
+            "warmup": warmup.status(),
         }
     )
 
@@ -0,0 +1,174 @@
+"""
+Bộ nhớ hội thoại có giới hạn: N lượt gần nhất giữ nguyên văn cộng một bản tóm tắt cuốn chiếu.
+
+Bản tóm tắt được lưu trên document của conversation (`summary`, `summary_until`) và được
+cập nhật ở background sau mỗi câu trả lời: các message cũ hơn cửa sổ N lượt được gộp dần
+vào bản tóm tắt. Khi tải lịch sử, chỉ các message sau `summary_until` được đọc từ Mongo,
+nên chi phí mỗi lượt không tăng theo độ dài cuộc hội thoại.
+
+Bản tóm tắt luôn được cập nhật, kể cả khi agent lưu state qua checkpointer: state bị cắt còn
+AGENT_MAX_STATE_MESSAGES message và checkpoint có thể bị xoá (LRU/TTL, restart), khi đó lịch
+sử nạp lại từ Mongo chỉ còn bản tóm tắt + các lượt gần nhất. Với thread đã có checkpoint, bản
+tóm tắt mới nhất được ghi đè vào state (cùng id SUMMARY_MESSAGE_ID) ở mỗi lượt.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Set
+
+from bson import ObjectId
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from agent.checkpoint import SUMMARY_MESSAGE_ID
+from llm.config import get_gemini_llm
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MESSAGE_NAME = SUMMARY_MESSAGE_ID
+
+SUMMARY_PROMPT = """
+    You maintain a running summary of a conversation between a user and KBot,
+    the assistant of the Academy of Cryptographic Techniques (KMA).
+    Update the existing summary with the new messages below.
+    Keep every fact that later questions may refer to: student codes, names, classes,
+    semesters, subjects, scores, GPA values and the regulations that were discussed.
+    Drop greetings and small talk. Keep the original language of the conversation.
+    Answer with the updated summary only, at most {max_words} words.
+
+    ** Existing summary **
+    {summary}
+
+    ** New messages **
+    {messages}
+    """
+
+
+class ConversationMemory:
+    """Tải lịch sử hội thoại có giới hạn và cập nhật bản tóm tắt cuốn chiếu."""
+
+    def __init__(self, max_turns: int = 6, summary_max_words: int = 250):
+        """
+        Args:
+            max_turns: Số lượt (câu hỏi + câu trả lời) gần nhất được giữ nguyên văn
+            summary_max_words: Độ dài tối đa của bản tóm tắt
+        """
+        self.max_turns = max_turns
+        self.summary_max_words = summary_max_words
+        self._running: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def window_size(self) -> int:
+        return self.max_turns * 2
+
+    @staticmethod
+    def _to_langchain(message: dict) -> BaseMessage:
+        if message["is_user"]:
+            return HumanMessage(content=message["content"])
+        return AIMessage(content=message["content"])
+
+    @staticmethod
+    def summary_message(summary: str) -> BaseMessage:
+        # HumanMessage có tên riêng thay vì SystemMessage vì Gemini chỉ nhận system ở đầu
+        return HumanMessage(content=f"Tóm tắt cuộc hội thoại trước đó:\n{summary}", name=SUMMARY_MESSAGE_NAME,
+                            id=SUMMARY_MESSAGE_ID)
+
+    async def load_summary(self, db, conversation_id: ObjectId) -> Optional[BaseMessage]:
+        """Message chứa bản tóm tắt hiện tại của conversation, None nếu chưa có."""
+        conversation = await db.conversations.find_one({"_id": conversation_id}, {"summary": 1})
+        if conversation and conversation.get("summary"):
+            return self.summary_message(conversation["summary"])
+        return None
+
+    async def load(self, db, conversation_id: ObjectId) -> List[BaseMessage]:
+        """
+        Tải bản tóm tắt và các message chưa được tóm tắt (tối đa gấp đôi cửa sổ).
+
+        Args:
+            db: Motor database
+            conversation_id: Id của conversation
+
+        Returns:
+            List[BaseMessage]: [bản tóm tắt (nếu có)] + các message gần nhất theo thứ tự thời gian
+        """
+        conversation = await db.conversations.find_one(
+            {"_id": conversation_id}, {"summary": 1, "summary_until": 1})
+        query = {"conversation_id": conversation_id}
+        if conversation and conversation.get("summary_until"):
+            query["created_at"] = {"$gt": conversation["summary_until"]}
+
+        # Giới hạn cứng phòng khi cập nhật tóm tắt ở background bị chậm hoặc lỗi
+        cursor = db.messages.find(query, {"content": 1, "is_user": 1}).sort("created_at", -1).limit(
+            self.window_size * 2)
+        recent = [self._to_langchain(msg) async for msg in cursor]
+        recent.reverse()
+
+        history: List[BaseMessage] = []
+        if conversation and conversation.get("summary"):
+            history.append(self.summary_message(conversation["summary"]))
+        return history + recent
+
+    def schedule_update(self, db, conversation_id: ObjectId) -> None:
+        """Cập nhật bản tóm tắt ở background, không chặn response."""
+        key = str(conversation_id)
+        if key in self._running:
+            # Đang cập nhật: đánh dấu để chạy thêm một vòng sau khi xong, tránh hai lượt song song
+            self._pending.add(key)
+            return
+        self._running.add(key)
+        task = asyncio.create_task(self.update_summary(db, conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def update_summary(self, db, conversation_id: ObjectId) -> None:
+        """Gộp các message nằm ngoài cửa sổ N lượt gần nhất vào bản tóm tắt."""
+        key = str(conversation_id)
+        self._running.add(key)
+        try:
+            while True:
+                self._pending.discard(key)
+                try:
+                    with span("memory.update_summary", kind="background"):
+                        await self._update_summary(db, conversation_id)
+                except Exception as e:
+                    logger.error(f"Error updating summary for conversation {conversation_id}: {e}")
+                if key not in self._pending:
+                    break
+        finally:
+            self._running.discard(key)
+
+    async def _update_summary(self, db, conversation_id: ObjectId) -> None:
+        conversation = await db.conversations.find_one(
+            {"_id": conversation_id}, {"summary": 1, "summary_until": 1})
+        if not conversation:
+            return
+        query = {"conversation_id": conversation_id}
+        if conversation.get("summary_until"):
+            query["created_at"] = {"$gt": conversation["summary_until"]}
+        pending = [msg async for msg in db.messages.find(
+            query, {"content": 1, "is_user": 1, "created_at": 1}).sort("created_at", 1)]
+        if len(pending) <= self.window_size:
+            return
+
+        to_fold = pending[:len(pending) - self.window_size]
+        lines = [f"{'[user]' if msg['is_user'] else '[bot]'} {msg['content']}" for msg in to_fold]
+        prompt = SUMMARY_PROMPT.format(max_words=self.summary_max_words,
+                                       summary=conversation.get("summary") or "(empty)",
+                                       messages="\n".join(lines))
+        response = await get_gemini_llm().ainvoke(prompt)
+
+        await db.conversations.update_one(
+            {"_id": conversation_id},
+            {"$set": {"summary": str(response.content).strip(),
+                      "summary_until": to_fold[-1]["created_at"],
+                      "summary_updated_at": datetime.utcnow()}})
+        logger.info(f"Folded {len(to_fold)} messages into summary of conversation {conversation_id}")
+
+
+conversation_memory = ConversationMemory(
+    max_turns=int(os.environ.get("MEMORY_MAX_TURNS", "6")),
+    summary_max_words=int(os.environ.get("MEMORY_SUMMARY_MAX_WORDS", "250")),
+)
@@ -25,6 +25,7 @@ class UserResponse(BaseModel):
     student_name: Optional[str] = None
     student_class: Optional[str] = None
     role: Optional[str] = "user"  # Thêm role, mặc định là "user"
+    tenant: Optional[str] = None  # Do admin gán, None là tenant mặc định
     email: Optional[str] = None
     created_at: datetime
     updated_at: datetime
@@ -0,0 +1,88 @@
+"""
+Khởi động backend theo hai pha.
+
+Import `backend.main` chỉ nạp FastAPI, router và Mongo; ReActGraph, agent runtime mặc định
+(FAISS, BM25, toàn bộ corpus, các Gemini client) được tạo khi dùng lần đầu. Sau khi server đã nhận
+kết nối, `warmup` nạp trước các thành phần này trong thread nền để request đầu tiên không
+phải chờ. `/health/live` chỉ báo process còn sống; `/health/ready` báo sẵn sàng khi Mongo
+kết nối được và warmup đã xong, để rolling deploy chỉ chuyển traffic sang instance đã nóng.
+Tắt warmup bằng BACKEND_WARMUP=false (khi đó các thành phần nạp lúc dùng lần đầu).
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_agent() -> None:
+    from backend.api.chat import get_agent
+    get_agent()
+
+
+def _warm_rag() -> None:
+    from agent.runtime import get_runtime
+    get_runtime().warm_up()
+
+
+def is_warmup_enabled() -> bool:
+    return os.environ.get("BACKEND_WARMUP", "true").lower() in ("1", "true", "yes")
+
+
+class Warmup:
+    """Chạy lần lượt các bước nạp trước ở background và ghi lại trạng thái từng bước."""
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """
+        Args:
+            steps: Danh sách (tên thành phần, hàm nạp đồng bộ), chạy theo thứ tự trong worker thread
+        """
+        self.steps = steps
+        self.components: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name, _ in steps}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Lên lịch warmup trên event loop hiện tại, không chặn startup."""
+        if not is_warmup_enabled():
+            for component in self.components.values():
+                component["status"] = "deferred"
+            logger.info("Warmup disabled, components load on first use")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # Nhường event loop để uvicorn hoàn tất startup và bắt đầu nhận kết nối
+        await asyncio.sleep(0)
+        for name, load in self.steps:
+            component = self.components[name]
+            component["status"] = "loading"
+            started = time.perf_counter()
+            try:
+                with span(f"warmup.{name}", kind="background"):
+                    await asyncio.to_thread(load)
+                component["status"] = "ready"
+            except Exception as e:
+                component["status"] = "failed"
+                component["error"] = str(e)
+                logger.error(f"Warmup of {name} failed: {e}")
+            component["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(f"Warmup {name}: {component['status']} in {component['duration_ms']} ms")
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    @property
+    def ready(self) -> bool:
+        return all(component["status"] in ("ready", "deferred") for component in self.components.values())
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(component) for name, component in self.components.items()}
+
+
+warmup = Warmup([("agent", _warm_agent), ("rag", _warm_rag)])
@@ -2,8 +2,13 @@
 KMA Chat Agent - LLM functionality for language model configuration and usage.
 """
 
-from .config import LLMConfig, get_llm, get_gemini_llm
+from .config import LLMConfig, get_llm, get_gemini_llm, get_routed_llm
 from .HFChatModel import HuggingFaceChatModel as HFChatModel
+from .routing_model import RoutingChatModel, latency_tracker
+from .cache import TieredLLMCache, get_llm_cache
+from .fake import FakeChatModel, FakeEmbeddings
 
 __version__ = "0.1.0"
-__all__ = ["LLMConfig", "get_llm", "get_gemini_llm", "HFChatModel"] 
\ No newline at end of file
+__all__ = ["LLMConfig", "get_llm", "get_gemini_llm", "get_routed_llm", "HFChatModel",
+           "RoutingChatModel", "latency_tracker", "TieredLLMCache", "get_llm_cache",
+           "FakeChatModel", "FakeEmbeddings"] 
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Exact-match cache cho response của LLM.
+
+Cache gồm hai tầng: LRU trong bộ nhớ và (tuỳ chọn) SQLite trên đĩa. Key được tạo từ
+model, tham số gọi model (llm_string của LangChain) và prompt đã chuẩn hoá, nên chỉ
+nên bật cho các lời gọi deterministic (temperature=0) như rewrite câu hỏi, grade
+tài liệu hay tóm tắt văn bản. Mỗi call site tự opt-in bằng `get_gemini_llm(cache=True)`.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+RETURN_VAL_TYPE = Sequence[Generation]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return _normalize_text(value)
+    if isinstance(value, list):
+        return [_normalize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize_value(item) for key, item in value.items()}
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Chuẩn hoá Unicode (NFC) và gộp khoảng trắng để các prompt chỉ khác nhau về định dạng dùng chung key.
+
+    Chat model truyền prompt là danh sách message đã serialize (langchain dumps, JSON escape
+    "\\uXXXX" và "\\n"), nên prompt JSON được parse và chuẩn hoá từng chuỗi bên trong trước khi
+    serialize lại; prompt văn bản thường được chuẩn hoá trực tiếp.
+    """
+    if prompt[:1] in ("[", "{"):
+        try:
+            parsed = json.loads(prompt)
+        except ValueError:
+            pass
+        else:
+            return json.dumps(_normalize_value(parsed), ensure_ascii=False, sort_keys=True)
+    return _normalize_text(prompt)
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """Tạo key cache từ tham số model và prompt đã chuẩn hoá."""
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteCacheTier:
+    """Tầng cache trên đĩa lưu generations đã serialize theo key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.warning(f"Cannot deserialize cached LLM response: {e}")
+            return None
+
+    def set(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        payload = dumps(list(value))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class TieredLLMCache(BaseCache):
+    """LangChain cache gồm LRU trong bộ nhớ và tầng SQLite tuỳ chọn, kèm thống kê hit/miss."""
+
+    def __init__(self, max_size: int = 1024, sqlite_path: Optional[str] = None):
+        self.max_size = max_size
+        self._memory: "OrderedDict[str, RETURN_VAL_TYPE]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = SQLiteCacheTier(sqlite_path) if sqlite_path else None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _remember(self, key: str, value: RETURN_VAL_TYPE) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+        increment(f"llm_cache.{name}")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Tìm response đã cache cho prompt và model."""
+        key = make_cache_key(prompt, llm_string)
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+        if value is not None:
+            self._count("memory_hits")
+            # Trả về bản sao để caller không sửa object đang nằm trong cache
+            return [generation.model_copy(deep=True) for generation in value]
+
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._count("disk_hits")
+                self._remember(key, value)
+                return [generation.model_copy(deep=True) for generation in value]
+
+        self._count("misses")
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Lưu response của model vào cả hai tầng cache."""
+        key = make_cache_key(prompt, llm_string)
+        value = [generation.model_copy(deep=True) for generation in return_val]
+        self._remember(key, value)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, value)
+            except Exception as e:
+                logger.warning(f"Cannot persist LLM response to disk cache: {e}")
+        self._count("writes")
+
+    def clear(self, **kwargs: Any) -> None:
+        """Xoá toàn bộ cache."""
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Trả về số lần hit/miss và tỉ lệ hit của cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = round(hits / total, 4) if total else 0.0
+        stats["disk_enabled"] = self._disk is not None
+        return stats
+
+
+_llm_cache: Optional[TieredLLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> TieredLLMCache:
+    """
+    Lấy cache LLM dùng chung của process.
+
+    Cấu hình qua biến môi trường LLM_CACHE_MAX_SIZE (số entry trong bộ nhớ) và
+    LLM_CACHE_SQLITE_PATH (đường dẫn file SQLite, bỏ trống để tắt tầng đĩa).
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = TieredLLMCache(
+                    max_size=int(os.environ.get("LLM_CACHE_MAX_SIZE", "1024")),
+                    sqlite_path=os.environ.get("LLM_CACHE_SQLITE_PATH") or None,
+                )
+    return _llm_cache
@@ -0,0 +1,217 @@
+"""
+Chat model và embeddings giả lập, chạy hoàn toàn local, dùng cho load test và benchmark.
+
+FakeChatModel mô phỏng latency (phân phối cấu hình được), tốc độ sinh token và các
+tool call theo kịch bản; FakeEmbeddings sinh vector deterministic bằng feature hashing
+nên các câu giống nhau có vector gần nhau. Cùng prompt và cùng seed luôn cho cùng kết quả.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+DEFAULT_FAKE_RESPONSE = "Đây là câu trả lời giả lập từ FakeChatModel."
+
+
+class LatencyDistribution:
+    """
+    Phân phối latency đọc từ chuỗi cấu hình dạng "<loại>:<tham số>".
+
+    Hỗ trợ: "constant:0.5", "uniform:0.2,1.0", "normal:0.8,0.2" và "lognormal:-0.5,0.4"
+    (tham số của lognormal là mu, sigma của log latency). Đơn vị là giây.
+    """
+
+    def __init__(self, spec: str = "constant:0"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("constant", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unsupported latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Lấy một mẫu latency (không âm) từ phân phối."""
+        if self.kind == "constant":
+            value = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            value = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            value = rng.gauss(self.params[0], self.params[1])
+        else:
+            value = rng.lognormvariate(self.params[0], self.params[1])
+        return max(0.0, value)
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước tính số token (~4 ký tự = 1 token), giống cách ước tính ở backend."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model giả lập có latency, tốc độ token và tool call theo kịch bản.
+
+    - `responses`: danh sách câu trả lời; câu được chọn theo hash của prompt.
+    - `tool_calls`: kịch bản tool call ({"name": ..., "args": {...}}). Khi model đã được
+      bind tools và message cuối là câu hỏi của người dùng, mọi tool call có tên nằm
+      trong danh sách tool đã bind được trả về trong cùng một AIMessage. Giá trị "{query}"
+      trong args được thay bằng nội dung câu hỏi.
+    - `latency`: phân phối thời gian tới token đầu tiên (xem LatencyDistribution).
+    - `tokens_per_second`: tốc độ sinh token; 0 nghĩa là trả về ngay. Khi stream, mỗi token
+      (~4 ký tự) được phát sau 1/tokens_per_second giây nên tổng thời gian bằng lời gọi thường.
+    """
+
+    responses: List[str] = Field(default_factory=lambda: [DEFAULT_FAKE_RESPONSE])
+    tool_calls: List[Dict[str, Any]] = Field(default_factory=list)
+    latency: str = Field(default="constant:0")
+    tokens_per_second: float = Field(default=0.0)
+    seed: int = Field(default=0)
+    bound_tools: List[Dict[str, Any]] = Field(default_factory=list)
+    tool_choice: Optional[Any] = Field(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"responses": self.responses, "tool_calls": self.tool_calls, "latency": self.latency,
+                "tokens_per_second": self.tokens_per_second, "seed": self.seed}
+
+    def bind_tools(self, tools: Sequence[Any], tool_choice: Optional[Any] = None, **kwargs) -> "FakeChatModel":
+        """Ghi nhớ schema của các tool để có thể sinh tool call theo kịch bản."""
+        formatted = [convert_to_openai_tool(tool)["function"] for tool in tools]
+        return self.model_copy(update={"bound_tools": formatted, "tool_choice": tool_choice})
+
+    def _plan(self, messages: List[BaseMessage]) -> tuple:
+        """Quyết định message trả về và thời gian tới token đầu tiên cho một lượt gọi."""
+        prompt = "\n".join(str(m.content) for m in messages)
+        rng = random.Random(self.seed ^ _stable_hash(prompt))
+        last = messages[-1] if messages else None
+        query = str(last.content) if last is not None else ""
+
+        tool_calls = []
+        if self.bound_tools and not isinstance(last, ToolMessage):
+            bound_names = {tool["name"] for tool in self.bound_tools}
+            for call in self.tool_calls:
+                if call["name"] in bound_names:
+                    args = {k: (query if v == "{query}" else v) for k, v in call.get("args", {}).items()}
+                    tool_calls.append({"name": call["name"], "args": args,
+                                       "id": f"call_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}"})
+            # with_structured_output: buộc gọi tool duy nhất với giá trị mặc định theo schema
+            if not tool_calls and self.tool_choice is not None and len(self.bound_tools) == 1:
+                schema = self.bound_tools[0]
+                tool_calls.append({"name": schema["name"], "args": self._default_args(schema),
+                                   "id": f"call_{uuid.UUID(int=rng.getrandbits(128)).hex[:12]}"})
+
+        content = "" if tool_calls else self.responses[_stable_hash(prompt) % len(self.responses)]
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(content) + 10 * len(tool_calls)
+        latency = LatencyDistribution(self.latency).sample(rng)
+
+        message = AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                            "total_tokens": input_tokens + output_tokens},
+            response_metadata={"model_name": "fake"},
+        )
+        return message, latency
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generation_time(self, message: AIMessage) -> float:
+        return message.usage_metadata["output_tokens"] * self._token_delay()
+
+    @staticmethod
+    def _default_args(schema: Dict[str, Any]) -> Dict[str, Any]:
+        defaults = {"string": "yes", "integer": 0, "number": 0.0, "boolean": True, "array": [], "object": {}}
+        properties = schema.get("parameters", {}).get("properties", {})
+        return {name: defaults.get(prop.get("type"), "yes") for name, prop in properties.items()}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        message, latency = self._plan(messages)
+        time.sleep(latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        message, latency = self._plan(messages)
+        await asyncio.sleep(latency + self._generation_time(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[Any] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        """Phát câu trả lời theo từng token: chờ latency tới token đầu rồi 1/tokens_per_second mỗi token."""
+        message, latency = self._plan(messages)
+        await asyncio.sleep(latency)
+        token_delay = self._token_delay()
+        content = str(message.content)
+        for start in range(0, len(content), 4):
+            await asyncio.sleep(token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + 4]))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+        # Chunk cuối mang tool call (sinh sau 10 token mỗi call) và usage của cả lượt
+        await asyncio.sleep(10 * len(message.tool_calls) * token_delay)
+        tool_call_chunks = [{"name": call["name"], "args": json.dumps(call["args"], ensure_ascii=False),
+                             "id": call["id"], "index": i} for i, call in enumerate(message.tool_calls)]
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks,
+                                                         usage_metadata=message.usage_metadata,
+                                                         response_metadata=message.response_metadata))
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings deterministic bằng feature hashing trên các token của văn bản."""
+
+    def __init__(self, dimensions: int = 768, latency: str = "constant:0", seed: int = 0):
+        self.dimensions = dimensions
+        self.latency = LatencyDistribution(latency)
+        self.seed = seed
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        tokens = text.lower().split() or [""]
+        for token in tokens:
+            h = _stable_hash(f"{self.seed}:{token}")
+            vector[h % self.dimensions] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _delay(self, texts: List[str]) -> float:
+        return self.latency.sample(random.Random(self.seed ^ _stable_hash("\n".join(texts))))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay([text]))
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(texts))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay([text]))
+        return self._embed(text)
@@ -0,0 +1,159 @@
+"""
+HTTP stub tương thích Ollama API, trả lời bằng FakeChatModel và FakeEmbeddings.
+
+Dùng để benchmark các thành phần gọi Ollama qua HTTP (ChatOllama, OllamaEmbeddings)
+mà không cần GPU hay mạng. Chạy: `python -m llm.fake_server --port 11434`, sau đó trỏ
+OLLAMA_API_URL / OLLAMA_BASE_URL tới địa chỉ của stub.
+"""
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import typer
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from .fake import FakeChatModel, FakeEmbeddings, estimate_tokens
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _to_messages(raw_messages: List[Dict[str, Any]]) -> List[BaseMessage]:
+    messages = []
+    for msg in raw_messages:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if role == "system":
+            messages.append(SystemMessage(content=content))
+        elif role == "assistant":
+            messages.append(AIMessage(content=content))
+        elif role == "tool":
+            messages.append(ToolMessage(content=content, tool_call_id=msg.get("tool_call_id", "")))
+        else:
+            messages.append(HumanMessage(content=content))
+    return messages
+
+
+def create_app(chat_model: FakeChatModel = None, embeddings: FakeEmbeddings = None) -> FastAPI:
+    """Tạo FastAPI app giả lập các endpoint chính của Ollama."""
+    chat_model = chat_model or FakeChatModel(
+        latency=os.environ.get("FAKE_LLM_LATENCY", "constant:0"),
+        tokens_per_second=float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+        seed=int(os.environ.get("FAKE_LLM_SEED", "0")),
+    )
+    embeddings = embeddings or FakeEmbeddings(
+        dimensions=int(os.environ.get("FAKE_EMBEDDING_DIMENSIONS", "768")),
+        latency=os.environ.get("FAKE_EMBEDDING_LATENCY", "constant:0"),
+    )
+    app = FastAPI(title="Fake Ollama", description="Ollama-compatible stub for load testing")
+
+    def _model_for(tools: List[Dict[str, Any]]) -> FakeChatModel:
+        if not tools:
+            return chat_model
+        return chat_model.model_copy(update={"bound_tools": [t.get("function", t) for t in tools]})
+
+    def _final_chunk(model_name: str, prompt_text: str, message: AIMessage, elapsed: float) -> Dict[str, Any]:
+        return {
+            "model": model_name,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(elapsed * 1e9),
+            "prompt_eval_count": estimate_tokens(prompt_text),
+            "eval_count": estimate_tokens(str(message.content)),
+        }
+
+    def _tool_calls(message: AIMessage) -> Dict[str, Any]:
+        if not message.tool_calls:
+            return {}
+        return {"tool_calls": [{"function": {"name": c["name"], "arguments": c["args"]}} for c in message.tool_calls]}
+
+    async def _answer(model: FakeChatModel, model_name: str, prompt_text: str, messages: List[BaseMessage],
+                      stream: bool, to_body: Callable[[str, AIMessage], Dict[str, Any]]):
+        """
+        Trả lời một request: JSON duy nhất khi stream=false, ngược lại NDJSON theo từng token.
+
+        Khi stream, thời gian chờ chỉ đến từ FakeChatModel._astream (latency tới token đầu rồi
+        1/tokens_per_second mỗi token), không chờ thêm lần nữa ở phía server.
+        """
+        start = time.monotonic()
+        if not stream:
+            message = await model.ainvoke(messages)
+            return {**_final_chunk(model_name, prompt_text, message, time.monotonic() - start),
+                    **to_body(str(message.content), message)}
+
+        async def chunks():
+            merged = None
+            async for chunk in model.astream(messages):
+                merged = chunk if merged is None else merged + chunk
+                if chunk.content:
+                    out = {"model": model_name, "created_at": _now(), "done": False,
+                           **to_body(str(chunk.content), None)}
+                    yield json.dumps(out, ensure_ascii=False) + "\n"
+            message = AIMessage(content=merged.content, tool_calls=merged.tool_calls)
+            final = {**_final_chunk(model_name, prompt_text, message, time.monotonic() - start),
+                     **to_body("", message)}
+            yield json.dumps(final, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake:latest", "model": "fake:latest", "modified_at": _now(), "size": 0}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        messages = _to_messages(body.get("messages", []))
+        prompt_text = "\n".join(str(m.content) for m in messages)
+
+        def to_body(content: str, message: Optional[AIMessage]) -> Dict[str, Any]:
+            return {"message": {"role": "assistant", "content": content,
+                                **(_tool_calls(message) if message is not None else {})}}
+
+        return await _answer(_model_for(body.get("tools", [])), body.get("model", "fake"), prompt_text, messages,
+                             body.get("stream", True), to_body)
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        messages = [HumanMessage(content=body.get("prompt", ""))]
+        if body.get("system"):
+            messages.insert(0, SystemMessage(content=body["system"]))
+        return await _answer(chat_model, body.get("model", "fake"), body.get("prompt", ""), messages,
+                             body.get("stream", True), lambda content, message: {"response": content})
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        vectors = await embeddings.aembed_documents(inputs)
+        return {"model": body.get("model", "fake"), "embeddings": vectors}
+
+    @app.post("/api/embeddings")
+    async def embeddings_legacy(request: Request):
+        body = await request.json()
+        return {"embedding": await embeddings.aembed_query(body.get("prompt", ""))}
+
+    return app
+
+
+cli = typer.Typer()
+
+
+@cli.command()
+def start(port: int = 11434, host: str = "127.0.0.1"):
+    """Run the fake Ollama server"""
+    uvicorn.run(create_app(), host=host, port=port)
+
+
+if __name__ == "__main__":
+    cli()
@@ -4,12 +4,19 @@ LLM Factory để tạo các instance model khác nhau dựa trên loại model
 from typing import Optional, Dict, Any, List
 from langchain_core.language_models import BaseChatModel
 from langchain.callbacks.manager import CallbackManager
-from langchain_ollama import ChatOllama
+from langchain_core.caches import BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import ChatOllama, OllamaEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
+import logging
 import os
 
 from .HFChatModel import HuggingFaceChatModel
+from .fake import FakeChatModel, FakeEmbeddings
 from .model_manager import model_manager, ModelType
+from .routing_model import RoutingChatModel
+
+logger = logging.getLogger(__name__)
 
 class LLMFactory:
     """Factory để tạo các instance LLM khác nhau dựa trên cấu hình."""
@@ -28,6 +35,21 @@ class LLMFactory:
         # Lấy loại model đang hoạt động
         model_type = model_manager.get_model_type()
         
+        return cls.create_llm_for_type(model_type, callback_manager)
+    
+    @classmethod
+    def create_llm_for_type(cls, model_type: str,
+                            callback_manager: Optional[CallbackManager] = None) -> BaseChatModel:
+        """
+        Tạo instance LLM cho một loại model cụ thể.
+        
+        Args:
+            model_type: Loại model (huggingface, ollama, gemini)
+            callback_manager: Optional callback manager cho tracing
+            
+        Returns:
+            BaseChatModel: Instance LLM tương ứng
+        """
         # Lấy các tham số chung
         temperature = model_manager.get_temperature()
         max_tokens = model_manager.get_max_tokens()
@@ -37,9 +59,77 @@ class LLMFactory:
             return cls._create_ollama_model(temperature, max_tokens, callback_manager)
         elif model_type == ModelType.GEMINI:
             return cls._create_gemini_model(temperature, max_tokens, callback_manager)
+        elif model_type == ModelType.FAKE:
+            return cls.create_fake_llm(callback_manager)
         else:  # HUGGINGFACE hoặc loại khác
             return cls._create_huggingface_model(temperature, max_tokens, callback_manager)
     
+    @classmethod
+    def create_routing_llm(cls, primary: Optional[BaseChatModel] = None, primary_name: Optional[str] = None,
+                           callback_manager: Optional[CallbackManager] = None) -> RoutingChatModel:
+        """
+        Tạo routing model gồm model chính và các provider dự phòng đã cấu hình.
+        
+        Args:
+            primary: Model chính; mặc định là model đang hoạt động
+            primary_name: Loại provider của model chính (dùng để bỏ trùng với danh sách dự phòng)
+            callback_manager: Optional callback manager cho tracing
+            
+        Returns:
+            RoutingChatModel: Model áp deadline, hedging và fallback giữa các provider
+        """
+        if primary is None:
+            primary_type = str(model_manager.get_model_type())
+            primary = cls.create_llm(callback_manager)
+        else:
+            primary_type = primary_name or getattr(primary, "_llm_type", type(primary).__name__)
+        
+        models = [primary]
+        names = [primary_type]
+        for provider in model_manager.get_fallback_providers():
+            if provider in names:
+                continue
+            try:
+                models.append(cls.create_llm_for_type(provider, callback_manager))
+                names.append(provider)
+            except Exception as e:
+                logger.warning(f"Cannot create fallback provider {provider}: {e}")
+        
+        return RoutingChatModel(
+            models=models,
+            provider_names=names,
+            timeout=model_manager.get_request_timeout(),
+            hedge=model_manager.get_hedge_enabled(),
+        )
+    
+    @classmethod
+    def create_fake_llm(cls, callback_manager: Optional[CallbackManager] = None,
+                        cache: Optional[BaseCache] = None) -> FakeChatModel:
+        """Tạo model giả lập cho load test (không gọi mạng)."""
+        fake_info = model_manager.get_fake_info()
+        params = {k: v for k, v in fake_info.items() if v is not None}
+        
+        return FakeChatModel(callback_manager=callback_manager, cache=cache, **params)
+    
+    @classmethod
+    def create_embeddings(cls) -> Embeddings:
+        """
+        Tạo embeddings dùng cho vector store.
+        
+        Returns:
+            Embeddings: FakeEmbeddings ở chế độ giả lập, ngược lại là OllamaEmbeddings (nomic-embed-text)
+        """
+        if model_manager.is_fake_mode() or os.environ.get("EMBEDDING_PROVIDER") == ModelType.FAKE.value:
+            return FakeEmbeddings(
+                dimensions=int(os.environ.get("FAKE_EMBEDDING_DIMENSIONS", "768")),
+                latency=os.environ.get("FAKE_EMBEDDING_LATENCY", "constant:0"),
+            )
+        
+        base_url = os.environ.get("OLLAMA_BASE_URL")
+        if base_url:
+            return OllamaEmbeddings(model="nomic-embed-text", base_url=base_url)
+        return OllamaEmbeddings(model="nomic-embed-text")
+    
     @classmethod
     def _create_ollama_model(cls, temperature: float, max_tokens: int, 
                             callback_manager: Optional[CallbackManager] = None) -> ChatOllama:
@@ -51,6 +141,8 @@ class LLMFactory:
             url=ollama_info["url"],
             temperature=temperature,
             max_tokens=max_tokens,
+            # Giữ model trong bộ nhớ để Ollama tái sử dụng KV cache của system prefix
+            keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", "30m"),
             callback_manager=callback_manager
         )
     
@@ -66,6 +158,7 @@ class LLMFactory:
             model=gemini_info["model"],
             temperature=temperature,
             max_output_tokens=max_tokens,
+            timeout=model_manager.get_request_timeout(),
             callback_manager=callback_manager
         )
     
@@ -20,6 +20,7 @@ class ModelType(str, Enum):
     HUGGINGFACE = "huggingface"
     OLLAMA = "ollama"
     GEMINI = "gemini"
+    FAKE = "fake"
     OTHER = "other"
 
 class ModelManager:
@@ -239,13 +240,24 @@ class ModelManager:
             return active_model.get("path", os.environ.get("DEFAULT_MODEL_PATH", "NousResearch/Hermes-2-Pro-Llama-3-8B"))
         return os.environ.get("DEFAULT_MODEL_PATH", "NousResearch/Hermes-2-Pro-Llama-3-8B")
     
+    def is_fake_mode(self) -> bool:
+        """
+        Kiểm tra chế độ giả lập LLM (LLM_FAKE_MODE) dùng cho load test, không cần MongoDB hay mạng.
+        
+        Returns:
+            bool: True nếu mọi LLM và embeddings phải dùng bản giả lập.
+        """
+        return os.environ.get("LLM_FAKE_MODE", "false").lower() in ("1", "true", "yes")
+    
     def get_model_type(self) -> str:
         """
         Lấy loại của mô hình đang hoạt động.
         
         Returns:
-            str: Loại mô hình (huggingface, ollama, gemini, other)
+            str: Loại mô hình (huggingface, ollama, gemini, fake, other)
         """
+        if self.is_fake_mode():
+            return ModelType.FAKE
         active_model = self.get_active_model()
         if active_model:
             return active_model.get("modelType", ModelType.HUGGINGFACE)
@@ -305,6 +317,26 @@ class ModelManager:
             "token": os.environ.get("HF_TOKEN", "")
         }
     
+    def get_fake_info(self) -> Dict[str, Any]:
+        """
+        Lấy cấu hình cho model giả lập.
+        
+        Returns:
+            Dict[str, Any]: Phân phối latency, tốc độ token, seed, câu trả lời và tool call theo kịch bản.
+        """
+        info = {
+            "latency": os.environ.get("FAKE_LLM_LATENCY", "constant:0"),
+            "tokens_per_second": float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "0")),
+            "seed": int(os.environ.get("FAKE_LLM_SEED", "0")),
+            "responses": json.loads(os.environ["FAKE_LLM_RESPONSES"]) if os.environ.get("FAKE_LLM_RESPONSES") else None,
+            "tool_calls": json.loads(os.environ.get("FAKE_LLM_TOOL_CALLS", "[]")),
+        }
+        if not self.is_fake_mode():
+            active_model = self.get_active_model()
+            if active_model and active_model.get("modelType") == ModelType.FAKE:
+                info.update({k: v for k, v in active_model.get("fake", {}).items() if k in info})
+        return info
+    
     def get_temperature(self) -> float:
         """
         Lấy giá trị temperature từ mô hình đang hoạt động.
@@ -323,5 +355,39 @@ class ModelManager:
         """
         return self.get_model_parameter("max_tokens", 2048)
 
+    def get_request_timeout(self) -> float:
+        """
+        Lấy deadline (giây) cho mỗi lần gọi LLM từ mô hình đang hoạt động.
+        
+        Returns:
+            float: Số giây tối đa chờ một provider trả lời.
+        """
+        return float(self.get_model_parameter("request_timeout", os.environ.get("LLM_REQUEST_TIMEOUT", "60")))
+    
+    def get_fallback_providers(self) -> List[str]:
+        """
+        Lấy danh sách loại provider dự phòng, theo thứ tự ưu tiên.
+        
+        Returns:
+            List[str]: Danh sách loại model (gemini, ollama, huggingface) dùng khi provider chính lỗi.
+        """
+        providers = self.get_model_parameter("fallback_providers")
+        if providers is None:
+            providers = os.environ.get("LLM_FALLBACK_PROVIDERS", "")
+        if isinstance(providers, str):
+            # Tham số trong MongoDB có thể lưu dạng chuỗi "ollama,huggingface"
+            providers = providers.split(",")
+        return [p.strip() for p in providers if p and p.strip()]
+    
+    def get_hedge_enabled(self) -> bool:
+        """
+        Kiểm tra có bật gửi request hedge tới provider dự phòng hay không.
+        
+        Returns:
+            bool: True nếu bật hedging.
+        """
+        value = self.get_model_parameter("hedge_requests", os.environ.get("LLM_HEDGE_REQUESTS", "false"))
+        return str(value).lower() in ("1", "true", "yes")
+
 # Singleton instance
 model_manager = ModelManager()
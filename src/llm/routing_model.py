@@ -0,0 +1,296 @@
+"""
+Routing chat model gửi request tới nhiều provider (Gemini, Ollama, HF) với deadline,
+hedging theo p95 latency và fallback sang provider tiếp theo khi provider trước lỗi.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+logger = logging.getLogger(__name__)
+
+# Thread pool dùng cho đường gọi đồng bộ (invoke) để có thể áp deadline và hedge. Thread không
+# huỷ được từ bên ngoài: lời gọi quá hạn bị bỏ qua nhưng vẫn giữ thread tới khi provider trả lời.
+# Mỗi lời gọi giữ một slot tới khi thật sự kết thúc; khi mọi slot bị các lời gọi treo chiếm hết,
+# request đồng bộ mới lỗi ngay thay vì xếp hàng sau chúng (đường async không bị ảnh hưởng).
+SYNC_MAX_WORKERS = int(os.environ.get("LLM_ROUTER_SYNC_WORKERS", "16"))
+_sync_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SYNC_MAX_WORKERS, thread_name_prefix="llm-router")
+_sync_slots = threading.BoundedSemaphore(SYNC_MAX_WORKERS)
+
+
+def _submit_sync(fn, *args, **kwargs) -> Optional[concurrent.futures.Future]:
+    """Chạy fn trong _sync_executor nếu còn slot, None nếu mọi thread đang bận."""
+    if not _sync_slots.acquire(blocking=False):
+        return None
+    slots = _sync_slots
+    try:
+        future = _sync_executor.submit(fn, *args, **kwargs)
+    except Exception:
+        slots.release()
+        raise
+    # Trả slot khi lời gọi kết thúc hoặc bị huỷ trước khi chạy
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+class LatencyTracker:
+    """Lưu latency gần nhất của từng provider để tính ngưỡng hedge và thống kê winner."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._wins: Dict[str, int] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float) -> None:
+        """Ghi nhận latency của một request thành công."""
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def record_failure(self, provider: str) -> None:
+        """Ghi nhận một request lỗi hoặc quá hạn."""
+        with self._lock:
+            self._failures[provider] = self._failures.get(provider, 0) + 1
+
+    def record_win(self, provider: str) -> None:
+        """Ghi nhận provider đã trả lời trước tiên."""
+        with self._lock:
+            self._wins[provider] = self._wins.get(provider, 0) + 1
+
+    def percentile(self, provider: str, quantile: float) -> Optional[float]:
+        """
+        Tính percentile latency của provider.
+
+        Returns:
+            Optional[float]: Giá trị percentile (giây), hoặc None nếu chưa đủ mẫu.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(quantile * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Trả về thống kê latency, số lần thắng và số lần lỗi của từng provider."""
+        with self._lock:
+            providers = set(self._samples) | set(self._wins) | set(self._failures)
+            snapshot = {p: list(self._samples.get(p, ())) for p in providers}
+            wins = dict(self._wins)
+            failures = dict(self._failures)
+        result = {}
+        for provider, samples in snapshot.items():
+            ordered = sorted(samples)
+            result[provider] = {
+                "count": len(ordered),
+                "wins": wins.get(provider, 0),
+                "failures": failures.get(provider, 0),
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else None,
+            }
+        return result
+
+
+# Tracker dùng chung để thống kê không bị mất khi model được tạo lại mỗi lượt chat
+latency_tracker = LatencyTracker()
+
+
+class RoutingChatModel(BaseChatModel):
+    """
+    Chat model bọc nhiều BaseChatModel theo thứ tự ưu tiên.
+
+    Mỗi lần gọi provider bị giới hạn bởi `timeout`. Nếu provider lỗi hoặc quá hạn,
+    request được chuyển sang provider tiếp theo. Khi bật `hedge`, nếu provider đang chạy
+    chưa trả lời sau ngưỡng p95 latency của nó, một request trùng lặp được gửi tới
+    provider tiếp theo và kết quả về trước được dùng. Provider thắng được ghi vào
+    `response_metadata["routed_provider"]` và `generation_info` của chính response đó
+    (model được dùng chung giữa các request nên không giữ provider trên instance).
+    """
+
+    models: List[Any] = Field(default_factory=list, exclude=True)
+    provider_names: List[str] = Field(default_factory=list)
+    timeout: float = Field(default=60.0)
+    hedge: bool = Field(default=False)
+    hedge_quantile: float = Field(default=0.95)
+    hedge_min_delay: float = Field(default=2.0)
+    tracker: LatencyTracker = Field(default_factory=lambda: latency_tracker, exclude=True)
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def __init__(self, models: List[Any], provider_names: Optional[List[str]] = None, **kwargs):
+        if not models:
+            raise ValueError("RoutingChatModel requires at least one model")
+        if provider_names is None:
+            provider_names = [getattr(m, "_llm_type", type(m).__name__) for m in models]
+        if len(provider_names) != len(models):
+            raise ValueError("provider_names must have the same length as models")
+        super().__init__(models=models, provider_names=provider_names, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"providers": self.provider_names, "timeout": self.timeout, "hedge": self.hedge}
+
+    def bind_tools(self, tools: List[Any], **kwargs) -> "RoutingChatModel":
+        """Bind tools cho từng provider bên dưới và trả về routing model mới."""
+        bound = [model.bind_tools(tools, **kwargs) for model in self.models]
+        return self.model_copy(update={"models": bound})
+
+    def _hedge_delay(self, provider: str) -> float:
+        """Thời gian chờ trước khi gửi request hedge, dựa trên p95 latency của provider."""
+        p95 = self.tracker.percentile(provider, self.hedge_quantile)
+        if p95 is None:
+            return max(self.hedge_min_delay, self.timeout / 2)
+        return max(self.hedge_min_delay, p95)
+
+    def _finish(self, message: BaseMessage, provider: str) -> ChatResult:
+        self.tracker.record_win(provider)
+        message.response_metadata = {**(message.response_metadata or {}), "routed_provider": provider}
+        logger.info(f"LLM request served by provider: {provider}")
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info={"routed_provider": provider})],
+                          llm_output={"routed_provider": provider})
+
+    def _no_provider_error(self, errors: List[tuple]) -> RuntimeError:
+        details = "; ".join(f"{name}: {type(err).__name__}: {err}" for name, err in errors)
+        return RuntimeError(f"All LLM providers failed ({details})")
+
+    # --- Đường gọi bất đồng bộ ---
+
+    async def _acall_provider(self, index: int, messages: List[BaseMessage], stop: Optional[List[str]],
+                              **kwargs) -> BaseMessage:
+        provider = self.provider_names[index]
+        start = time.monotonic()
+        try:
+            message = await asyncio.wait_for(
+                self.models[index].ainvoke(messages, stop=stop, **kwargs),
+                timeout=self.timeout)
+        except asyncio.CancelledError:
+            # Request hedge thua bị huỷ: không phải lỗi của provider
+            raise
+        except Exception:
+            self.tracker.record_failure(provider)
+            raise
+        self.tracker.record(provider, time.monotonic() - start)
+        return message
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        pending: Dict[asyncio.Task, str] = {}
+        errors: List[tuple] = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            task = asyncio.ensure_future(self._acall_provider(next_index, messages, stop, **kwargs))
+            pending[task] = self.provider_names[next_index]
+            next_index += 1
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge and len(pending) == 1 and next_index < len(self.models)
+                wait_timeout = self._hedge_delay(next(iter(pending.values()))) if can_hedge else None
+                done, _ = await asyncio.wait(pending.keys(), timeout=wait_timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging LLM request to provider: {self.provider_names[next_index]}")
+                    launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        return self._finish(task.result(), provider)
+                    logger.warning(f"LLM provider {provider} failed: {task.exception()!r}")
+                    errors.append((provider, task.exception()))
+                if not pending and next_index < len(self.models):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise self._no_provider_error(errors)
+
+    # --- Đường gọi đồng bộ ---
+
+    def _call_provider(self, index: int, messages: List[BaseMessage], stop: Optional[List[str]],
+                       **kwargs) -> BaseMessage:
+        provider = self.provider_names[index]
+        start = time.monotonic()
+        try:
+            message = self.models[index].invoke(messages, stop=stop, **kwargs)
+        except Exception:
+            self.tracker.record_failure(provider)
+            raise
+        self.tracker.record(provider, time.monotonic() - start)
+        return message
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        pending: Dict[concurrent.futures.Future, tuple] = {}
+        errors: List[tuple] = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            provider = self.provider_names[next_index]
+            future = _submit_sync(self._call_provider, next_index, messages, stop, **kwargs)
+            next_index += 1
+            if future is None:
+                logger.warning(f"All {SYNC_MAX_WORKERS} sync LLM router threads are busy, skipping {provider}")
+                errors.append((provider, RuntimeError("all sync LLM router threads are busy with timed-out calls")))
+                return
+            pending[future] = (provider, time.monotonic() + self.timeout)
+
+        launch()
+        try:
+            while pending:
+                now = time.monotonic()
+                # Provider vượt deadline bị bỏ qua (thread vẫn chạy và giữ slot nhưng kết quả không được dùng)
+                for future, (provider, deadline) in list(pending.items()):
+                    if now >= deadline:
+                        pending.pop(future)
+                        self.tracker.record_failure(provider)
+                        errors.append((provider, TimeoutError(f"no response within {self.timeout}s")))
+                if not pending:
+                    if next_index < len(self.models):
+                        launch()
+                        continue
+                    break
+
+                wait_timeout = min(deadline for _, deadline in pending.values()) - now
+                can_hedge = self.hedge and len(pending) == 1 and next_index < len(self.models)
+                if can_hedge:
+                    wait_timeout = min(wait_timeout, self._hedge_delay(next(iter(pending.values()))[0]))
+                done, _ = concurrent.futures.wait(pending.keys(), timeout=max(0.0, wait_timeout),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and all(time.monotonic() < d for _, d in pending.values()):
+                        logger.info(f"Hedging LLM request to provider: {self.provider_names[next_index]}")
+                        launch()
+                    continue
+                for future in done:
+                    provider, _ = pending.pop(future)
+                    if future.exception() is None:
+                        return self._finish(future.result(), provider)
+                    logger.warning(f"LLM provider {provider} failed: {future.exception()!r}")
+                    errors.append((provider, future.exception()))
+                if not pending and next_index < len(self.models):
+                    launch()
+        finally:
+            for future in pending:
+                future.cancel()
+        raise self._no_provider_error(errors)
@@ -3,8 +3,8 @@ KMA Regulations Assistant - A chatbot for answering questions about
 regulations at the Academy of Cryptographic Techniques (KMA).
 """
 
-from .tool import create_rag_tool, search_kma_regulations
+from .tool import create_rag_tool, search_kma_regulations, prefetch_regulations
 from .rag_graph import process_kma_query, get_retriever
 
 __version__ = "0.1.0"
-__all__ = ["create_rag_tool", "search_kma_regulations", "process_kma_query", "get_retriever"]
+__all__ = ["create_rag_tool", "search_kma_regulations", "prefetch_regulations", "process_kma_query", "get_retriever"]
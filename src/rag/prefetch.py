@@ -0,0 +1,197 @@
+"""
+Truy xuất tài liệu suy đoán (speculative retrieval) cho RAG.
+
+Khi câu hỏi đến agent (nguyên văn, hoặc sau khi được viết lại), retriever chạy trước trong lúc
+agent LLM đang quyết định gọi tool. Nếu sau đó RAG graph truy xuất đúng câu hỏi đó (so khớp
+prefetch_key) thì dùng luôn kết quả đã có thay vì chạy lại; kết quả không được dùng sẽ hết hạn
+sau một TTL ngắn. Không so khớp gần đúng: "thi lại" và "học lại" chung gần hết các từ nhưng
+là hai câu hỏi khác nhau.
+
+SpeculativeRAG đi xa hơn: trong lúc agent LLM đang quyết định gọi tool nào, toàn bộ tool RAG
+(truy xuất, hoặc truy xuất + sinh câu trả lời) được chạy trước trên câu hỏi của người dùng.
+Nếu agent gọi search_kma_regulations với đúng câu hỏi đó trong cùng request thì dùng kết quả,
+nếu không thì huỷ. Chế độ chọn bằng RAG_SPECULATIVE_MODE: "off" (mặc định), "retrieve" hoặc "answer".
+"""
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+
+def strip_diacritics(query: str) -> str:
+    """Chuẩn hoá câu hỏi giống process_user_query của KMAChatAgent (bỏ dấu, chỉ giữ ASCII)."""
+    return unicodedata.normalize('NFD', query).encode('ascii', 'ignore').decode('utf-8')
+
+
+def prefetch_key(query: str) -> str:
+    # "đ" không tách dấu được bằng NFD nên đổi trước để "định" và "dinh" có cùng key
+    query = query.replace("đ", "d").replace("Đ", "D")
+    return re.sub(r"\s+", " ", strip_diacritics(query).lower()).strip(" ?.!")
+
+
+class RetrievalPrefetcher:
+    """Chạy retriever trước trong thread nền và giữ kết quả theo câu hỏi đã chuẩn hoá."""
+
+    def __init__(self, retriever: BaseRetriever, ttl_seconds: float = 60.0, max_entries: int = 64,
+                 max_workers: int = 2):
+        self.retriever = retriever
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Future, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-prefetch")
+
+    def _evict(self, now: float) -> None:
+        for key in [k for k, (_, created) in self._entries.items() if now - created > self.ttl_seconds]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def submit(self, query: str) -> None:
+        """Bắt đầu truy xuất cho câu hỏi nếu chưa có kết quả đang chạy hoặc còn hạn."""
+        key = prefetch_key(query)
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if key in self._entries:
+                return
+            future = self._executor.submit(self.retriever.get_relevant_documents, strip_diacritics(query))
+            self._entries[key] = (future, now)
+        increment("rag.prefetch.submitted")
+        logger.info(f"Speculative retrieval started for: {query}")
+
+    def take(self, query: str, timeout: Optional[float] = None) -> Optional[List[Document]]:
+        """
+        Lấy kết quả đã truy xuất trước cho câu hỏi (đợi nếu đang chạy).
+
+        Returns:
+            Optional[List[Document]]: Danh sách tài liệu, hoặc None nếu không có prefetch phù hợp.
+        """
+        key = prefetch_key(query)
+        with self._lock:
+            self._evict(time.time())
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            increment("rag.prefetch.miss")
+            return None
+        try:
+            docs = entry[0].result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed, retrieving again: {e}")
+            return None
+        increment("rag.prefetch.hit")
+        return docs
+
+    def discard(self, query: str) -> None:
+        """Bỏ kết quả truy xuất trước không còn cần (huỷ nếu chưa bắt đầu chạy)."""
+        key = prefetch_key(query)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[0].cancel()
+
+
+def is_prefetch_enabled() -> bool:
+    return os.environ.get("RAG_SPECULATIVE_PREFETCH", "true").lower() in ("1", "true", "yes")
+
+
+class SpeculativeRAG:
+    """Chạy trước tool RAG trên câu hỏi của người dùng, song song với lượt LLM của agent."""
+
+    def __init__(self, run: Callable[[str, threading.Event], str], ttl_seconds: float = 60.0, max_workers: int = 2):
+        """
+        Args:
+            run: Hàm đồng bộ (câu hỏi, cancel_event) -> câu trả lời của tool RAG
+            ttl_seconds: Thời gian giữ kết quả chưa được dùng
+            max_workers: Số câu hỏi chạy trước đồng thời tối đa
+        """
+        self.run = run
+        self.ttl_seconds = ttl_seconds
+        # handle -> ((scope, prefetch_key), future, cancel_event, thời điểm bắt đầu)
+        self._entries: Dict[int, Tuple[Tuple[str, str], Future, threading.Event, float]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-speculative")
+
+    def start(self, query: str, scope: str) -> Optional[int]:
+        """
+        Bắt đầu chạy trước tool RAG cho câu hỏi.
+
+        Args:
+            query: Câu hỏi của người dùng
+            scope: Định danh request đã bắt đầu lượt chạy; chỉ request đó mới claim được kết quả
+
+        Returns:
+            Optional[int]: Handle để huỷ, hoặc None nếu câu hỏi rỗng
+        """
+        key = prefetch_key(query)
+        if not key:
+            return None
+        cancel_event = threading.Event()
+        with self._lock:
+            now = time.time()
+            for stale in [h for h, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]:
+                self._drop(stale)
+            handle = next(self._ids)
+            future = self._executor.submit(self.run, query, cancel_event)
+            self._entries[handle] = ((scope, key), future, cancel_event, now)
+        increment("rag.speculative.started")
+        logger.info(f"Speculative RAG started for: {query}")
+        return handle
+
+    def claim(self, query: str, scope: str) -> Optional[Future]:
+        """Lấy kết quả chạy trước của đúng câu hỏi này trong cùng scope, hoặc None."""
+        key = (scope, prefetch_key(query))
+        with self._lock:
+            handle = next((h for h, entry in self._entries.items() if entry[0] == key), None)
+            entry = self._entries.pop(handle) if handle is not None else None
+        increment(f"rag.speculative.{'hit' if entry is not None else 'miss'}")
+        return entry[1] if entry is not None else None
+
+    def cancel(self, handle: Optional[int]) -> None:
+        """Huỷ lượt chạy trước không được dùng (dừng ở bước kế tiếp của RAG graph)."""
+        with self._lock:
+            if handle is not None and handle in self._entries:
+                self._drop(handle)
+                increment("rag.speculative.cancelled")
+
+    def _drop(self, handle: int) -> None:
+        _, future, cancel_event, _ = self._entries.pop(handle)
+        cancel_event.set()
+        future.cancel()
+
+
+def get_speculative_mode() -> str:
+    mode = os.environ.get("RAG_SPECULATIVE_MODE", "off").lower()
+    return mode if mode in ("retrieve", "answer") else "off"
+
+
+def speculation_stats(counters: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    """
+    Tỷ lệ trúng của truy xuất suy đoán và SpeculativeRAG tính từ các counter của telemetry.
+
+    hit_rate là phần lượt chạy trước được dùng lại; gần 0 nghĩa là chỉ tốn thêm truy xuất,
+    khi đó nên tắt RAG_SPECULATIVE_PREFETCH / RAG_SPECULATIVE_MODE.
+    """
+    stats = {}
+    for name, started_counter in (("prefetch", "rag.prefetch.submitted"), ("speculative", "rag.speculative.started")):
+        started = counters.get(started_counter, 0)
+        hits = counters.get(f"rag.{name}.hit", 0)
+        stats[name] = {"started": started, "hits": hits,
+                       "hit_rate": round(hits / started, 4) if started else 0.0}
+    return stats
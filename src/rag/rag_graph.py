@@ -239,6 +239,7 @@
 # Toggle comment for deploy to Streamlit or LangGraph UI
 # graph = KMAChatAgent()
 
+import asyncio
 import logging
 import os
 import unicodedata
@@ -246,13 +247,16 @@ from pathlib import Path
 from typing import Literal, Dict, Any
 
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
 from langsmith import Client
 from pydantic import Field, BaseModel
 
+from agent.graph_registry import graph_registry
 # Đảm bảo bạn đã import get_gemini_llm từ llm.py
 from llm import LLMConfig, get_gemini_llm 
+from rag.prefetch import RetrievalPrefetcher
 from rag.retriever import create_hybrid_retriever
 
 # Set up logging
@@ -265,6 +269,59 @@ class GradeDocuments(BaseModel):
     binary_score: str = Field(description="Relevance score: 'yes' if relevant, or 'no' if not relevant")
 
 
+RAG_AGENT_CONFIG_KEY = "rag_agent"
+CANCEL_EVENT_CONFIG_KEY = "cancel_event"
+
+
+class RAGCancelled(Exception):
+    """Lượt chạy RAG bị huỷ (ví dụ lượt chạy trước không còn cần)."""
+
+
+def _rag_node(method_name: str):
+    """Node gọi method của KMAChatAgent được truyền qua config["configurable"]["rag_agent"]"""
+    def node(state: MessagesState, config: RunnableConfig):
+        # Lượt chạy trước bị huỷ dừng ở ranh giới node, trước lượt LLM/truy xuất tiếp theo
+        cancel_event = config["configurable"].get(CANCEL_EVENT_CONFIG_KEY)
+        if cancel_event is not None and cancel_event.is_set():
+            raise RAGCancelled(method_name)
+        agent = config["configurable"][RAG_AGENT_CONFIG_KEY]
+        return getattr(agent, method_name)(state)
+
+    node.__name__ = method_name
+    return node
+
+
+def _compile_rag_graph():
+    """Build the LangGraph workflow"""
+    workflow = StateGraph(MessagesState)
+
+    # Define the nodes
+    workflow.add_node("process_user_query", _rag_node("process_user_query"))
+    workflow.add_node("retrieve_documents", _rag_node("retrieve_documents"))
+    workflow.add_node("rewrite_question", _rag_node("rewrite_question"))
+    workflow.add_node("generate_answer", _rag_node("generate_answer"))
+
+    # Set up edges
+    workflow.add_edge(START, "process_user_query")
+    workflow.add_edge("process_user_query", "retrieve_documents")
+
+    # Conditional edges after retrieval
+    workflow.add_conditional_edges("retrieve_documents", _rag_node("grade_documents"),
+        {"generate_answer": "generate_answer", "rewrite_question": "rewrite_question"})
+
+    workflow.add_edge("generate_answer", END)
+    workflow.add_edge("rewrite_question", "process_user_query")
+
+    graph = workflow.compile()
+    logger.info("Workflow graph compiled successfully")
+    return graph
+
+
+def build_rag_graph():
+    """Lấy RAG graph đã compile từ graph_registry (compile một lần cho cả process)"""
+    return graph_registry.get_or_compile(("rag",), _compile_rag_graph)
+
+
 # Helper function for score_tool.py to use
 async def process_kma_query(query: str, retriever=None, llm=None) -> Dict[str, Any]:
     """Process a KMA regulation query and return the answer with sources.
@@ -382,7 +439,11 @@ class KMAChatAgent:
         try:
             self.llm = get_gemini_llm(model_name=model_name, callback_manager=self.callback_manager)
             # Sử dụng cùng mô hình cho grader, Gemini thường tốt với structured_output
-            self.grader_model = get_gemini_llm(model_name=model_name, callback_manager=self.callback_manager)
+            # Grade và rewrite là hàm thuần của input (temperature=0) nên dùng cache
+            self.grader_model = get_gemini_llm(model_name=model_name, callback_manager=self.callback_manager,
+                                               cache=True)
+            self.rewrite_llm = get_gemini_llm(model_name=model_name, callback_manager=self.callback_manager,
+                                              cache=True)
             logger.info(f"Initialized LLMs with Gemini model: {model_name}")
         except ValueError as e:
             logger.error(f"Failed to initialize Gemini LLM: {e}. Please ensure GOOGLE_API_KEY is set and valid.")
@@ -390,13 +451,14 @@ class KMAChatAgent:
 
         # Store the retriever - use custom retriever if provided, otherwise default KMA retriever
         self.retriever = custom_retriever if custom_retriever is not None else self.get_retriever()
+        # Kết quả truy xuất chạy trước trên câu hỏi gốc (trong lúc agent viết lại câu hỏi)
+        self.prefetcher = RetrievalPrefetcher(self.retriever)
 
         # Load prompts from files
         self.prompts = self._load_prompts()
 
-        # Build the workflow
-        self.workflow = StateGraph(MessagesState)
-        self.graph = self._build_workflow()
+        # Graph đã compile dùng chung giữa các instance, instance được truyền qua config khi invoke
+        self.graph = build_rag_graph()
 
     def _load_prompts(self):
         """Load all prompts from text files"""
@@ -421,63 +483,6 @@ class KMAChatAgent:
         """Get the hybrid retriever"""
         return get_retriever()
 
-    def _build_workflow(self):
-        """Build the LangGraph workflow"""
-        workflow = self.workflow
-
-        # Define the nodes
-        workflow.add_node("process_user_query", self.process_user_query) # Thêm tên node rõ ràng
-        workflow.add_node("retrieve_documents", self.retrieve_documents)
-        workflow.add_node("rewrite_question", self.rewrite_question)
-        workflow.add_node("generate_answer", self.generate_answer)
-
-        # Set up edges
-        workflow.add_edge(START, "process_user_query")
-        workflow.add_edge("process_user_query", "retrieve_documents")
-
-        # Conditional edges after retrieval
-        workflow.add_conditional_edges("retrieve_documents", self.grade_documents,
-            {"generate_answer": "generate_answer", "rewrite_question": "rewrite_question"})
-
-        workflow.add_edge("generate_answer", END)
-        workflow.add_edge("rewrite_question", "process_user_query")
-
-        # Log the workflow structure
-        logger.info("Workflow structure created with nodes and edges")
-
-        # Compile the graph với cấu hình recursion limit
-        try:
-            graph = workflow.compile()
-            logger.info("Workflow graph compiled successfully")
-        except Exception as e:
-            logger.error(f"Error compiling workflow graph: {str(e)}")
-            raise
-
-        # Generate and log the Mermaid diagram
-        try:
-            mermaid_diagram = graph.get_graph().draw_mermaid()
-            logger.info("Mermaid diagram:")
-            logger.info(mermaid_diagram)
-
-            logger.info("Saving Mermaid diagram to file")
-            current_dir = Path(__file__).parent.absolute()
-            project_root = current_dir.parent.parent
-            mermaid_dir_path = os.path.join(project_root, "mermaid")
-            os.makedirs(mermaid_dir_path, exist_ok=True) # Đảm bảo thư mục tồn tại
-            mermaid_path = os.path.join(mermaid_dir_path, "rag_mermaid.mmd")
-
-            # Save the diagram to a file
-            with open(mermaid_path, "w") as f:
-                f.write(mermaid_diagram)
-                f.close()
-
-            logger.info("Mermaid diagram saved successfully")
-
-        except Exception as e:
-            logger.error(f"Error generating Mermaid diagram: {str(e)}")
-
-        return graph
-
     def process_user_query(self, state: MessagesState):
         """Process the user query for retrieval"""
         # Normalize the query for better processing
@@ -492,8 +497,10 @@ class KMAChatAgent:
         """Directly retrieve documents using the retriever"""
         query = state["messages"][0].content
         logger.info(f"Retrieving documents for query: {query}")
-        # Get documents from the retriever
-        docs = self.retriever.get_relevant_documents(query)
+        # Dùng kết quả speculative retrieval nếu đã có cho đúng câu hỏi này
+        docs = self.prefetcher.take(query)
+        if docs is None:
+            docs = self.retriever.get_relevant_documents(query)
         # Combine document content
         combined_content = "\n\n".join([doc.page_content for doc in docs])
         # Add the retrieved content as a system message
@@ -556,7 +563,7 @@ class KMAChatAgent:
         logger.info(f"Rewriting question (attempt {rewrite_count}): {question}")
         
         prompt = self.prompts["rewrite"].format(question=question)
-        response = self.llm.invoke([{"role": "user", "content": prompt}])
+        response = self.rewrite_llm.invoke([{"role": "user", "content": prompt}])
         rewritten_question = response.content
         logger.info(f"Rewritten question: {rewritten_question}")
         
@@ -584,20 +591,28 @@ class KMAChatAgent:
         logger.info(f"Generated answer.")
         return {"messages": state["messages"][:-1] + [response]} # Xóa context message trước khi thêm câu trả lời cuối cùng
 
-    def chat(self, message):
+    def chat(self, message, cancel_event=None):
         """Process a single chat message and return the response"""
         query = {"messages": [HumanMessage(content=message)]}
         logger.info(f"Starting chat for query: {message}")
         try:
             # Invoke với cấu hình recursion limit cao hơn
-            config = {"recursion_limit": 50}
+            config = {"recursion_limit": 50,
+                      "configurable": {RAG_AGENT_CONFIG_KEY: self, CANCEL_EVENT_CONFIG_KEY: cancel_event}}
             response = self.graph.invoke(query, config=config)
             final_answer = response["messages"][-1].content
             logger.info(f"Chat completed. Answer: {final_answer[:100]}...")
             return final_answer
+        except RAGCancelled as e:
+            logger.info(f"Chat cancelled before node {e}")
+            raise
         except Exception as e:
             logger.error(f"Error during chat processing: {str(e)}")
             return f"Đã xảy ra lỗi trong quá trình xử lý: {str(e)}"
 
+    async def achat(self, message, cancel_event=None):
+        """Async version of chat; runs the sync graph in a worker thread so the event loop stays free"""
+        return await asyncio.to_thread(self.chat, message, cancel_event)
+
 # Toggle comment for deploy to Streamlit or LangGraph UI
 # graph = KMAChatAgent()
\ No newline at end of file
@@ -1,18 +1,14 @@
 import glob
 import os
-import io
-import sys
-from typing import List, Optional
+from typing import Any, List, Optional
 import tempfile
 
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings
 from pydantic import Field, BaseModel
 from llm.config import get_gemini_llm
+from llm.llm_factory import LLMFactory
 
 # Optional imports for file processing
 try:
@@ -27,14 +23,22 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
 
-# Set UTF-8 encoding
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+
+# FAISS và BM25 (langchain_community, faiss, rank_bm25) chỉ được import khi thực sự dựng
+# retriever, để import module này (và backend/UI) không phải nạp chúng
+def _faiss():
+    from langchain_community.vectorstores import FAISS
+    return FAISS
+
+
+def _bm25():
+    from langchain_community.retrievers import BM25Retriever
+    return BM25Retriever
 
 
 class HybridRetriever(BaseRetriever, BaseModel):
-    vectorstore: FAISS = Field(description="FAISS vector store")
-    bm25_retriever: BM25Retriever = Field(description="BM25 retriever")
+    vectorstore: Any = Field(description="FAISS vector store")
+    bm25_retriever: Any = Field(description="BM25 retriever")
     k: int = Field(default=4, description="Number of documents to retrieve")
 
     class Config:
@@ -100,15 +104,10 @@ def create_vector_database(output_path, data_dir="./data"):
         )
         chunks = text_splitter.split_text(regulations)
 
-        # embeddings = OllamaEmbeddings(
-        #     model="nomic-embed-text",
-        #     base_url="http://ollama:11434"
-        # )
-        embeddings = OllamaEmbeddings(
-            model="nomic-embed-text"
-        )
+        # OllamaEmbeddings (nomic-embed-text), đặt OLLAMA_BASE_URL=http://ollama:11434 khi chạy docker
+        embeddings = LLMFactory.create_embeddings()
 
-        vectorstore = FAISS.from_texts(chunks, embeddings)
+        vectorstore = _faiss().from_texts(chunks, embeddings)
 
         if os.path.dirname(output_path):
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -124,13 +123,8 @@ def create_vector_database(output_path, data_dir="./data"):
 
 def load_vector_database(output_path, data_dir="./data"):
     try:
-        # embeddings = OllamaEmbeddings(
-        #     model="nomic-embed-text",
-        #     base_url="http://ollama:11434"
-        # )
-        embeddings = OllamaEmbeddings(
-            model="nomic-embed-text"
-        )
+        # OllamaEmbeddings (nomic-embed-text), đặt OLLAMA_BASE_URL=http://ollama:11434 khi chạy docker
+        embeddings = LLMFactory.create_embeddings()
 
         if not os.path.exists(output_path):
             chunks = create_vector_database(output_path, data_dir)
@@ -146,7 +140,7 @@ def load_vector_database(output_path, data_dir="./data"):
             chunks = text_splitter.split_text(regulations)
 
         print("Loading vector database...")
-        return FAISS.load_local(output_path, embeddings, allow_dangerous_deserialization=True), chunks
+        return _faiss().load_local(output_path, embeddings, allow_dangerous_deserialization=True), chunks
     except Exception as e:
         print(f"Error loading vector database: {e}")
         raise
@@ -154,7 +148,7 @@ def load_vector_database(output_path, data_dir="./data"):
 
 def create_hybrid_retriever(vector_db_path, data_dir="./data"):
     vectorstore, documents = load_vector_database(vector_db_path, data_dir)
-    bm25_retriever = BM25Retriever.from_texts(texts=documents, k=15)
+    bm25_retriever = _bm25().from_texts(texts=documents, k=15)
 
     return HybridRetriever(
         vectorstore=vectorstore, 
@@ -216,18 +210,13 @@ def create_in_memory_retriever(file_content: str, chunk_size: int = 400, chunk_o
         chunks = text_splitter.split_text(file_content)
         
       
-        embeddings = OllamaEmbeddings(
-            model="nomic-embed-text"
-        )
-        # embeddings = OllamaEmbeddings(
-        #     model="nomic-embed-text",
-        #     base_url="http://ollama:11434"
-        # )
+        # OllamaEmbeddings (nomic-embed-text), đặt OLLAMA_BASE_URL=http://ollama:11434 khi chạy docker
+        embeddings = LLMFactory.create_embeddings()
         # Create in-memory FAISS vector store
-        vectorstore = FAISS.from_texts(chunks, embeddings)
+        vectorstore = _faiss().from_texts(chunks, embeddings)
         
         # Create BM25 retriever
-        bm25_retriever = BM25Retriever.from_texts(texts=chunks, k=k)
+        bm25_retriever = _bm25().from_texts(texts=chunks, k=k)
         
         # Create hybrid retriever
         hybrid_retriever = HybridRetriever(
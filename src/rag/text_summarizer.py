@@ -81,7 +81,7 @@ class TextSummarizer:
             try:
                 # Khởi tạo Gemini trực tiếp
                 logger.info(f"Using Gemini model: {os.environ.get('GEMINI_MODEL')}")
-                self.llm = get_gemini_llm()
+                self.llm = get_gemini_llm(cache=True)
                 logger.info(f"Initialized Gemini LLM for text summarization")
             except Exception as e:
                 logger.error(f"Failed to initialize LLM: {str(e)}")
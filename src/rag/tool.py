@@ -5,53 +5,64 @@ This tool allows querying information from all documents in the system, includin
 rules, policies, and any other uploaded documents in the data directory.
 """
 
-from langchain_core.tools import tool
+import asyncio
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
 from pydantic import BaseModel, Field
 
+from rag.prefetch import is_prefetch_enabled
 from rag.rag_graph import KMAChatAgent
 
+RAG_TOOL_DESCRIPTION = ("Search for information in all training documents including KMA's regulations, "
+                        "rules, policies, and any other uploaded documents in the data directory. "
+                        "Uses a LangGraph-based RAG system to retrieve and process information. "
+                        "The query must be provided.")
+
 
 class KMARegulationInput(BaseModel):
     query: str = Field(description="The query to search for in all available documents")
 
 
-# Initialize the KMAChatAgent as a singleton
-_chat_agent = None
+def _default_runtime():
+    # Import muộn: agent.runtime import module này để tạo tool cho từng runtime
+    from agent.runtime import get_runtime
+    return get_runtime()
 
 
-def get_chat_agent():
-    """Get or create a singleton instance of KMAChatAgent"""
-    global _chat_agent
-    if _chat_agent is None:
-        _chat_agent = KMAChatAgent()
-    return _chat_agent
+def get_chat_agent() -> KMAChatAgent:
+    """Get the KMAChatAgent of the default agent runtime"""
+    return _default_runtime().get_rag_agent()
 
 
-@tool("search_kma_regulations", args_schema=KMARegulationInput,
-      description=("Search for information in all training documents including KMA's regulations, "
-                   "rules, policies, and any other uploaded documents in the data directory. "
-                   "Uses a LangGraph-based RAG system to retrieve and process information. "
-                   "The query must be provided."))
-async def search_kma_regulations(query: str) -> str:
+async def _search(runtime, query: str, scope=None) -> str:
     """
     Search for information in all training documents in the knowledge base.
     Uses a LangGraph-based RAG system to retrieve and process information.
 
     Args:
+        runtime: AgentRuntime sở hữu KMAChatAgent (retriever, LLM clients)
         query: The question or search query about any content in the knowledge base
+        scope: speculation_scope của lượt chạy graph gọi tool (None khi gọi ngoài graph)
 
     Returns:
-        A JSON string containing the retrieved information and sources
+        The answer generated from the retrieved documents
     """
     try:
-        # Get the KMAChatAgent instance
-        agent = get_chat_agent()
+        # Câu trả lời đã được chạy trước trong lúc agent LLM quyết định (RAG_SPECULATIVE_MODE=answer)
+        speculative = runtime.claim_speculation(query, scope)
+        if speculative is not None:
+            try:
+                return await asyncio.wrap_future(speculative)
+            except Exception:
+                # Lượt chạy trước lỗi: chạy lại tool như bình thường
+                pass
 
-        # Use the agent's chat method to process the query
-        response = agent.chat(query)
+        # Get the KMAChatAgent instance (lần đầu được nạp trong worker thread)
+        agent = runtime.loaded_rag_agent or await asyncio.to_thread(runtime.get_rag_agent)
 
-        # Format response
-        result = {"answer": response, "message": "KMA regulation information retrieved successfully"}
+        # Chạy RAG graph (sync) trong thread riêng để các tool khác chạy song song
+        response = await agent.achat(query)
 
         return response
 
@@ -64,8 +75,34 @@ async def search_kma_regulations(query: str) -> str:
         return "Error searching KMA regulations"
 
 
-def create_rag_tool():
-    """Create a configured instance of the RAG tool."""
-    # Initialize the agent so it's ready when needed
-    get_chat_agent()
-    return search_kma_regulations
+def create_rag_tool(runtime=None) -> BaseTool:
+    """
+    Create a configured instance of the RAG tool.
+
+    Args:
+        runtime: AgentRuntime mà tool dùng để truy xuất; mặc định là runtime mặc định tại thời điểm gọi tool.
+            KMAChatAgent được tạo ở lần gọi đầu tiên hoặc khi warmup.
+
+    Returns:
+        BaseTool: Tool "search_kma_regulations" gắn với runtime
+    """
+    async def search_kma_regulations(query: str, config: RunnableConfig) -> str:
+        # Import muộn như _default_runtime
+        from agent.runtime import speculation_scope
+        return await _search(runtime if runtime is not None else _default_runtime(), query,
+                             speculation_scope(config))
+
+    return StructuredTool.from_function(coroutine=search_kma_regulations, name="search_kma_regulations",
+                                        description=RAG_TOOL_DESCRIPTION, args_schema=KMARegulationInput)
+
+
+search_kma_regulations = create_rag_tool()
+
+
+def prefetch_regulations(query: str, runtime=None) -> None:
+    """Start a speculative retrieval for a question that will likely reach the RAG tool."""
+    runtime = runtime if runtime is not None else _default_runtime()
+    # Không tạo agent ở đây: việc nạp retriever sẽ chặn event loop của node gọi hàm này
+    agent = runtime.loaded_rag_agent
+    if is_prefetch_enabled() and agent is not None:
+        agent.prefetcher.submit(query)
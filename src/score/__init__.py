@@ -7,7 +7,10 @@ This package provides tools for accessing and processing student score data.
 from .score_tool import get_student_scores
 from .student_tool import get_student_info
 from .calculator_tool import calculate_average_scores
+from .gpa_tool import get_student_gpa
+from .class_tool import get_class_scores
 from .database import Database
+from .tool_cache import ToolResultCache, tool_cache
 from .models import Student, Subject, Score, ScoreWithDetails, ScoreFilter, ScoreResponse
 
 __version__ = "0.1.0"
@@ -15,7 +18,11 @@ __all__ = [
     "get_student_scores",
     "get_student_info",
     "calculate_average_scores",
+    "get_student_gpa",
+    "get_class_scores",
     "Database",
+    "ToolResultCache",
+    "tool_cache",
     "Student", 
     "Subject", 
     "Score", 
@@ -0,0 +1,160 @@
+"""
+Kiểm tra plan của các truy vấn điểm bằng EXPLAIN.
+
+Mặc định tạo schema tạm score_bench, chạy migration, sinh dữ liệu giả lập nhiều năm học
+(generate_series), VACUUM ANALYZE rồi chạy EXPLAIN (ANALYZE, BUFFERS) cho từng câu lệnh
+của score.queries. Truy vấn có lọc theo student_code phải đọc bảng scores bằng index-only
+scan; Seq Scan trên scores làm lệnh thoát với mã 1, nên có thể dùng trong CI.
+
+    python -m score.benchmark --students 20000 --years 8
+    python -m score.benchmark --no-seed   # kiểm tra trên dữ liệu thật (search_path hiện tại)
+"""
+import asyncio
+import json
+from typing import Any, Dict, Iterator, List, Tuple
+
+import typer
+
+from .database import Database
+from .migrations import upgrade_connection
+from .queries import GPA_BY_SEMESTER, SCORE_FILTERS, SCORE_QUERIES
+
+BENCH_SCHEMA = "score_bench"
+
+SEED_STUDENTS = """
+    INSERT INTO students (student_code, student_name, student_class)
+    SELECT 'CT' || lpad(i::text, 6, '0'), 'Student ' || i, 'CT' || lpad((i % 60)::text, 2, '0')
+    FROM generate_series(1, $1) AS i
+"""
+
+SEED_SUBJECTS = """
+    INSERT INTO subjects (subject_id, subject_name, subject_credits)
+    SELECT i, 'Subject ' || i, 2 + i % 3
+    FROM generate_series(1, $1) AS i
+"""
+
+# Mỗi sinh viên học $2 môn khác nhau trong mỗi kỳ của $1
+SEED_SCORES = """
+    INSERT INTO scores (student_code, subject_id, semester, score_first, score_second, score_final, score_over_rall)
+    SELECT st.student_code, ((st.n * 7 + sem.idx * $2 + k) % $3) + 1, sem.name,
+           round((random() * 10)::numeric, 1), round((random() * 10)::numeric, 1),
+           round((random() * 10)::numeric, 1), round((random() * 10)::numeric, 1)
+    FROM (SELECT student_code, row_number() OVER (ORDER BY student_code) AS n FROM students) AS st
+    CROSS JOIN unnest($1::text[]) WITH ORDINALITY AS sem(name, idx)
+    CROSS JOIN generate_series(0, $2 - 1) AS k
+"""
+
+
+def bench_semesters(years: int, first_year: int = 2016) -> List[str]:
+    return [f"ki{term}-{year}-{year + 1}" for year in range(first_year, first_year + years) for term in (1, 2)]
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def scores_access(plan: Dict[str, Any]) -> List[str]:
+    """Cách các node của plan đọc bảng scores (Index Only Scan, Index Scan, Seq Scan, ...)."""
+    return [f"{node['Node Type']}" + (f" using {node['Index Name']}" if node.get("Index Name") else "")
+            for node in _plan_nodes(plan) if node.get("Relation Name") == "scores"]
+
+
+async def explain(conn, query: str, params: List[Any]) -> Dict[str, Any]:
+    """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) của một câu lệnh."""
+    result = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *params)
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+async def _sample_params(conn) -> Dict[str, Any]:
+    record = await conn.fetchrow(
+        "SELECT student_code, semester, subject_id FROM scores ORDER BY semester DESC LIMIT 1")
+    if record is None:
+        raise typer.BadParameter("The scores table is empty, nothing to explain")
+    return dict(record)
+
+
+def _cases(sample: Dict[str, Any], pass_threshold: float) -> Iterator[Tuple[str, str, List[Any], bool]]:
+    """(tên, SQL, tham số, có bắt buộc index-only không) cho mọi câu lệnh cần kiểm tra."""
+    for flags, query in SCORE_QUERIES.items():
+        names = [name for (name, _), enabled in zip(SCORE_FILTERS, flags) if enabled]
+        yield ("scores(" + ", ".join(names) + ")", query, [sample[name] for name in names],
+               "student_code" in names)
+    yield "gpa_by_semester", GPA_BY_SEMESTER, [sample["student_code"], pass_threshold], True
+
+
+async def run_benchmark(db: Database, seed: bool, students: int, subjects: int, years: int,
+                        subjects_per_semester: int, keep: bool) -> List[Dict[str, Any]]:
+    """
+    Chạy EXPLAIN cho các truy vấn điểm.
+
+    Returns:
+        List[Dict[str, Any]]: Mỗi truy vấn gồm cách đọc bảng scores, thời gian thực thi,
+        số buffer và kết quả kiểm tra (ok / warn / fail)
+    """
+    pool = await db.connect()
+    async with pool.acquire() as conn:
+        try:
+            if seed:
+                await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+                await conn.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+                await conn.execute(f"SET search_path TO {BENCH_SCHEMA}")
+                await upgrade_connection(conn, timeout=db.maintenance_timeout)
+                await conn.execute(SEED_STUDENTS, students, timeout=db.maintenance_timeout)
+                await conn.execute(SEED_SUBJECTS, subjects, timeout=db.maintenance_timeout)
+                await conn.execute(SEED_SCORES, bench_semesters(years), subjects_per_semester, subjects,
+                                   timeout=db.maintenance_timeout)
+                # Cập nhật visibility map để index-only scan không phải đọc lại heap
+                await conn.execute("VACUUM ANALYZE students, subjects, scores", timeout=db.maintenance_timeout)
+            sample = await _sample_params(conn)
+            results = []
+            for name, query, params, require_index_only in _cases(sample, db.pass_threshold):
+                plan = await explain(conn, query, params)
+                access = scores_access(plan["Plan"])
+                if any(node.startswith("Seq Scan") for node in access):
+                    check = "fail" if require_index_only else "warn"
+                elif require_index_only and not all(node.startswith("Index Only Scan") for node in access):
+                    check = "warn"
+                else:
+                    check = "ok"
+                results.append({
+                    "query": name,
+                    "scores_access": access,
+                    "execution_ms": plan.get("Execution Time"),
+                    "shared_buffers": plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0),
+                    "rows": plan["Plan"].get("Actual Rows"),
+                    "check": check,
+                })
+            return results
+        finally:
+            if seed and not keep:
+                await conn.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+            await conn.execute("RESET search_path")
+
+
+cli = typer.Typer()
+
+
+@cli.command()
+def main(seed: bool = True, students: int = 20000, subjects: int = 120, years: int = 8,
+         subjects_per_semester: int = 6, keep: bool = False):
+    """EXPLAIN the score queries and check that per-student lookups stay index-only"""
+
+    async def run():
+        db = Database()
+        try:
+            return await run_benchmark(db, seed, students, subjects, years, subjects_per_semester, keep)
+        finally:
+            await db.close()
+
+    results = asyncio.run(run())
+    for row in results:
+        typer.echo(f"[{row['check']:>4}] {row['query']:<42} {row['execution_ms']:>9.3f} ms "
+                   f"{row['shared_buffers']:>7} buf  {', '.join(row['scores_access']) or '-'}")
+    if any(row["check"] == "fail" for row in results):
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
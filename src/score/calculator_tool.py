@@ -3,6 +3,9 @@ import re
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from score.encoding import expand_compact
+from score.gpa_engine import ScoreArrays, gpa_engine
+
 
 class ScoreCalculatorInput(BaseModel):
     scores_json: str = Field(description="JSON string OR raw text containing scores data")
@@ -25,20 +28,23 @@ def parse_scores_to_json(raw_text: str) -> dict:
 
 
 @tool("calculate_average_scores", args_schema=ScoreCalculatorInput,
-      description=("Calculate average scores (GPA) from provided scores data. "
-                   "Input can be a JSON string with field 'scores' or raw text in format 'Tên môn (x tín chỉ): điểm'"))
+      description=("Calculate credit-weighted average scores (GPA, 10-point and 4-point scale) "
+                   "from provided scores data. "
+                   "Input can be a JSON string with field 'scores', the output of get_student_scores / "
+                   "get_class_scores, or raw text in format 'Tên môn (x tín chỉ): điểm'"))
 def calculate_average_scores(scores_json: str) -> str:
     """
     Calculate average scores from provided scores data.
     Args:
         scores_json: JSON string OR raw text containing scores data
     Returns:
-        JSON string containing GPA and total credits
+        JSON string containing GPA (10-point and 4-point), total credits and per-semester GPA
     """
     try:
         # Nếu là JSON
         try:
-            data = json.loads(scores_json)
+            # Kết quả dạng compact (columns + rows) được đưa về danh sách điểm
+            data = expand_compact(json.loads(scores_json))
         except json.JSONDecodeError:
             # Nếu không phải JSON → parse từ text
             data = parse_scores_to_json(scores_json)
@@ -46,18 +52,27 @@ def calculate_average_scores(scores_json: str) -> str:
         if "scores" not in data or not data["scores"]:
             return json.dumps({"averages": {}, "message": "No scores data provided"})
 
-        scores = data["scores"]
-
-        total_weighted_score = sum(s["score_over_rall"] * s["subject_credits"] for s in scores)
-        total_credits = sum(s["subject_credits"] for s in scores)
+        # Kết quả của get_student_scores để số tín chỉ trong "subject"; môn chưa có điểm bị bỏ qua
+        arrays = ScoreArrays.from_records(data["scores"])
+        summary = gpa_engine.summarize(arrays)
+        overall = summary["overall"]
 
-        if total_credits == 0:
+        if not overall or overall["credits"] == 0:
             return json.dumps({"averages": {}, "message": "Total credits is zero, cannot calculate average"})
 
-        average_score = round(total_weighted_score / total_credits, 2)
+        averages = {
+            "average_score": overall["gpa_10"],
+            "total_credits": overall["credits"],
+            "average_score_4": overall["gpa_4"],
+            "credits_passed": overall["credits_passed"],
+            "credits_failed": overall["credits_failed"],
+        }
+        # Chỉ thêm phần theo học kỳ khi dữ liệu có nhiều học kỳ
+        if len(summary["semesters"]) > 1:
+            averages["semesters"] = summary["semesters"]
 
         return json.dumps({
-            "averages": {"average_score": average_score, "total_credits": total_credits},
+            "averages": averages,
             "message": "Average scores calculated successfully"
         }, ensure_ascii=False)
 
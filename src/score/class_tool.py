@@ -0,0 +1,73 @@
+"""
+Tool tra cứu điểm của cả lớp hoặc một nhóm sinh viên.
+
+Cố vấn học tập, lớp trưởng thường hỏi điểm của cả lớp; thay vì gọi get_student_scores cho
+từng sinh viên, get_class_scores lấy tất cả bằng một truy vấn (= ANY($1) hoặc theo lớp) và
+trả về điểm gom theo sinh viên, không lặp lại thông tin sinh viên ở mỗi dòng điểm.
+"""
+import json
+import os
+import re
+from typing import List, Optional
+
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from score.encoding import dumps, encode_class_scores, output_format
+from score.student_tool import global_db
+
+SEMESTER_PATTERN = re.compile(r"^(ki|k)[1-4]-\d{4}-\d{4}$")
+
+# Số sinh viên tối đa trong một lần tra cứu theo danh sách mã
+MAX_BATCH_STUDENTS = int(os.environ.get("SCORE_MAX_BATCH_STUDENTS", "200"))
+
+
+class ClassScoresInput(BaseModel):
+    student_class: Optional[str] = Field(None, description="The class to get scores for, e.g. CT6")
+    student_codes: Optional[List[str]] = Field(None, description="A list of student codes, used instead of a class")
+    semester: Optional[str] = Field(None,
+                                    description="Filter scores by semester in format ki1-2024-2025, k2-2024-2025, etc.")
+
+
+@tool("get_class_scores", args_schema=ClassScoresInput,
+      description=("Get KMA scores for a whole class or for several students at once in one lookup. "
+                   "Provide either student_class or a list of student_codes, optionally a semester "
+                   "in format ki1-2024-2025. Use this instead of calling get_student_scores once per student."))
+async def get_class_scores(student_class: Optional[str] = None, student_codes: Optional[List[str]] = None,
+                           semester: Optional[str] = None) -> str:
+    """
+    Get scores for a class or a list of students.
+
+    Args:
+        student_class: The class to get scores for
+        student_codes: A list of student codes, used instead of a class
+        semester: Optional semester in format ki1-2024-2025
+
+    Returns:
+        A JSON string with one entry per student containing their scores
+    """
+    try:
+        if bool(student_class) == bool(student_codes):
+            return json.dumps({"students": [], "message": "Provide either student_class or student_codes"})
+        if student_codes and len(student_codes) > MAX_BATCH_STUDENTS:
+            return json.dumps({"students": [],
+                               "message": f"Too many students, at most {MAX_BATCH_STUDENTS} per lookup"})
+        if semester and not SEMESTER_PATTERN.match(semester):
+            return json.dumps({"students": [],
+                               "message": "Invalid semester format. Must be in format ki1-2024-2025, k2-2024-2025, etc."})
+
+        students = await global_db.db.get_scores_many(student_codes=student_codes, student_class=student_class,
+                                                      semester=semester)
+        target = f"class {student_class}" if student_class else f"{len(student_codes)} students"
+        if not students:
+            return json.dumps({"students": [], "message": f"No scores found for {target}" + (
+                f" in semester {semester}" if semester else "")})
+
+        message = f"Found scores of {len(students)} students for {target}" + (
+            f" in semester {semester}" if semester else "")
+        if output_format("get_class_scores") == "compact":
+            return dumps(encode_class_scores(students, message))
+        return json.dumps({"students": students, "message": message}, ensure_ascii=False)
+
+    except Exception as e:
+        return json.dumps({"students": [], "message": f"Error retrieving scores: {str(e)}"})
@@ -1,12 +1,59 @@
+import asyncio
+import itertools
+import logging
 import os
-from typing import List, Optional, Dict, Any
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Dict, Any
+from urllib.parse import urlsplit
 import asyncpg
 from dotenv import load_dotenv
 
-from .models import Score, Student, Subject, ScoreWithDetails, ScoreFilter
+from .models import Student, Subject, ScoreWithDetails, ScoreFilter
+from .queries import (GET_STUDENT, GPA_BY_SEMESTER, GPA_BY_SEMESTER_FROM_VIEW, GPA_VIEW, GPA_VIEW_THRESHOLD,
+                      REFRESH_GPA_VIEW, REPLICA_LAG, compact_score, create_gpa_view_statements, gpa_view_comment,
+                      group_by_student, score_query, score_row_to_dict, scores_many_query, semester_row_to_dict,
+                      sort_scores, student_group)
+from .subject_catalog import create_subject_catalog
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Lỗi cho thấy kết nối tới replica hỏng (không phải lỗi của câu truy vấn)
+CONNECTION_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError, asyncpg.CannotConnectNowError)
+
+
+class ReplicaPool:
+    """Pool của một read replica và độ trễ replication đo gần nhất."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.host = urlsplit(dsn).hostname or dsn.split("@")[-1]
+        self.pool = None
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def usable(self, max_lag: float) -> bool:
+        return self.pool is not None and self.lag is not None and self.lag <= max_lag
+
+    def mark_failed(self, error: Exception) -> None:
+        # Không dùng replica này cho tới lần kiểm tra tiếp theo
+        self.lag = None
+        self.error = str(error)
+        logger.warning(f"Read replica {self.host} unavailable: {error}")
+
+    def status(self, max_lag: float) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "usable": self.usable(max_lag),
+            "lag_seconds": None if self.lag is None else round(self.lag, 3),
+            "size": self.pool.get_size() if self.pool is not None else 0,
+            "error": self.error,
+        }
+
+
 class Database:
     def __init__(self):
         self.connection_pool = None
@@ -14,121 +61,353 @@ class Database:
         # self._dsn = os.getenv("POSTGRES_URI_DOCKER")
         if not self._dsn:
             raise ValueError("POSTGRES_URI environment variable is not set")
+        # Pool sống suốt vòng đời ứng dụng (FastAPI startup/shutdown, Streamlit cache_resource)
+        self.min_size = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+        self.max_size = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+        # Đặt 0 khi đi qua pgbouncer ở transaction mode (prepared statement không dùng lại được)
+        self.statement_cache_size = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100"))
+        self.max_inactive_lifetime = float(os.getenv("POSTGRES_POOL_MAX_INACTIVE_LIFETIME", "300"))
+        self.command_timeout = float(os.getenv("POSTGRES_COMMAND_TIMEOUT", "10"))
+        # Lệnh bảo trì (làm mới view, import) chạy lâu hơn truy vấn tra cứu
+        self.maintenance_timeout = float(os.getenv("POSTGRES_MAINTENANCE_TIMEOUT", "600"))
+        # Điểm tổng kết tối thiểu để môn được tính là đạt (thang 10)
+        self.pass_threshold = float(os.getenv("SCORE_PASS_THRESHOLD", "4.0"))
+        # Đọc tổng hợp GPA từ materialized view (làm mới sau mỗi lần import) thay vì tính trực tiếp
+        self.use_gpa_view = os.getenv("SCORE_GPA_VIEW", "false").lower() in ("1", "true", "yes")
+        # View đã được xác nhận dựng với đúng pass_threshold (chỉ lưu kết quả dương, chưa thì kiểm tra lại)
+        self._gpa_view_current = False
+        # Danh mục môn học thay cho JOIN subjects trong truy vấn điểm
+        self.subjects = create_subject_catalog()
+        # Read replica (phân cách bằng dấu phẩy): truy vấn đọc chia vòng tròn giữa các replica có độ
+        # trễ không quá POSTGRES_MAX_REPLICA_LAG giây, không còn replica nào thì đọc từ primary.
+        # Import, migration và làm mới view luôn chạy trên primary.
+        self.replicas = [ReplicaPool(dsn.strip()) for dsn in os.getenv("POSTGRES_READ_URIS", "").split(",")
+                         if dsn.strip()]
+        self.max_replica_lag = float(os.getenv("POSTGRES_MAX_REPLICA_LAG", "5"))
+        self.replica_check_interval = float(os.getenv("POSTGRES_REPLICA_CHECK_INTERVAL", "5"))
+        self.replica_pool_max_size = int(os.getenv("POSTGRES_REPLICA_POOL_MAX_SIZE", str(self.max_size)))
+        self._next_replica = itertools.count()
+        # Sau khi ghi, đọc từ primary thêm một khoảng max_replica_lag để thấy dữ liệu vừa ghi
+        self._primary_reads_until = 0.0
+        self._loop = None
+        self._lock = None
+        # Task nền đo lại độ trễ replica mỗi replica_check_interval giây
+        self._probe_task: Optional[asyncio.Task] = None
 
     async def connect(self):
-        """Connect to the PostgreSQL database"""
+        """Connect to the PostgreSQL database (tạo pool một lần, các lần sau dùng lại)"""
+        loop = asyncio.get_running_loop()
+        if self.connection_pool is not None and self._loop is not loop:
+            # Pool asyncpg gắn với event loop đã tạo nó (ví dụ mỗi asyncio.run tạo loop mới)
+            logger.warning("PostgreSQL pool was created on another event loop, recreating it")
+            self.connection_pool.terminate()
+            self.connection_pool = None
+            for replica in self.replicas:
+                if replica.pool is not None:
+                    replica.pool.terminate()
+                    replica.pool = None
+                replica.lag = replica.checked_at = None
+            # Task của loop cũ đã bị huỷ khi loop đó đóng
+            self._probe_task = None
         if self.connection_pool is None:
-            self.connection_pool = await asyncpg.create_pool(dsn=self._dsn)
+            if self._lock is None or self._loop is not loop:
+                self._lock = asyncio.Lock()
+                self._loop = loop
+            # Các tool call song song chỉ tạo một pool
+            async with self._lock:
+                if self.connection_pool is None:
+                    self.connection_pool = await asyncpg.create_pool(
+                        dsn=self._dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        max_inactive_connection_lifetime=self.max_inactive_lifetime,
+                        command_timeout=self.command_timeout,
+                    )
+                    logger.info(f"PostgreSQL pool created (min={self.min_size}, max={self.max_size})")
+                    if self.replicas:
+                        await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+                        self._probe_task = asyncio.create_task(self._probe_replicas())
         return self.connection_pool
 
+    async def _probe_replicas(self) -> None:
+        """Đo lại các replica định kỳ để truy vấn đọc không phải chờ kiểm tra."""
+        while True:
+            await asyncio.sleep(self.replica_check_interval)
+            await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+
+    async def _check_replica(self, replica: ReplicaPool) -> None:
+        """Tạo pool (nếu chưa có) và đo độ trễ của replica; lỗi chỉ làm replica tạm bị bỏ qua."""
+        # Đặt trước khi await để các truy vấn song song không kiểm tra trùng
+        replica.checked_at = time.monotonic()
+        try:
+            if replica.pool is None:
+                replica.pool = await asyncpg.create_pool(
+                    dsn=replica.dsn,
+                    min_size=min(self.min_size, self.replica_pool_max_size),
+                    max_size=self.replica_pool_max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    max_inactive_connection_lifetime=self.max_inactive_lifetime,
+                    command_timeout=self.command_timeout,
+                    # Replica không kết nối được không được làm chậm khởi động quá lâu
+                    timeout=self.command_timeout,
+                )
+                logger.info(f"Read replica pool created for {replica.host} (max={self.replica_pool_max_size})")
+            async with replica.pool.acquire(timeout=self.command_timeout) as conn:
+                lag = await conn.fetchval(REPLICA_LAG, timeout=self.command_timeout)
+            if lag is None:
+                raise RuntimeError("WAL receiver is not streaming from the primary")
+            replica.lag = lag
+            replica.error = None
+            if replica.lag > self.max_replica_lag:
+                logger.warning(f"Read replica {replica.host} is {replica.lag:.1f}s behind, reading from primary")
+        except Exception as e:
+            replica.mark_failed(e)
+
+    def _pick_replica(self) -> Optional[ReplicaPool]:
+        """
+        Replica tiếp theo theo vòng tròn còn dùng được; None nếu phải đọc từ primary.
+
+        Chỉ đọc trạng thái do _probe_replicas đo sẵn, không truy vấn replica trên đường đọc.
+        Kết quả đo quá cũ (task nền bị treo hoặc đã dừng) được coi như replica không dùng được.
+        """
+        now = time.monotonic()
+        if not self.replicas or now < self._primary_reads_until:
+            return None
+        stale_before = now - 3 * self.replica_check_interval
+        start = next(self._next_replica)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.checked_at is not None and replica.checked_at >= stale_before \
+                    and replica.usable(self.max_replica_lag):
+                return replica
+        return None
+
+    @asynccontextmanager
+    async def read_connection(self) -> AsyncIterator[asyncpg.Connection]:
+        """
+        Kết nối cho truy vấn chỉ đọc: từ một read replica còn dùng được, nếu không thì từ primary.
+
+        Lỗi kết nối trên replica làm nó bị bỏ qua cho tới lần kiểm tra tiếp theo; truy vấn đang
+        chạy vẫn báo lỗi cho nơi gọi.
+        """
+        pool = await self.connect()
+        replica = self._pick_replica()
+        conn = None
+        if replica is not None:
+            try:
+                conn = await replica.pool.acquire(timeout=self.command_timeout)
+                pool = replica.pool
+            except (*CONNECTION_ERRORS, asyncio.TimeoutError) as e:
+                replica.mark_failed(e)
+                replica = None
+        if conn is None:
+            conn = await pool.acquire()
+        try:
+            yield conn
+        except CONNECTION_ERRORS as e:
+            if replica is not None:
+                replica.mark_failed(e)
+            raise
+        finally:
+            await pool.release(conn)
+
+    def mark_written(self) -> None:
+        """Gọi sau khi ghi dữ liệu điểm: các truy vấn đọc dùng primary cho tới khi replica bắt kịp."""
+        if self.replicas:
+            self._primary_reads_until = time.monotonic() + self.max_replica_lag
+
     async def close(self):
         """Close all database connections"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
         if self.connection_pool:
             await self.connection_pool.close()
             self.connection_pool = None
+        for replica in self.replicas:
+            if replica.pool is not None:
+                await replica.pool.close()
+                replica.pool = None
+
+    async def health_check(self) -> Dict[str, Any]:
+        """
+        Kiểm tra pool bằng một truy vấn SELECT 1 và đo độ trễ của các read replica.
+
+        Returns:
+            Dict[str, Any]: Trạng thái kết nối, độ trễ, kích thước pool và trạng thái từng replica
+        """
+        started = time.perf_counter()
+        try:
+            pool = await self.connect()
+            async with pool.acquire() as conn:
+                await conn.fetchval("SELECT 1", timeout=self.command_timeout)
+            health = {
+                "connected": True,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "max_size": self.max_size,
+            }
+            if self.replicas:
+                await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+                health["replicas"] = [replica.status(self.max_replica_lag) for replica in self.replicas]
+            return health
+        except Exception as e:
+            return {"connected": False, "error": str(e)}
 
     async def get_student(self, student_code: str) -> Optional[Student]:
         """Get student information by student code"""
-        pool = await self.connect()
-        async with pool.acquire() as conn:
-            student_record = await conn.fetchrow(
-                """
-                SELECT * FROM students WHERE student_code = $1
-                """,
-                student_code
-            )
+        async with self.read_connection() as conn:
+            student_record = await conn.fetchrow(GET_STUDENT, student_code)
             if not student_record:
                 return None
             return Student(**dict(student_record))
 
     async def get_subject(self, subject_id: int) -> Optional[Subject]:
-        """Get subject information by subject ID"""
-        pool = await self.connect()
-        async with pool.acquire() as conn:
-            subject_record = await conn.fetchrow(
-                """
-                SELECT * FROM subjects WHERE subject_id = $1
-                """,
-                subject_id
-            )
-            if not subject_record:
-                return None
-            return Subject(**dict(subject_record))
+        """Get subject information by subject ID (tra trong danh mục môn học)"""
+        subject = None if self.subjects.stale else self.subjects.get(subject_id)
+        if subject is None:
+            async with self.read_connection() as conn:
+                subject = (await self.subjects.resolve(conn, [subject_id])).get(subject_id)
+        return Subject(**subject) if subject else None
+
+    async def get_scores_dicts(self, filter: ScoreFilter) -> List[Dict[str, Any]]:
+        """
+        Lấy điểm dạng dict, cùng dạng với ScoreWithDetails.model_dump(), không dựng model.
+
+        Mỗi tổ hợp bộ lọc dùng một câu SQL cố định (score.queries), asyncpg prepare nó một lần
+        trên mỗi kết nối và các lần sau chỉ gửi tham số.
+
+        Args:
+            filter: Bộ lọc theo mã sinh viên, học kỳ, mã môn
+
+        Returns:
+            List[Dict[str, Any]]: Các bản ghi điểm kèm thông tin môn học và sinh viên
+        """
+        query, params = score_query(filter)
+        async with self.read_connection() as conn:
+            score_records = await conn.fetch(query, *params)
+            subjects = await self.subjects.resolve(conn, {record["subject_id"] for record in score_records})
+        # Môn không còn trong bảng subjects bị bỏ như khi JOIN
+        return sort_scores([score_row_to_dict(record, subjects[record["subject_id"]]) for record in score_records
+                            if record["subject_id"] in subjects])
 
     async def get_scores(self, filter: ScoreFilter) -> List[ScoreWithDetails]:
         """Get scores with filter options"""
+        return [ScoreWithDetails.model_validate(score) for score in await self.get_scores_dicts(filter)]
+
+    async def get_scores_many(self, student_codes: Optional[List[str]] = None, student_class: Optional[str] = None,
+                              semester: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lấy điểm của nhiều sinh viên (theo danh sách mã hoặc theo lớp) trong một truy vấn.
+
+        Args:
+            student_codes: Danh sách mã sinh viên
+            student_class: Lớp, dùng khi không có student_codes
+            semester: Học kỳ cần lọc
+
+        Returns:
+            List[Dict[str, Any]]: Mỗi sinh viên một nhóm gồm student_code, student_name,
+            student_class và danh sách scores
+        """
+        query, params = scores_many_query(student_codes, student_class, semester)
+        async with self.read_connection() as conn:
+            records = await conn.fetch(query, *params)
+            subjects = await self.subjects.resolve(conn, {record["subject_id"] for record in records})
+        return group_by_student(records, subjects)
+
+    async def iter_scores_many(self, student_codes: Optional[List[str]] = None, student_class: Optional[str] = None,
+                               semester: Optional[str] = None, prefetch: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Như get_scores_many nhưng đọc bằng cursor và trả về từng nhóm sinh viên ngay khi đủ dòng.
+
+        Args:
+            prefetch: Số dòng cursor lấy mỗi lần
+
+        Yields:
+            Dict[str, Any]: Nhóm điểm của một sinh viên
+        """
+        query, params = scores_many_query(student_codes, student_class, semester)
+        async with self.read_connection() as conn:
+            # Nạp danh mục một lần trước khi mở cursor, mỗi dòng chỉ còn tra dict
+            subjects = await self.subjects.resolve(conn, ())
+            unknown_subjects = set()
+            # Cursor của asyncpg chỉ dùng được trong transaction
+            async with conn.transaction(readonly=True):
+                group = None
+                async for record in conn.cursor(query, *params, prefetch=prefetch):
+                    if group is None or group["student_code"] != record["student_code"]:
+                        if group is not None:
+                            sort_scores(group["scores"])
+                            yield group
+                        group = student_group(record)
+                    subject_id = record["subject_id"]
+                    subject = subjects.get(subject_id)
+                    if subject is None and subject_id not in unknown_subjects:
+                        # Môn thêm sau lần nạp danh mục: đọc bổ sung một lần cho mỗi mã
+                        subjects = await self.subjects.resolve(conn, [subject_id])
+                        subject = subjects.get(subject_id)
+                        if subject is None:
+                            unknown_subjects.add(subject_id)
+                    if subject is not None:
+                        group["scores"].append(compact_score(record, subject))
+                if group is not None:
+                    sort_scores(group["scores"])
+                    yield group
+
+    async def get_semester_aggregates(self, student_code: str) -> List[Dict[str, Any]]:
+        """
+        Tổng hợp điểm theo học kỳ của sinh viên, tính bằng một truy vấn GROUP BY.
+
+        Args:
+            student_code: Mã sinh viên
+
+        Returns:
+            List[Dict[str, Any]]: Mỗi học kỳ gồm weighted_sum, credits, credits_passed,
+            credits_failed, subjects (chưa sắp xếp theo thời gian)
+        """
+        async with self.read_connection() as conn:
+            if self.use_gpa_view and await self._gpa_view_matches(conn):
+                records = await conn.fetch(GPA_BY_SEMESTER_FROM_VIEW, student_code)
+            else:
+                records = await conn.fetch(GPA_BY_SEMESTER, student_code, self.pass_threshold)
+        return [semester_row_to_dict(record) for record in records]
+
+    async def _gpa_view_matches(self, conn) -> bool:
+        """View tồn tại và được dựng với pass_threshold hiện tại; nếu không thì tính trực tiếp từ scores."""
+        if not self._gpa_view_current:
+            stored = await conn.fetchval(GPA_VIEW_THRESHOLD, GPA_VIEW)
+            self._gpa_view_current = stored == gpa_view_comment(self.pass_threshold)
+            if not self._gpa_view_current:
+                logger.warning(f"{GPA_VIEW} is missing or was built with another pass threshold ({stored}), "
+                               f"computing GPA from scores until refresh_gpa_view() rebuilds it")
+        return self._gpa_view_current
+
+    async def refresh_gpa_view(self) -> bool:
+        """
+        Tạo (lần đầu) hoặc làm mới materialized view tổng hợp GPA. Gọi sau khi import điểm.
+
+        View dựng với ngưỡng đạt khác SCORE_PASS_THRESHOLD hiện tại được dựng lại thay vì làm mới.
+
+        Returns:
+            bool: False nếu SCORE_GPA_VIEW tắt và không có gì để làm mới
+        """
+        if not self.use_gpa_view:
+            return False
         pool = await self.connect()
         async with pool.acquire() as conn:
-            # Build dynamic query based on filters
-            query = """
-            SELECT s.*, st.student_name, st.student_class, 
-                  su.subject_name, su.subject_credits
-            FROM scores s
-            JOIN students st ON s.student_code = st.student_code
-            JOIN subjects su ON s.subject_id = su.subject_id
-            WHERE 1=1
-            """
-            params = []
-            param_index = 1
-
-            if filter.student_code:
-                query += f" AND s.student_code = ${param_index}"
-                params.append(filter.student_code)
-                param_index += 1
-
-            if filter.semester:
-                query += f" AND s.semester = ${param_index}"
-                params.append(filter.semester)
-                param_index += 1
-
-            if filter.subject_id:
-                query += f" AND s.subject_id = ${param_index}"
-                params.append(filter.subject_id)
-                param_index += 1
-
-            query += " ORDER BY s.semester DESC, su.subject_name"
-
-            # Execute query
-            score_records = await conn.fetch(query, *params)
-            
-            # Process results
-            results = []
-            for record in score_records:
-                record_dict = dict(record)
-                
-                # Build Student object
-                student = Student(
-                    student_code=record_dict["student_code"],
-                    student_name=record_dict["student_name"],
-                    student_class=record_dict["student_class"]
-                )
-                
-                # Build Subject object
-                subject = Subject(
-                    subject_id=record_dict["subject_id"],
-                    subject_name=record_dict["subject_name"],
-                    subject_credits=record_dict["subject_credits"]
-                )
-                
-                # Build Score object
-                score = Score(
-                    score_text=record_dict["score_text"],
-                    score_first=record_dict["score_first"],
-                    score_second=record_dict["score_second"],
-                    score_final=record_dict["score_final"],
-                    score_over_rall=record_dict["score_over_rall"],
-                    semester=record_dict["semester"],
-                    student_code=record_dict["student_code"],
-                    subject_id=record_dict["subject_id"]
-                )
-                
-                # Combine into ScoreWithDetails
-                score_with_details = ScoreWithDetails(
-                    **score.model_dump(),
-                    student=student,
-                    subject=subject
-                )
-                
-                results.append(score_with_details)
-                
-            return results 
\ No newline at end of file
+            if await conn.fetchval(GPA_VIEW_THRESHOLD, GPA_VIEW) == gpa_view_comment(self.pass_threshold):
+                await conn.execute(REFRESH_GPA_VIEW, timeout=self.maintenance_timeout)
+            else:
+                # Chưa có view hoặc view cũ dùng ngưỡng khác: người đọc chờ transaction thay vì thấy view trống
+                async with conn.transaction():
+                    for statement in create_gpa_view_statements(self.pass_threshold):
+                        await conn.execute(statement, timeout=self.maintenance_timeout)
+        self._gpa_view_current = True
+        logger.info(f"Refreshed materialized view {GPA_VIEW}")
+        return True
@@ -0,0 +1,114 @@
+"""
+Mã hoá gọn kết quả tool điểm trước khi đưa vào prompt.
+
+Dạng "json" lặp lại object student và subject ở mỗi dòng điểm. Dạng "compact" đưa thông tin
+sinh viên lên một lần, điểm thành bảng (columns + rows), bỏ các cột rỗng ở mọi dòng và dùng
+orjson để serialize không khoảng trắng. Một sinh viên 60 môn chỉ còn một phần nhỏ
+số token. Chọn dạng theo tool bằng TOOL_OUTPUT_FORMAT (mặc định compact) và
+TOOL_OUTPUT_FORMATS="get_student_scores=json,get_class_scores=compact".
+
+calculate_average_scores đọc được cả hai dạng (expand_compact).
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:  # Môi trường chưa cài orjson: json chuẩn cho kết quả giống hệt
+    orjson = None
+
+FORMATS = ("compact", "json")
+
+# Thứ tự cột của bảng điểm; cột rỗng ở mọi dòng bị bỏ
+SCORE_TABLE_COLUMNS = ("semester", "subject_id", "subject_name", "subject_credits", "score_first", "score_second",
+                       "score_final", "score_over_rall", "score_text")
+
+STUDENT_FIELDS = ("student_code", "student_name", "student_class")
+
+
+def _parse_formats(raw: Optional[str]) -> Dict[str, str]:
+    """Đọc TOOL_OUTPUT_FORMATS dạng "get_student_scores=json,get_class_scores=compact"."""
+    formats = {}
+    for item in (raw or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().lower() in FORMATS:
+            formats[name.strip()] = value.strip().lower()
+    return formats
+
+
+DEFAULT_FORMAT = os.environ.get("TOOL_OUTPUT_FORMAT", "compact").lower()
+TOOL_FORMATS = _parse_formats(os.environ.get("TOOL_OUTPUT_FORMATS"))
+
+
+def output_format(tool_name: str) -> str:
+    """Dạng kết quả của tool: "compact" hoặc "json"."""
+    return TOOL_FORMATS.get(tool_name, DEFAULT_FORMAT if DEFAULT_FORMAT in FORMATS else "compact")
+
+
+def dumps(data: Any) -> str:
+    """Serialize không khoảng trắng, giữ nguyên tiếng Việt (ít token hơn \\uXXXX)."""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _flat_score(score: Dict[str, Any]) -> Dict[str, Any]:
+    # Dạng ScoreWithDetails.model_dump() để tín chỉ/tên môn trong "subject"
+    subject = score.get("subject") or {}
+    return {column: score.get(column, subject.get(column)) for column in SCORE_TABLE_COLUMNS}
+
+
+def score_table(scores: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Chuyển danh sách điểm sang bảng columns + rows, bỏ cột rỗng ở mọi dòng.
+
+    Args:
+        scores: Điểm dạng ScoreWithDetails.model_dump() hoặc dạng phẳng (compact_score)
+
+    Returns:
+        Dict[str, Any]: {"columns": [...], "rows": [[...], ...]}
+    """
+    flat = [_flat_score(score) for score in scores]
+    columns = [column for column in SCORE_TABLE_COLUMNS if any(row[column] is not None for row in flat)]
+    return {"columns": columns, "rows": [[row[column] for column in columns] for row in flat]}
+
+
+def _student(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: data[field] for field in STUDENT_FIELDS if data.get(field) is not None}
+
+
+def encode_student_scores(scores: List[Dict[str, Any]], message: str) -> Dict[str, Any]:
+    """Điểm của một sinh viên: thông tin sinh viên một lần, điểm dạng bảng."""
+    encoded: Dict[str, Any] = {}
+    if scores:
+        encoded["student"] = _student(scores[0].get("student") or scores[0])
+        encoded.update(score_table(scores))
+    encoded["message"] = message
+    return encoded
+
+
+def encode_class_scores(students: List[Dict[str, Any]], message: str) -> Dict[str, Any]:
+    """Điểm của nhiều sinh viên (nhóm của Database.get_scores_many) với một header cột chung."""
+    rows = [_flat_score(score) for group in students for score in group["scores"]]
+    columns = [column for column in SCORE_TABLE_COLUMNS if any(row[column] is not None for row in rows)]
+    return {
+        "columns": columns,
+        "students": [{**_student(group), "rows": [[row[column] for column in columns]
+                                                  for row in map(_flat_score, group["scores"])]}
+                     for group in students],
+        "message": message,
+    }
+
+
+def expand_compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Đưa kết quả dạng compact về {"scores": [dict phẳng, ...]}; dạng khác giữ nguyên."""
+    columns = data.get("columns")
+    if not columns:
+        return data
+    if "students" in data:
+        tables = [(_student(group), group.get("rows") or []) for group in data["students"]]
+    else:
+        tables = [(data.get("student") or {}, data.get("rows") or [])]
+    return {"scores": [{**student, **dict(zip(columns, row))} for student, rows in tables for row in rows],
+            "message": data.get("message")}
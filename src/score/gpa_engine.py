@@ -0,0 +1,295 @@
+"""
+Bộ tính GPA vector hoá bằng NumPy.
+
+Điểm được đưa về dạng cột (ScoreArrays: mảng điểm, tín chỉ và mã học kỳ/nhóm môn/sinh viên
+đã đánh số), sau đó mọi tổng có trọng số được tính bằng np.bincount trong một lượt: GPA
+chung, theo học kỳ, theo nhóm môn, theo sinh viên, quy đổi thang 4 (np.digitize) và dự
+phóng "nếu ... thì". Dùng chung cho tool calculate_average_scores, báo cáo cả lớp và admin
+API, nên thống kê của cả lớp/khoá chỉ mất vài mili giây.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from score.models import ScoreFilter
+
+# Quy đổi thang 10 → thang 4 (điểm được làm tròn 1 chữ số trước khi quy đổi)
+GRADE_THRESHOLDS = (4.0, 5.0, 5.5, 6.5, 7.0, 8.0, 8.5)
+GRADE_POINTS = (0.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0)
+GRADE_LETTERS = ("F", "D", "D+", "C", "C+", "B", "B+", "A")
+
+# Xếp loại theo GPA thang 4
+CLASSIFICATION_THRESHOLDS = (2.0, 2.5, 3.2, 3.6)
+CLASSIFICATIONS = ("yeu", "trung_binh", "kha", "gioi", "xuat_sac")
+
+
+def _encode(labels: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """Đánh số các nhãn (giữ thứ tự xuất hiện đầu tiên)."""
+    index: Dict[str, int] = {}
+    codes = np.fromiter((index.setdefault(label, len(index)) for label in labels), dtype=np.int64, count=len(labels))
+    return codes, list(index)
+
+
+@dataclass
+class ScoreArrays:
+    """Điểm dạng cột: mỗi vị trí là một môn đã có điểm."""
+    scores: np.ndarray
+    credits: np.ndarray
+    semesters: np.ndarray
+    semester_labels: List[str]
+    groups: np.ndarray
+    group_labels: List[str]
+    students: np.ndarray
+    student_labels: List[str]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], groups: Optional[Dict[Any, str]] = None,
+                     student_code: Optional[str] = None) -> "ScoreArrays":
+        """
+        Dựng mảng từ các bản ghi điểm; bỏ môn chưa có điểm tổng kết hoặc số tín chỉ.
+
+        Args:
+            records: Điểm dạng phẳng (subject_credits ở cấp ngoài) hoặc ScoreWithDetails.model_dump()
+            groups: Nhóm môn theo subject_id (hoặc subject_name); bản ghi có trường "group" dùng trường đó,
+                môn không có nhóm thuộc "other"
+            student_code: Mã sinh viên dùng khi bản ghi không có student_code
+        """
+        rows = []
+        for record in records:
+            subject = record.get("subject") or {}
+            credits = record.get("subject_credits", subject.get("subject_credits"))
+            score = record.get("score_over_rall")
+            if score is None or credits is None:
+                continue
+            subject_id = record.get("subject_id", subject.get("subject_id"))
+            subject_name = record.get("subject_name", subject.get("subject_name"))
+            group = record.get("group") or (groups or {}).get(subject_id, (groups or {}).get(subject_name, "other"))
+            student = record.get("student_code") or (record.get("student") or {}).get("student_code") or student_code
+            rows.append((float(score), float(credits), record.get("semester") or "", group, student or ""))
+
+        semesters, semester_labels = _encode([row[2] for row in rows])
+        group_codes, group_labels = _encode([row[3] for row in rows])
+        students, student_labels = _encode([row[4] for row in rows])
+        return cls(
+            scores=np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows)),
+            credits=np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows)),
+            semesters=semesters, semester_labels=semester_labels,
+            groups=group_codes, group_labels=group_labels,
+            students=students, student_labels=student_labels,
+        )
+
+    @classmethod
+    def from_class_groups(cls, students: Iterable[Dict[str, Any]],
+                          groups: Optional[Dict[Any, str]] = None) -> "ScoreArrays":
+        """Dựng mảng từ các nhóm của Database.get_scores_many (mỗi sinh viên một nhóm)."""
+        return cls.from_records(({**score, "student_code": group["student_code"]}
+                                 for group in students for score in group["scores"]), groups=groups)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+
+def _round(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    # NaN (không có tín chỉ) → None
+    return [None if value != value else value for value in np.round(values, digits).tolist()]
+
+
+def _statistic(function, values: np.ndarray, *args) -> Optional[float]:
+    # Không có sinh viên nào có tín chỉ: None thay vì NaN (JSON không biểu diễn được NaN)
+    return round(float(function(values, *args)), 2) if values.size else None
+
+
+class GPAEngine:
+    """Tính GPA có trọng số tín chỉ, quy đổi thang 4 và dự phóng trên ScoreArrays."""
+
+    def __init__(self, thresholds: Sequence[float] = GRADE_THRESHOLDS, points: Sequence[float] = GRADE_POINTS,
+                 letters: Sequence[str] = GRADE_LETTERS, pass_threshold: float = 4.0):
+        """
+        Args:
+            thresholds: Ngưỡng điểm thang 10 (tăng dần) bắt đầu mỗi mức quy đổi
+            points: Điểm thang 4 của từng mức, nhiều hơn thresholds một phần tử
+            letters: Điểm chữ của từng mức
+            pass_threshold: Điểm tối thiểu để môn được tính là đạt
+        """
+        if len(points) != len(thresholds) + 1 or len(letters) != len(points):
+            raise ValueError("points and letters need one entry more than thresholds")
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.points = np.asarray(points, dtype=np.float64)
+        self.letters = np.asarray(letters)
+        self.pass_threshold = pass_threshold
+
+    def grade_index(self, scores: np.ndarray) -> np.ndarray:
+        return np.digitize(np.round(scores, 1), self.thresholds)
+
+    def to_4_point(self, scores: np.ndarray) -> np.ndarray:
+        """Quy đổi điểm thang 10 sang thang 4."""
+        return self.points[self.grade_index(scores)]
+
+    def to_letter(self, scores: np.ndarray) -> np.ndarray:
+        return self.letters[self.grade_index(scores)]
+
+    @staticmethod
+    def _weighted(values: np.ndarray, credits: np.ndarray, codes: np.ndarray,
+                  size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(trung bình có trọng số, tổng tín chỉ) theo từng mã."""
+        total_credits = np.bincount(codes, weights=credits, minlength=size)
+        weighted = np.bincount(codes, weights=values * credits, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return weighted / total_credits, total_credits
+
+    def _breakdown(self, arrays: ScoreArrays, codes: np.ndarray, labels: List[str], points: np.ndarray,
+                   passed: np.ndarray) -> List[Dict[str, Any]]:
+        size = len(labels)
+        gpa_10, credits = self._weighted(arrays.scores, arrays.credits, codes, size)
+        gpa_4, _ = self._weighted(points, arrays.credits, codes, size)
+        credits_passed = np.bincount(codes, weights=arrays.credits * passed, minlength=size)
+        return [{"label": label, "gpa_10": g10, "gpa_4": g4, "credits": int(c), "credits_passed": int(p),
+                 "credits_failed": int(c - p)}
+                for label, g10, g4, c, p in zip(labels, _round(gpa_10), _round(gpa_4), credits, credits_passed)]
+
+    def summarize(self, arrays: ScoreArrays) -> Dict[str, Any]:
+        """
+        GPA chung, theo học kỳ và theo nhóm môn (thang 10 và thang 4) của một tập điểm.
+
+        Returns:
+            Dict[str, Any]: overall, semesters, groups; mỗi mục gồm gpa_10, gpa_4, credits,
+            credits_passed, credits_failed
+        """
+        if not len(arrays):
+            return {"overall": None, "semesters": [], "groups": []}
+        points = self.to_4_point(arrays.scores)
+        passed = arrays.scores >= self.pass_threshold
+        overall = self._breakdown(arrays, np.zeros(len(arrays), dtype=np.int64), ["overall"], points, passed)[0]
+        del overall["label"]
+        semesters = [{"semester": row.pop("label"), **row}
+                     for row in self._breakdown(arrays, arrays.semesters, arrays.semester_labels, points, passed)]
+        groups = [{"group": row.pop("label"), **row}
+                  for row in self._breakdown(arrays, arrays.groups, arrays.group_labels, points, passed)]
+        return {"overall": overall, "semesters": semesters, "groups": groups}
+
+    def class_report(self, arrays: ScoreArrays) -> Dict[str, Any]:
+        """
+        GPA của từng sinh viên và thống kê của cả lớp/khoá.
+
+        Sinh viên không có tín chỉ nào (chỉ có môn 0 tín chỉ) không có GPA: classification và rank
+        là None và không được tính vào thống kê GPA/xếp loại.
+
+        Returns:
+            Dict[str, Any]: students (gpa_10, gpa_4, credits, classification, rank) và
+            statistics (mean, median, std, p10, p90, phân bố xếp loại, phân bố điểm chữ)
+        """
+        size = len(arrays.student_labels)
+        if not size:
+            return {"students": [], "statistics": {}}
+        grade_index = self.grade_index(arrays.scores)
+        points = self.points[grade_index]
+        passed = arrays.scores >= self.pass_threshold
+        gpa_10, credits = self._weighted(arrays.scores, arrays.credits, arrays.students, size)
+        gpa_4, _ = self._weighted(points, arrays.credits, arrays.students, size)
+        credits_passed = np.bincount(arrays.students, weights=arrays.credits * passed, minlength=size)
+        # GPA là NaN khi sinh viên không có tín chỉ; np.digitize xếp NaN vào mức cao nhất nên phải loại ra
+        graded = credits > 0
+        graded_gpa_10, graded_gpa_4 = gpa_10[graded], gpa_4[graded]
+        # Xếp loại học lực theo GPA thang 4
+        class_index = np.digitize(np.round(graded_gpa_4, 2), CLASSIFICATION_THRESHOLDS)
+        classification = np.full(size, None, dtype=object)
+        classification[graded] = np.asarray(CLASSIFICATIONS)[class_index]
+        # Hạng 1 là GPA cao nhất
+        ranks = np.full(size, None, dtype=object)
+        ranks[np.flatnonzero(graded)[np.argsort(-graded_gpa_10, kind="stable")]] = range(1, len(graded_gpa_10) + 1)
+
+        letter_counts = np.bincount(grade_index, minlength=len(self.letters))
+        class_counts = np.bincount(class_index, minlength=len(CLASSIFICATIONS))
+        total_credits = float(np.sum(arrays.credits))
+        return {
+            "students": [{"student_code": code, "gpa_10": g10, "gpa_4": g4, "credits": int(c),
+                          "credits_passed": int(p), "classification": k, "rank": r}
+                         for code, g10, g4, c, p, k, r in zip(arrays.student_labels, _round(gpa_10), _round(gpa_4),
+                                                               credits.tolist(), credits_passed.tolist(),
+                                                               classification.tolist(), ranks.tolist())],
+            "statistics": {
+                "students": size,
+                "graded_students": len(graded_gpa_10),
+                "mean_gpa_10": _statistic(np.mean, graded_gpa_10),
+                "median_gpa_10": _statistic(np.median, graded_gpa_10),
+                "std_gpa_10": _statistic(np.std, graded_gpa_10),
+                "p10_gpa_10": _statistic(np.percentile, graded_gpa_10, 10),
+                "p90_gpa_10": _statistic(np.percentile, graded_gpa_10, 90),
+                "mean_gpa_4": _statistic(np.mean, graded_gpa_4),
+                "pass_rate": (round(float(np.sum(arrays.credits * passed)) / total_credits, 4)
+                              if total_credits else None),
+                "classifications": {k: int(n) for k, n in zip(CLASSIFICATIONS, class_counts)},
+                "letters": {str(k): int(n) for k, n in zip(self.letters, letter_counts)},
+            },
+        }
+
+    def what_if(self, arrays: ScoreArrays, planned: Sequence[Dict[str, float]] = (),
+                target_gpa_10: Optional[float] = None, remaining_credits: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Dự phóng GPA tích luỹ.
+
+        Args:
+            arrays: Điểm hiện có
+            planned: Các môn dự kiến, mỗi môn {"credits": ..., "score": ...} (thang 10)
+            target_gpa_10: GPA mục tiêu (thang 10)
+            remaining_credits: Số tín chỉ còn lại để tính điểm trung bình cần đạt cho mục tiêu;
+                mặc định là tổng tín chỉ của planned
+
+        Returns:
+            Dict[str, Any]: current, projected (GPA thang 10/4 sau các môn dự kiến) và
+            required_average_10 (điểm trung bình cần đạt trên số tín chỉ còn lại, None nếu không
+            có mục tiêu; lớn hơn 10 nghĩa là không thể đạt)
+        """
+        planned_credits = np.asarray([float(p["credits"]) for p in planned], dtype=np.float64)
+        planned_scores = np.asarray([float(p["score"]) for p in planned], dtype=np.float64)
+        credits = np.concatenate([arrays.credits, planned_credits])
+        scores = np.concatenate([arrays.scores, planned_scores])
+
+        def gpa(values: np.ndarray, weights: np.ndarray) -> Optional[float]:
+            total = float(np.sum(weights))
+            return round(float(np.dot(values, weights)) / total, 2) if total else None
+
+        current_credits = float(np.sum(arrays.credits))
+        result = {
+            "current": {"gpa_10": gpa(arrays.scores, arrays.credits),
+                        "gpa_4": gpa(self.to_4_point(arrays.scores), arrays.credits),
+                        "credits": int(current_credits)},
+            "projected": {"gpa_10": gpa(scores, credits), "gpa_4": gpa(self.to_4_point(scores), credits),
+                          "credits": int(np.sum(credits))},
+            "required_average_10": None,
+        }
+        remaining = remaining_credits if remaining_credits is not None else float(np.sum(planned_credits))
+        if target_gpa_10 is not None and remaining > 0:
+            current_weighted = float(np.dot(arrays.scores, arrays.credits))
+            required = (target_gpa_10 * (current_credits + remaining) - current_weighted) / remaining
+            result["required_average_10"] = round(required, 2)
+        return result
+
+
+gpa_engine = GPAEngine(pass_threshold=float(os.environ.get("SCORE_PASS_THRESHOLD", "4.0")))
+
+
+async def class_report(db, student_class: Optional[str] = None, student_codes: Optional[List[str]] = None,
+                       semester: Optional[str] = None, groups: Optional[Dict[Any, str]] = None) -> Dict[str, Any]:
+    """
+    Báo cáo GPA của cả lớp hoặc một nhóm sinh viên: lấy điểm bằng một truy vấn
+    (Database.get_scores_many) rồi tính toàn bộ bằng gpa_engine.
+
+    Returns:
+        Dict[str, Any]: class_report (students, statistics) kèm summary của cả tập điểm
+    """
+    students = await db.get_scores_many(student_codes=student_codes, student_class=student_class, semester=semester)
+    arrays = ScoreArrays.from_class_groups(students, groups=groups)
+    names = {group["student_code"]: group["student_name"] for group in students}
+    report = gpa_engine.class_report(arrays)
+    for row in report["students"]:
+        row["student_name"] = names.get(row["student_code"])
+    return {**report, "summary": gpa_engine.summarize(arrays)}
+
+
+async def student_arrays(db, student_code: str, groups: Optional[Dict[Any, str]] = None) -> ScoreArrays:
+    """Toàn bộ điểm của một sinh viên dạng cột."""
+    records = await db.get_scores_dicts(ScoreFilter(student_code=student_code))
+    return ScoreArrays.from_records(records, groups=groups, student_code=student_code)
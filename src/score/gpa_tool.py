@@ -0,0 +1,125 @@
+"""
+Tool tính GPA phía server.
+
+Thay vì lấy toàn bộ bảng điểm qua get_student_scores rồi để LLM chuyển JSON sang
+calculate_average_scores, get_student_gpa tính điểm trung bình có trọng số tín chỉ theo học
+kỳ, điểm trung bình tích luỹ và số tín chỉ đạt/không đạt bằng một truy vấn GROUP BY (hoặc
+đọc materialized view khi SCORE_GPA_VIEW=true) và chỉ trả về kết quả gọn cho LLM.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from score.encoding import dumps, output_format
+from score.student_tool import global_db
+from score.tool_cache import tool_cache
+
+SEMESTER_PATTERN = re.compile(r"^(?:ki|k)([1-4])-(\d{4})-(\d{4})$")
+
+
+class GPAInput(BaseModel):
+    student_code: str = Field(description="The student code to calculate GPA for")
+    semester: Optional[str] = Field(None,
+                                    description="Optional semester in format ki1-2024-2025, k2-2024-2025, etc. "
+                                                "The cumulative GPA is then computed up to and including it")
+
+
+def semester_sort_key(semester: Optional[str]) -> Tuple[int, int, str]:
+    """Khoá sắp xếp học kỳ theo thời gian: ki2-2023-2024 đứng trước ki1-2024-2025."""
+    match = SEMESTER_PATTERN.match(semester or "")
+    if not match:
+        return 0, 0, semester or ""
+    return int(match.group(2)), int(match.group(1)), semester
+
+
+def canonical_semester(semester: Optional[str]) -> Optional[str]:
+    """Đưa học kỳ về dạng lưu trong database: "k1-2024-2025" thành "ki1-2024-2025"."""
+    match = SEMESTER_PATTERN.match(semester or "")
+    return f"ki{match.group(1)}-{match.group(2)}-{match.group(3)}" if match else semester
+
+
+def _gpa(weighted_sum: float, credits: int) -> Optional[float]:
+    return round(weighted_sum / credits, 2) if credits else None
+
+
+def summarize_gpa(aggregates: List[Dict[str, Any]], semester: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Tính GPA từng học kỳ và GPA tích luỹ từ các dòng tổng hợp của Database.get_semester_aggregates.
+
+    Args:
+        aggregates: Tổng hợp theo học kỳ (weighted_sum, credits, credits_passed, credits_failed)
+        semester: Nếu có, chỉ trả về học kỳ này và tích luỹ tính đến hết học kỳ này
+
+    Returns:
+        Dict[str, Any]: cumulative (gpa, credits, credits_passed, credits_failed) và semesters
+    """
+    rows = sorted(aggregates, key=lambda row: semester_sort_key(row["semester"]))
+    semester = canonical_semester(semester)
+    if semester:
+        limit = semester_sort_key(semester)
+        rows = [row for row in rows if semester_sort_key(canonical_semester(row["semester"])) <= limit]
+
+    semesters = [{
+        "semester": row["semester"],
+        "gpa": _gpa(row["weighted_sum"], row["credits"]),
+        "credits": row["credits"],
+        "credits_passed": row["credits_passed"],
+        "credits_failed": row["credits_failed"],
+    } for row in rows]
+    if semester:
+        semesters = [row for row in semesters if canonical_semester(row["semester"]) == semester]
+
+    credits = sum(row["credits"] for row in rows)
+    return {
+        "cumulative": {
+            "gpa": _gpa(sum(row["weighted_sum"] for row in rows), credits),
+            "credits": credits,
+            "credits_passed": sum(row["credits_passed"] for row in rows),
+            "credits_failed": sum(row["credits_failed"] for row in rows),
+        },
+        "semesters": semesters,
+    }
+
+
+@tool("get_student_gpa", args_schema=GPAInput,
+      description=("Get the credit-weighted GPA of a KMA student computed by the database: GPA per semester, "
+                   "cumulative GPA and credits passed/failed (10-point scale). "
+                   "Use this for GPA / average score questions instead of fetching all scores. "
+                   "The student code must be provided."))
+async def get_student_gpa(student_code: str, semester: Optional[str] = None) -> str:
+    """
+    Get GPA per semester and cumulative GPA of a student.
+
+    Args:
+        student_code: The student code to calculate GPA for
+        semester: Optional semester in format ki1-2024-2025; cumulative GPA is computed up to it
+
+    Returns:
+        A compact JSON string with the cumulative and per-semester GPA
+    """
+    semester = canonical_semester(semester)
+    cached = tool_cache.get("get_student_gpa", student_code, semester=semester)
+    if cached is not None:
+        return cached
+
+    try:
+        if semester and not SEMESTER_PATTERN.match(semester):
+            return json.dumps({"message": "Invalid semester format. Must be in format ki1-2024-2025, k2-2024-2025, etc."})
+
+        aggregates = await global_db.db.get_semester_aggregates(student_code)
+        summary = summarize_gpa(aggregates, semester)
+        if not summary["semesters"]:
+            return json.dumps({"message": f"No scores found for student {student_code}" + (
+                f" in semester {semester}" if semester else "")})
+
+        response = {"student_code": student_code, **summary,
+                    "message": "GPA calculated from database scores (credit-weighted, 10-point scale)"}
+        result = dumps(response) if output_format("get_student_gpa") == "compact" else json.dumps(response)
+        tool_cache.set("get_student_gpa", student_code, result, semester=semester)
+        return result
+
+    except Exception as e:
+        return json.dumps({"message": f"Error calculating GPA: {str(e)}"})
@@ -0,0 +1,352 @@
+"""
+Import điểm hàng loạt từ file CSV/XLSX vào PostgreSQL.
+
+File được đọc theo từng lô trong worker thread và đẩy vào một bảng tạm (staging) bằng COPY
+(asyncpg copy_records_to_table). Sau đó sinh viên, môn học và điểm được upsert vào bảng
+chính bằng các câu INSERT ... ON CONFLICT theo tập hợp trong cùng một transaction: bảng
+scores chỉ bị khoá ở mức dòng nên các truy vấn đọc vẫn chạy bình thường trong lúc import.
+Cuối cùng materialized view GPA và danh mục môn học được làm mới, cache kết quả tool của các
+sinh viên bị ảnh hưởng bị xoá (toàn bộ cache nếu tên/tín chỉ môn học thay đổi).
+
+Cột bắt buộc: student_code, subject_id, semester. Cột tuỳ chọn: student_name,
+student_class, subject_name, subject_credits, score_text, score_first, score_second,
+score_final, score_over_rall. Sinh viên/môn học chưa có trong database cần có tên trong file;
+dòng của sinh viên/môn học không có trong database và không có tên bị loại (ghi vào errors).
+
+    python -m score.importer load diem_ki1_2024_2025.xlsx
+"""
+import asyncio
+import csv
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import typer
+
+from .database import Database
+from .migrations import upgrade_connection
+from .student_tool import global_db
+from .tool_cache import normalize_student_code, tool_cache
+
+logger = logging.getLogger(__name__)
+
+SEMESTER_PATTERN = re.compile(r"^(ki|k)[1-4]-\d{4}-\d{4}$")
+
+STAGING_TABLE = "score_import_staging"
+
+# Thứ tự cột trong bảng staging, cũng là thứ tự của tuple mỗi dòng
+STAGING_COLUMNS = ("row_no", "student_code", "student_name", "student_class", "subject_id", "subject_name",
+                   "subject_credits", "semester", "score_text", "score_first", "score_second", "score_final",
+                   "score_over_rall")
+
+REQUIRED_COLUMNS = ("student_code", "subject_id", "semester")
+
+SCORE_VALUE_COLUMNS = ("score_first", "score_second", "score_final", "score_over_rall")
+
+# Số lỗi tối đa được giữ lại chi tiết trong ImportResult.errors
+MAX_ERRORS = 100
+
+CREATE_STAGING = f"""
+    CREATE TEMP TABLE {STAGING_TABLE} (
+        row_no integer,
+        student_code text,
+        student_name text,
+        student_class text,
+        subject_id integer,
+        subject_name text,
+        subject_credits integer,
+        semester text,
+        score_text text,
+        score_first double precision,
+        score_second double precision,
+        score_final double precision,
+        score_over_rall double precision
+    ) ON COMMIT DROP
+"""
+
+# Dòng xuất hiện sau cùng trong file thắng khi một khoá bị lặp
+UPSERT_STUDENTS = f"""
+    INSERT INTO students (student_code, student_name, student_class)
+    SELECT DISTINCT ON (student_code) student_code, student_name, student_class
+    FROM {STAGING_TABLE}
+    WHERE student_name IS NOT NULL
+    ORDER BY student_code, row_no DESC
+    ON CONFLICT (student_code) DO UPDATE
+    SET student_name = EXCLUDED.student_name,
+        student_class = COALESCE(EXCLUDED.student_class, students.student_class)
+"""
+
+UPSERT_SUBJECTS = f"""
+    INSERT INTO subjects (subject_id, subject_name, subject_credits)
+    SELECT DISTINCT ON (subject_id) subject_id, subject_name, subject_credits
+    FROM {STAGING_TABLE}
+    WHERE subject_name IS NOT NULL
+    ORDER BY subject_id, row_no DESC
+    ON CONFLICT (subject_id) DO UPDATE
+    SET subject_name = EXCLUDED.subject_name,
+        subject_credits = COALESCE(EXCLUDED.subject_credits, subjects.subject_credits)
+    WHERE (subjects.subject_name, subjects.subject_credits)
+          IS DISTINCT FROM (EXCLUDED.subject_name, COALESCE(EXCLUDED.subject_credits, subjects.subject_credits))
+"""
+
+# Sau khi upsert sinh viên/môn học: dòng tham chiếu sinh viên/môn học vẫn không tồn tại (không có tên
+# trong file) sẽ vi phạm khoá ngoại và làm rollback cả file, nên bị loại khỏi staging trước khi upsert điểm
+REJECT_UNKNOWN_REFERENCES = f"""
+    DELETE FROM {STAGING_TABLE} st
+    WHERE NOT EXISTS (SELECT 1 FROM students s WHERE s.student_code = st.student_code)
+       OR NOT EXISTS (SELECT 1 FROM subjects su WHERE su.subject_id = st.subject_id)
+    RETURNING st.row_no, st.student_code, st.subject_id,
+              EXISTS (SELECT 1 FROM students s WHERE s.student_code = st.student_code) AS student_exists
+"""
+
+# Số khoá (sinh viên, môn, học kỳ) khác nhau còn lại: khoá lặp trong file chỉ được upsert một lần
+COUNT_STAGING_KEYS = f"""
+    SELECT COUNT(DISTINCT (student_code, subject_id, semester)) AS score_keys,
+           COUNT(DISTINCT student_code) AS students
+    FROM {STAGING_TABLE}
+"""
+
+# Dòng không đổi không bị ghi lại; xmax = 0 nghĩa là dòng mới được chèn
+UPSERT_SCORES = f"""
+    INSERT INTO scores (student_code, subject_id, semester, score_text, score_first, score_second,
+                        score_final, score_over_rall)
+    SELECT DISTINCT ON (student_code, subject_id, semester)
+           student_code, subject_id, semester, score_text, score_first, score_second, score_final, score_over_rall
+    FROM {STAGING_TABLE}
+    ORDER BY student_code, subject_id, semester, row_no DESC
+    ON CONFLICT (student_code, subject_id, semester) DO UPDATE
+    SET score_text = EXCLUDED.score_text,
+        score_first = EXCLUDED.score_first,
+        score_second = EXCLUDED.score_second,
+        score_final = EXCLUDED.score_final,
+        score_over_rall = EXCLUDED.score_over_rall
+    WHERE (scores.score_text, scores.score_first, scores.score_second, scores.score_final, scores.score_over_rall)
+          IS DISTINCT FROM
+          (EXCLUDED.score_text, EXCLUDED.score_first, EXCLUDED.score_second, EXCLUDED.score_final,
+           EXCLUDED.score_over_rall)
+    RETURNING (xmax = 0) AS inserted
+"""
+
+
+class ImportFileError(ValueError):
+    """File import không đọc được hoặc thiếu cột bắt buộc."""
+
+
+@dataclass
+class ImportResult:
+    """Kết quả một lần import."""
+    rows_read: int = 0
+    rows_rejected: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    students: int = 0
+    duration_ms: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows_read": self.rows_read,
+            "rows_rejected": self.rows_rejected,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "students": self.students,
+            "duration_ms": self.duration_ms,
+            "errors": self.errors,
+        }
+
+
+def _header(name: Any) -> str:
+    return re.sub(r"\W+", "_", str(name or "").strip().lower()).strip("_")
+
+
+def _read_csv(path: Path) -> Iterator[Tuple[Any, ...]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def _read_xlsx(path: Path) -> Iterator[Tuple[Any, ...]]:
+    from openpyxl import load_workbook
+
+    # read_only đọc sheet theo luồng, không nạp cả workbook vào bộ nhớ
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _int(value: Any) -> Optional[int]:
+    text = _text(value)
+    return int(float(text)) if text is not None else None
+
+
+def _float(value: Any) -> Optional[float]:
+    text = _text(value)
+    return float(text.replace(",", ".")) if text is not None else None
+
+
+def _add_error(result: ImportResult, row_no: int, error: str, max_errors: int = MAX_ERRORS) -> None:
+    result.rows_rejected += 1
+    if len(result.errors) < max_errors:
+        result.errors.append({"row": row_no, "error": error})
+
+
+def read_score_rows(path: Path, result: ImportResult, max_errors: int = MAX_ERRORS) -> Iterator[Tuple[Any, ...]]:
+    """
+    Đọc file CSV/XLSX thành các tuple theo STAGING_COLUMNS, bỏ qua dòng không hợp lệ.
+
+    Args:
+        path: File .csv hoặc .xlsx, dòng đầu là tên cột
+        result: Nơi ghi số dòng đã đọc/bị loại và lỗi
+        max_errors: Số lỗi tối đa được giữ lại chi tiết
+
+    Yields:
+        Tuple[Any, ...]: Một dòng điểm đã chuẩn hoá
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        rows = _read_csv(path)
+    elif suffix in (".xlsx", ".xlsm"):
+        rows = _read_xlsx(path)
+    else:
+        raise ImportFileError(f"Unsupported file type: {suffix} (expected .csv or .xlsx)")
+
+    header = [_header(name) for name in next(rows, [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportFileError(f"Missing required columns: {', '.join(missing)}")
+    positions = {column: header.index(column) for column in STAGING_COLUMNS[1:] if column in header}
+
+    # Dòng 1 là header
+    for row_no, row in enumerate(rows, start=2):
+        if not any(_text(value) for value in row):
+            continue
+        result.rows_read += 1
+        values = {column: (row[index] if index < len(row) else None) for column, index in positions.items()}
+        try:
+            student_code = normalize_student_code(_text(values.get("student_code")))
+            semester = (_text(values.get("semester")) or "").lower()
+            if not student_code:
+                raise ValueError("student_code is empty")
+            if not SEMESTER_PATTERN.match(semester):
+                raise ValueError(f"invalid semester {semester!r}")
+            record = (row_no, student_code, _text(values.get("student_name")), _text(values.get("student_class")),
+                      _int(values.get("subject_id")), _text(values.get("subject_name")),
+                      _int(values.get("subject_credits")), semester, _text(values.get("score_text")),
+                      *(_float(values.get(column)) for column in SCORE_VALUE_COLUMNS))
+            if record[4] is None:
+                raise ValueError("subject_id is empty")
+        except ValueError as e:
+            _add_error(result, row_no, str(e), max_errors)
+            continue
+        yield record
+
+
+class ScoreImporter:
+    """Import điểm qua bảng staging và upsert theo tập hợp."""
+
+    def __init__(self, db: Optional[Database] = None, batch_size: int = 5000):
+        """
+        Args:
+            db: Database dùng để import, mặc định là pool dùng chung của các tool
+            batch_size: Số dòng đọc và COPY mỗi lô
+        """
+        self.db = db or global_db.db
+        self.batch_size = batch_size
+
+    async def import_file(self, path: Path) -> ImportResult:
+        """
+        Import một file điểm trong một transaction.
+
+        Args:
+            path: File .csv hoặc .xlsx
+
+        Returns:
+            ImportResult: Số dòng đã đọc, bị loại, chèn mới, cập nhật và không đổi
+        """
+        started = time.perf_counter()
+        result = ImportResult()
+        rows = read_score_rows(Path(path), result)
+        student_codes: Set[str] = set()
+
+        pool = await self.db.connect()
+        async with pool.acquire() as conn:
+            # ON CONFLICT cần unique index trên khoá của bản ghi điểm (migration 2)
+            await upgrade_connection(conn, timeout=self.db.maintenance_timeout)
+            async with conn.transaction():
+                await conn.execute(CREATE_STAGING)
+                while True:
+                    # Đọc/parse file trong worker thread để không chặn event loop
+                    batch = await asyncio.to_thread(lambda: list(islice(rows, self.batch_size)))
+                    if not batch:
+                        break
+                    student_codes.update(record[1] for record in batch)
+                    await conn.copy_records_to_table(STAGING_TABLE, records=batch, columns=STAGING_COLUMNS,
+                                                     timeout=self.db.maintenance_timeout)
+                await conn.execute(UPSERT_STUDENTS, timeout=self.db.maintenance_timeout)
+                # Trạng thái "INSERT 0 <số dòng chèn/cập nhật>"
+                subjects_status = await conn.execute(UPSERT_SUBJECTS, timeout=self.db.maintenance_timeout)
+                rejected = await conn.fetch(REJECT_UNKNOWN_REFERENCES, timeout=self.db.maintenance_timeout)
+                counts = await conn.fetchrow(COUNT_STAGING_KEYS, timeout=self.db.maintenance_timeout)
+                changed = await conn.fetch(UPSERT_SCORES, timeout=self.db.maintenance_timeout)
+
+        self.db.mark_written()
+        for record in sorted(rejected, key=lambda record: record["row_no"]):
+            _add_error(result, record["row_no"],
+                       f"subject {record['subject_id']} is not in the database and has no subject_name"
+                       if record["student_exists"] else
+                       f"student {record['student_code']} is not in the database and has no student_name")
+        result.inserted = sum(1 for record in changed if record["inserted"])
+        result.updated = len(changed) - result.inserted
+        result.unchanged = counts["score_keys"] - len(changed)
+        result.students = counts["students"]
+
+        await self.db.refresh_gpa_view()
+        self.db.subjects.invalidate()
+        if int(subjects_status.split()[-1]):
+            # Tên/tín chỉ môn đổi thì kết quả đã cache của mọi sinh viên học môn đó đều cũ
+            tool_cache.invalidate_all()
+        else:
+            tool_cache.invalidate_students(student_codes)
+        result.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Imported {path}: {result.inserted} inserted, {result.updated} updated, "
+                    f"{result.rows_rejected} rejected in {result.duration_ms} ms")
+        return result
+
+
+cli = typer.Typer()
+
+
+@cli.command()
+def load(path: Path, batch_size: int = 5000):
+    """Import a CSV/XLSX file of student scores into PostgreSQL"""
+
+    async def run() -> ImportResult:
+        db = Database()
+        try:
+            return await ScoreImporter(db, batch_size=batch_size).import_file(path)
+        finally:
+            await db.close()
+
+    result = asyncio.run(run())
+    for row in result.errors:
+        typer.echo(f"Row {row['row']}: {row['error']}", err=True)
+    typer.echo(f"Read {result.rows_read} rows: {result.inserted} inserted, {result.updated} updated, "
+               f"{result.unchanged} unchanged, {result.rows_rejected} rejected ({result.duration_ms} ms)")
+
+
+if __name__ == "__main__":
+    cli()
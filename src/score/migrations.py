@@ -0,0 +1,238 @@
+"""
+Migration có đánh số phiên bản cho schema điểm (students, subjects, scores).
+
+Các phiên bản đã chạy được ghi trong bảng schema_migrations; mỗi lần upgrade chỉ chạy các
+migration còn thiếu, theo thứ tự, dưới một advisory lock để hai process không cùng migrate.
+Migration thường chạy trong transaction; migration tạo index dùng CREATE INDEX CONCURRENTLY
+(không chặn ghi trên bảng đang có dữ liệu) nên chạy ngoài transaction. CREATE INDEX CONCURRENTLY
+bị ngắt giữa chừng để lại một index INVALID mà IF NOT EXISTS vẫn coi là đã có, nên trước mỗi
+câu lệnh index INVALID cùng tên bị xoá để tạo lại.
+
+Index bám theo các truy vấn của score.queries: lọc theo student_code (kèm semester,
+subject_id), sắp xếp theo semester và join sang students. Các index có INCLUDE các cột được
+SELECT để truy vấn điểm của một sinh viên là index-only scan.
+
+    python -m score.migrations upgrade
+    python -m score.migrations status
+"""
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import typer
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+# Khoá pg_advisory_lock của migration (số bất kỳ, cố định)
+MIGRATION_LOCK_ID = 4_515_020_045
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version integer PRIMARY KEY,
+        name text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+
+# Tên index trong câu CREATE INDEX của migration
+INDEX_NAME_PATTERN = re.compile(r"CREATE (?:UNIQUE )?INDEX (?:CONCURRENTLY )?IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+# NULL nếu index chưa có, false nếu CREATE INDEX CONCURRENTLY trước đó bị ngắt
+INDEX_IS_VALID = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)"
+
+DUPLICATE_SCORE_KEYS = """
+    SELECT student_code, subject_id, semester, COUNT(*) AS copies
+    FROM scores
+    GROUP BY student_code, subject_id, semester
+    HAVING COUNT(*) > 1
+    ORDER BY copies DESC, student_code, subject_id, semester
+    LIMIT 10
+"""
+
+
+class MigrationError(RuntimeError):
+    """Dữ liệu hiện có không thoả điều kiện của migration."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Một bước thay đổi schema."""
+    version: int
+    name: str
+    statements: Tuple[str, ...]
+    transactional: bool = True
+    # Truy vấn trả về các dòng chặn migration (ví dụ khoá trùng trước khi tạo unique index)
+    precheck: Optional[str] = None
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_score_tables", (
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            student_code text PRIMARY KEY,
+            student_name text NOT NULL,
+            student_class text
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS subjects (
+            subject_id integer PRIMARY KEY,
+            subject_name text NOT NULL,
+            subject_credits integer
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS scores (
+            student_code text NOT NULL REFERENCES students (student_code) ON UPDATE CASCADE,
+            subject_id integer NOT NULL REFERENCES subjects (subject_id) ON UPDATE CASCADE,
+            semester text NOT NULL,
+            score_text text,
+            score_first numeric(4, 2),
+            score_second numeric(4, 2),
+            score_final numeric(4, 2),
+            score_over_rall numeric(4, 2)
+        )
+        """,
+    )),
+    Migration(2, "score_access_indexes", (
+        # Khoá của một bản ghi điểm (ON CONFLICT của score.importer), cũng phục vụ lọc theo sinh viên + môn
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS scores_student_subject_semester_key "
+        "ON scores (student_code, subject_id, semester) "
+        "INCLUDE (score_text, score_first, score_second, score_final, score_over_rall)",
+        # Điểm của một sinh viên (theo kỳ), đã sắp theo semester DESC, đủ cột cho index-only scan
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS scores_student_semester_idx "
+        "ON scores (student_code, semester DESC) "
+        "INCLUDE (subject_id, score_text, score_first, score_second, score_final, score_over_rall)",
+        # Lọc theo môn (và kỳ) không có mã sinh viên
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS scores_subject_semester_idx "
+        "ON scores (subject_id, semester) INCLUDE (student_code)",
+        # Lọc theo kỳ (thống kê cả khoá)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS scores_semester_idx ON scores (semester)",
+        # Điểm theo lớp (scores_many_query); join sang students dùng primary key
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS students_class_idx ON students (student_class)",
+    ), transactional=False, precheck=DUPLICATE_SCORE_KEYS),
+]
+
+
+async def check_migration(conn, migration: Migration) -> None:
+    """Dừng migration nếu dữ liệu hiện có vi phạm điều kiện của nó (chưa thay đổi gì)."""
+    if migration.precheck is None:
+        return
+    rows = await conn.fetch(migration.precheck)
+    if rows:
+        sample = "; ".join(", ".join(f"{key}={value}" for key, value in row.items()) for row in rows)
+        raise MigrationError(f"Migration {migration.version} ({migration.name}) is blocked by existing rows, "
+                             f"fix them and run it again: {sample}")
+
+
+async def drop_invalid_index(conn, statement: str, timeout: Optional[float] = None) -> bool:
+    """Xoá index INVALID do CREATE INDEX CONCURRENTLY bị ngắt để câu lệnh tạo lại được."""
+    match = INDEX_NAME_PATTERN.search(statement)
+    if not match or await conn.fetchval(INDEX_IS_VALID, match.group(1)) is not False:
+        return False
+    logger.warning(f"Dropping invalid index {match.group(1)} left by an interrupted build")
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}", timeout=timeout)
+    return True
+
+
+async def applied_versions(conn) -> Dict[int, Any]:
+    """Các phiên bản đã chạy và thời điểm chạy."""
+    await conn.execute(CREATE_MIGRATIONS_TABLE)
+    return {record["version"]: record["applied_at"]
+            for record in await conn.fetch("SELECT version, applied_at FROM schema_migrations")}
+
+
+async def upgrade_connection(conn, target: Optional[int] = None, timeout: Optional[float] = None) -> List[int]:
+    """
+    Chạy các migration còn thiếu trên một kết nối (theo search_path của kết nối đó).
+
+    Args:
+        conn: Kết nối asyncpg
+        target: Phiên bản cao nhất cần chạy, mặc định là mới nhất
+        timeout: Timeout của mỗi câu lệnh
+
+    Returns:
+        List[int]: Các phiên bản vừa được chạy
+    """
+    applied = []
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        done = await applied_versions(conn)
+        for migration in MIGRATIONS:
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            await check_migration(conn, migration)
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            if migration.transactional:
+                async with conn.transaction():
+                    for statement in migration.statements:
+                        await conn.execute(statement, timeout=timeout)
+                    await conn.execute("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                                       migration.version, migration.name)
+            else:
+                # IF NOT EXISTS cộng với xoá index INVALID cho phép chạy lại khi bị ngắt giữa chừng
+                for statement in migration.statements:
+                    await drop_invalid_index(conn, statement, timeout=timeout)
+                    await conn.execute(statement, timeout=timeout)
+                await conn.execute("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                                   migration.version, migration.name)
+            applied.append(migration.version)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    return applied
+
+
+async def upgrade(db: Database, target: Optional[int] = None) -> List[int]:
+    """Chạy các migration còn thiếu trên database."""
+    pool = await db.connect()
+    async with pool.acquire() as conn:
+        return await upgrade_connection(conn, target=target, timeout=db.maintenance_timeout)
+
+
+async def status(db: Database) -> List[Dict[str, Any]]:
+    """Trạng thái của từng migration."""
+    pool = await db.connect()
+    async with pool.acquire() as conn:
+        done = await applied_versions(conn)
+    return [{"version": m.version, "name": m.name, "applied_at": done.get(m.version)} for m in MIGRATIONS]
+
+
+cli = typer.Typer()
+
+
+def _run(operation):
+    async def run():
+        db = Database()
+        try:
+            return await operation(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(run())
+
+
+@cli.command("upgrade")
+def upgrade_command(target: Optional[int] = None):
+    """Apply pending score schema migrations"""
+    try:
+        applied = _run(lambda db: upgrade(db, target=target))
+    except MigrationError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    typer.echo(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+
+
+@cli.command("status")
+def status_command():
+    """Show which score schema migrations have been applied"""
+    for row in _run(status):
+        typer.echo(f"{row['version']:>4}  {row['name']:<28} {row['applied_at'] or 'pending'}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,265 @@
+"""
+Các câu SQL cố định của score.Database.
+
+Mỗi tổ hợp bộ lọc (student_code, semester, subject_id) có đúng một câu lệnh với text cố định,
+nên asyncpg prepare mỗi câu một lần trên mỗi kết nối (statement cache theo text) và
+PostgreSQL dùng lại plan thay vì phân tích lại câu SQL ghép chuỗi ở mỗi lần gọi. Kết quả có
+thể chuyển thẳng sang dict cùng dạng với ScoreWithDetails.model_dump() mà không dựng các
+object Pydantic khi caller chỉ cần JSON.
+
+Truy vấn điểm không JOIN bảng subjects: tên môn và số tín chỉ được lấy từ danh mục môn học
+giữ trong process (score.subject_catalog), nên chỉ còn đọc scores và students.
+"""
+from itertools import product
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .models import ScoreFilter
+
+GET_STUDENT = "SELECT * FROM students WHERE student_code = $1"
+
+# Độ trễ (giây) của read replica so với primary; 0 khi đã replay hết WAL nhận được (replica
+# rảnh không bị coi là trễ) hoặc khi máy chủ không phải replica. NULL khi WAL receiver không
+# streaming: replay đuổi kịp LSN nhận được cuối cùng rồi đứng yên nên phép so sánh LSN sẽ
+# báo 0 dù replica đã mất kết nối với primary từ lâu.
+REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END::float8
+"""
+
+SCORE_COLUMNS = """
+    s.score_text, s.score_first, s.score_second, s.score_final, s.score_over_rall,
+    s.semester, s.student_code, s.subject_id,
+    st.student_name, st.student_class
+"""
+
+# Thứ tự cố định của các bộ lọc, quyết định thứ tự tham số $1, $2, $3
+SCORE_FILTERS = (("student_code", "s.student_code"), ("semester", "s.semester"), ("subject_id", "s.subject_id"))
+
+
+def _build_score_query(flags: Tuple[bool, ...]) -> str:
+    conditions = [f"{column} = ${index}" for index, (_, column) in
+                  enumerate((f for f, enabled in zip(SCORE_FILTERS, flags) if enabled), start=1)]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+    SELECT {SCORE_COLUMNS}
+    FROM scores s
+    JOIN students st ON s.student_code = st.student_code
+    {where}
+    ORDER BY s.semester DESC
+    """
+
+
+# 8 câu lệnh, một cho mỗi tổ hợp bộ lọc
+SCORE_QUERIES: Dict[Tuple[bool, ...], str] = {
+    flags: _build_score_query(flags) for flags in product((True, False), repeat=len(SCORE_FILTERS))
+}
+
+
+def score_query(filter: ScoreFilter) -> Tuple[str, List[Any]]:
+    """
+    Chọn câu lệnh cố định và tham số cho bộ lọc.
+
+    Returns:
+        Tuple[str, List[Any]]: (SQL, tham số theo thứ tự $1..$n)
+    """
+    values = [getattr(filter, name) for name, _ in SCORE_FILTERS]
+    flags = tuple(bool(value) for value in values)
+    return SCORE_QUERIES[flags], [value for value in values if value]
+
+
+def _number(value: Any) -> Optional[float]:
+    # Cột numeric/integer trả về Decimal/int, JSON cần float như khi đi qua model Pydantic
+    return float(value) if value is not None else None
+
+
+def sort_scores(scores: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sắp điểm theo học kỳ mới nhất trước, rồi theo tên môn (thứ tự trước đây của ORDER BY)."""
+    scores.sort(key=lambda score: score.get("subject_name") or (score.get("subject") or {}).get("subject_name") or "")
+    scores.sort(key=lambda score: score["semester"] or "", reverse=True)
+    return scores
+
+
+def score_row_to_dict(record, subject: Dict[str, Any]) -> Dict[str, Any]:
+    """Chuyển một dòng kết quả và môn học của nó sang dict cùng dạng ScoreWithDetails.model_dump()."""
+    return {
+        "score_text": record["score_text"],
+        "score_first": _number(record["score_first"]),
+        "score_second": _number(record["score_second"]),
+        "score_final": _number(record["score_final"]),
+        "score_over_rall": _number(record["score_over_rall"]),
+        "semester": record["semester"],
+        "student_code": record["student_code"],
+        "subject_id": record["subject_id"],
+        "subject": {
+            "subject_id": record["subject_id"],
+            "subject_name": subject["subject_name"],
+            "subject_credits": subject["subject_credits"],
+        },
+        "student": {
+            "student_code": record["student_code"],
+            "student_name": record["student_name"],
+            "student_class": record["student_class"],
+        },
+    }
+
+
+# Điểm của nhiều sinh viên trong một truy vấn: theo danh sách mã (= ANY($1)) hoặc theo lớp,
+# sắp theo sinh viên để có thể gom nhóm khi đọc tuần tự (cursor)
+_SCORES_MANY = f"""
+    SELECT {SCORE_COLUMNS}
+    FROM scores s
+    JOIN students st ON s.student_code = st.student_code
+    WHERE {{condition}}
+    ORDER BY s.student_code, s.semester DESC
+"""
+
+SCORES_MANY_QUERIES: Dict[Tuple[str, bool], str] = {
+    ("student_codes", False): _SCORES_MANY.format(condition="s.student_code = ANY($1::text[])"),
+    ("student_codes", True): _SCORES_MANY.format(condition="s.student_code = ANY($1::text[]) AND s.semester = $2"),
+    ("student_class", False): _SCORES_MANY.format(condition="st.student_class = $1"),
+    ("student_class", True): _SCORES_MANY.format(condition="st.student_class = $1 AND s.semester = $2"),
+}
+
+
+def scores_many_query(student_codes: Optional[List[str]] = None, student_class: Optional[str] = None,
+                      semester: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """
+    Chọn câu lệnh lấy điểm của nhiều sinh viên; cần đúng một trong student_codes, student_class.
+
+    Returns:
+        Tuple[str, List[Any]]: (SQL, tham số)
+    """
+    if bool(student_codes) == bool(student_class):
+        raise ValueError("Provide either student_codes or student_class")
+    if student_codes:
+        key, params = "student_codes", [sorted({code.strip().upper() for code in student_codes})]
+    else:
+        key, params = "student_class", [student_class.strip()]
+    if semester:
+        params.append(semester)
+    return SCORES_MANY_QUERIES[(key, bool(semester))], params
+
+
+def compact_score(record, subject: Dict[str, Any]) -> Dict[str, Any]:
+    """Một điểm không kèm thông tin sinh viên (đã có ở nhóm của sinh viên)."""
+    return {
+        "semester": record["semester"],
+        "subject_id": record["subject_id"],
+        "subject_name": subject["subject_name"],
+        "subject_credits": subject["subject_credits"],
+        "score_text": record["score_text"],
+        "score_first": _number(record["score_first"]),
+        "score_second": _number(record["score_second"]),
+        "score_final": _number(record["score_final"]),
+        "score_over_rall": _number(record["score_over_rall"]),
+    }
+
+
+def student_group(record) -> Dict[str, Any]:
+    """Nhóm điểm của một sinh viên, bắt đầu từ dòng đầu tiên của sinh viên đó."""
+    return {
+        "student_code": record["student_code"],
+        "student_name": record["student_name"],
+        "student_class": record["student_class"],
+        "scores": [],
+    }
+
+
+def group_by_student(records: Iterable, subjects: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Gom các dòng (đã sắp theo student_code) thành một nhóm cho mỗi sinh viên.
+
+    Args:
+        records: Các dòng điểm
+        subjects: Danh mục môn học; dòng của môn không có trong danh mục bị bỏ như khi JOIN
+    """
+    groups: List[Dict[str, Any]] = []
+    for record in records:
+        subject = subjects.get(record["subject_id"])
+        if subject is None:
+            continue
+        if not groups or groups[-1]["student_code"] != record["student_code"]:
+            groups.append(student_group(record))
+        groups[-1]["scores"].append(compact_score(record, subject))
+    for group in groups:
+        sort_scores(group["scores"])
+    return groups
+
+
+# Tổng hợp điểm theo học kỳ của một sinh viên: tổng điểm nhân tín chỉ, số tín chỉ có điểm,
+# tín chỉ đạt/không đạt ($2 là ngưỡng điểm đạt). GPA = weighted_sum / credits.
+GPA_BY_SEMESTER = """
+    SELECT s.semester,
+           SUM(su.subject_credits * s.score_over_rall) AS weighted_sum,
+           SUM(su.subject_credits) AS credits,
+           SUM(su.subject_credits) FILTER (WHERE s.score_over_rall >= $2) AS credits_passed,
+           SUM(su.subject_credits) FILTER (WHERE s.score_over_rall < $2) AS credits_failed,
+           COUNT(*) AS subjects
+    FROM scores s
+    JOIN subjects su ON s.subject_id = su.subject_id
+    WHERE s.student_code = $1 AND s.score_over_rall IS NOT NULL AND su.subject_credits IS NOT NULL
+    GROUP BY s.semester
+"""
+
+GPA_VIEW = "student_semester_gpa"
+
+GPA_BY_SEMESTER_FROM_VIEW = f"""
+    SELECT semester, weighted_sum, credits, credits_passed, credits_failed, subjects
+    FROM {GPA_VIEW}
+    WHERE student_code = $1
+"""
+
+# Ngưỡng đạt đã dùng để dựng view, ghi trong COMMENT của view (NULL nếu view chưa có)
+GPA_VIEW_THRESHOLD = "SELECT obj_description(to_regclass($1), 'pg_class')"
+
+REFRESH_GPA_VIEW = f"REFRESH MATERIALIZED VIEW CONCURRENTLY {GPA_VIEW}"
+
+
+def gpa_view_comment(pass_threshold: float) -> str:
+    """Nội dung COMMENT ghi ngưỡng đạt của view, so với GPA_VIEW_THRESHOLD để biết view còn đúng."""
+    return f"pass_threshold={float(pass_threshold)}"
+
+
+def create_gpa_view_statements(pass_threshold: float) -> List[str]:
+    """
+    Câu lệnh (dựng lại) materialized view tổng hợp theo (sinh viên, học kỳ), chạy trong một transaction.
+
+    DDL không nhận tham số nên ngưỡng đạt được ghi thẳng vào định nghĩa view và lưu trong
+    COMMENT của view; khi SCORE_PASS_THRESHOLD đổi, view được xoá và tạo lại với ngưỡng mới.
+    Unique index cho phép REFRESH ... CONCURRENTLY không khoá các truy vấn đang đọc view.
+    """
+    threshold = float(pass_threshold)
+    return [
+        f"DROP MATERIALIZED VIEW IF EXISTS {GPA_VIEW}",
+        f"""
+        CREATE MATERIALIZED VIEW {GPA_VIEW} AS
+        SELECT s.student_code, s.semester,
+               SUM(su.subject_credits * s.score_over_rall) AS weighted_sum,
+               SUM(su.subject_credits) AS credits,
+               SUM(su.subject_credits) FILTER (WHERE s.score_over_rall >= {threshold}) AS credits_passed,
+               SUM(su.subject_credits) FILTER (WHERE s.score_over_rall < {threshold}) AS credits_failed,
+               COUNT(*) AS subjects
+        FROM scores s
+        JOIN subjects su ON s.subject_id = su.subject_id
+        WHERE s.score_over_rall IS NOT NULL AND su.subject_credits IS NOT NULL
+        GROUP BY s.student_code, s.semester
+        """,
+        f"CREATE UNIQUE INDEX {GPA_VIEW}_key ON {GPA_VIEW} (student_code, semester)",
+        f"COMMENT ON MATERIALIZED VIEW {GPA_VIEW} IS '{gpa_view_comment(threshold)}'",
+    ]
+
+
+def semester_row_to_dict(record) -> Dict[str, Any]:
+    """Chuyển một dòng tổng hợp học kỳ sang dict với số kiểu Python."""
+    return {
+        "semester": record["semester"],
+        "weighted_sum": _number(record["weighted_sum"]) or 0.0,
+        "credits": int(record["credits"] or 0),
+        "credits_passed": int(record["credits_passed"] or 0),
+        "credits_failed": int(record["credits_failed"] or 0),
+        "subjects": int(record["subjects"] or 0),
+    }
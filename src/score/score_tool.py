@@ -6,7 +6,9 @@ from langchain_core.tools import tool
 from pydantic import BaseModel, Field, validator
 
 from score.student_tool import global_db
-from .models import ScoreFilter, ScoreResponse
+from score.encoding import dumps, encode_student_scores, output_format
+from score.tool_cache import tool_cache
+from .models import ScoreFilter
 
 
 class ScoreInput(BaseModel):
@@ -45,6 +47,10 @@ async def get_student_scores(student_code: str, semester: Optional[str] = None,
         A JSON string containing the scores and any additional information
     """
 
+    cached = tool_cache.get("get_student_scores", student_code, semester=semester, subject_id=subject_id)
+    if cached is not None:
+        return cached
+
     try:
         # Validate semester format if provided
         if semester:
@@ -57,22 +63,21 @@ async def get_student_scores(student_code: str, semester: Optional[str] = None,
         # Create filter
         filter = ScoreFilter(student_code=student_code, semester=semester, subject_id=subject_id)
 
-        # Get scores
-        scores = await global_db.db.get_scores(filter)
+        # Get scores (dict cùng dạng ScoreWithDetails.model_dump(), không dựng model Pydantic)
+        scores = await global_db.db.get_scores_dicts(filter)
 
         if not scores:
             return json.dumps({"scores": [], "message": f"No scores found for student {student_code}" + (
                 f" in semester {semester}" if semester else "")})
 
-        # Convert to serializable format
-        scores_data = [score.model_dump() for score in scores]
-
-        response = ScoreResponse(scores=scores, message=f"Found {len(scores)} scores for student {student_code}" + (
-            f" in semester {semester}" if semester else ""))
-
-        return json.dumps(response.model_dump())
+        message = f"Found {len(scores)} scores for student {student_code}" + (
+            f" in semester {semester}" if semester else "")
+        if output_format("get_student_scores") == "compact":
+            result = dumps(encode_student_scores(scores, message))
+        else:
+            result = json.dumps({"scores": scores, "message": message})
+        tool_cache.set("get_student_scores", student_code, result, semester=semester, subject_id=subject_id)
+        return result
 
     except Exception as e:
         return json.dumps({"scores": [], "message": f"Error retrieving scores: {str(e)}"})
-    finally:
-        await global_db.close()
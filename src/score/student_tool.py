@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 
 from langchain_core.tools import tool
 from .database import Database
+from .tool_cache import tool_cache
 
 
 class StudentInfoInput(BaseModel):
@@ -11,7 +12,12 @@ class StudentInfoInput(BaseModel):
 
 
 class GlobalDB:
-    """A tool for retrieving student information from the database."""
+    """
+    Pool PostgreSQL dùng chung cho các tool.
+
+    Pool được mở khi ứng dụng khởi động (hoặc ở lần gọi tool đầu tiên) và chỉ đóng khi ứng dụng
+    dừng, nên mỗi lần tra cứu chỉ tốn một round trip trên kết nối đã sẵn.
+    """
 
     def __init__(self):
         self.db = Database()
@@ -24,6 +30,9 @@ class GlobalDB:
         """Close the database connection"""
         await self.db.close()
 
+    async def health_check(self):
+        return await self.db.health_check()
+
 
 global_db = GlobalDB()
 
@@ -42,6 +51,10 @@ async def get_student_info(student_code: str) -> str:
     Returns:
         A JSON string containing the student information
     """
+    cached = tool_cache.get("get_student_info", student_code)
+    if cached is not None:
+        return cached
+
     try:
         # Get student
         student = await global_db.db.get_student(student_code)
@@ -52,9 +65,9 @@ async def get_student_info(student_code: str) -> str:
         # Convert to serializable format
         student_data = student.model_dump()
 
-        return json.dumps({"student": student_data, "message": f"Found student information for {student_code}"})
+        result = json.dumps({"student": student_data, "message": f"Found student information for {student_code}"})
+        tool_cache.set("get_student_info", student_code, result)
+        return result
 
     except Exception as e:
         return json.dumps({"student": None, "message": f"Error retrieving student information: {str(e)}"})
-    finally:
-        await global_db.close()
@@ -0,0 +1,76 @@
+"""
+Danh mục môn học giữ trong process.
+
+Bảng subjects gần như không đổi, nên thay vì JOIN ở mỗi truy vấn điểm và truy vấn riêng cho
+mỗi get_subject, toàn bộ danh mục được nạp một lần và tra bằng dict. Danh mục được nạp lại
+khi quá SUBJECT_CATALOG_TTL giây (mặc định 300) hoặc sau khi import điểm (invalidate); môn
+chưa có trong danh mục (vừa thêm) được đọc bổ sung từ database ngay khi gặp (read-through).
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+GET_ALL_SUBJECTS = "SELECT subject_id, subject_name, subject_credits FROM subjects"
+
+GET_SUBJECTS_BY_IDS = "SELECT subject_id, subject_name, subject_credits FROM subjects WHERE subject_id = ANY($1::int[])"
+
+
+class SubjectCatalog:
+    """subject_id → {subject_id, subject_name, subject_credits}, nạp lại theo TTL."""
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Args:
+            ttl: Số giây trước khi danh mục được nạp lại toàn bộ
+        """
+        self.ttl = ttl
+        self._subjects: Dict[int, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def get(self, subject_id: int) -> Optional[Dict[str, Any]]:
+        """Môn học trong danh mục đang giữ (không truy vấn database)."""
+        return self._subjects.get(subject_id)
+
+    async def load(self, conn) -> None:
+        """Nạp lại toàn bộ danh mục trên kết nối đã có."""
+        records = await conn.fetch(GET_ALL_SUBJECTS)
+        self._subjects = {record["subject_id"]: dict(record) for record in records}
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded subject catalog ({len(self._subjects)} subjects)")
+
+    async def resolve(self, conn, subject_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Đảm bảo danh mục còn hạn và có đủ các môn cần dùng.
+
+        Args:
+            conn: Kết nối asyncpg đang dùng cho truy vấn điểm
+            subject_ids: Các mã môn xuất hiện trong kết quả
+
+        Returns:
+            Dict[int, Dict[str, Any]]: Danh mục; môn không tồn tại trong database không có mặt
+        """
+        if self.stale:
+            await self.load(conn)
+        missing = {subject_id for subject_id in subject_ids if subject_id not in self._subjects}
+        if missing:
+            for record in await conn.fetch(GET_SUBJECTS_BY_IDS, sorted(missing)):
+                self._subjects[record["subject_id"]] = dict(record)
+        return self._subjects
+
+    def invalidate(self) -> None:
+        """Buộc nạp lại ở lần dùng tiếp theo (gọi sau khi import/cập nhật môn học)."""
+        self._loaded_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subjects": len(self._subjects), "stale": self.stale}
+
+
+def create_subject_catalog() -> SubjectCatalog:
+    return SubjectCatalog(ttl=float(os.environ.get("SUBJECT_CATALOG_TTL", "300")))
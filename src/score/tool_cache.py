@@ -0,0 +1,104 @@
+"""
+Cache kết quả tool tra cứu điểm/thông tin sinh viên giữa các request.
+
+Key gồm mã sinh viên, tên tool và tham số đã chuẩn hoá, nên mỗi mục luôn gắn với đúng một
+sinh viên: có thể xoá toàn bộ dữ liệu của một sinh viên khi điểm được import lại, và hai
+sinh viên không bao giờ dùng chung một mục. TTL ngắn (TOOL_CACHE_TTL, mặc định 120 giây;
+thông tin sinh viên dùng TOOL_CACHE_INFO_TTL) giới hạn độ cũ của dữ liệu. Hit/miss được đếm
+trong telemetry (`tool_cache.<tool>.hit|miss`).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_student_code(student_code: str) -> str:
+    return (student_code or "").strip().upper()
+
+
+class ToolResultCache:
+    """LRU có TTL cho kết quả tool, phân vùng theo mã sinh viên."""
+
+    def __init__(self, default_ttl: float = 120.0, ttls: Optional[Dict[str, float]] = None, max_entries: int = 4096):
+        """
+        Args:
+            default_ttl: Thời gian sống mặc định (giây) của một kết quả
+            ttls: TTL riêng theo tên tool
+            max_entries: Số mục tối đa trước khi loại bỏ mục dùng lâu nhất
+        """
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.max_entries = max_entries
+        self.enabled = default_ttl > 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(tool_name: str, student_code: str, args: Dict[str, Any]) -> Tuple[str, str, str]:
+        normalized = {k: (v.strip().lower() if isinstance(v, str) else v) for k, v in args.items() if v is not None}
+        return normalize_student_code(student_code), tool_name, json.dumps(normalized, sort_keys=True)
+
+    def get(self, tool_name: str, student_code: str, **args) -> Optional[str]:
+        """Lấy kết quả đã cache nếu còn hạn."""
+        if not self.enabled:
+            return None
+        key = self._key(tool_name, student_code, args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                value = entry[0]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                value = None
+        increment(f"tool_cache.{tool_name}.{'hit' if value is not None else 'miss'}")
+        return value
+
+    def set(self, tool_name: str, student_code: str, value: str, **args) -> None:
+        """Lưu kết quả thành công của tool."""
+        if not self.enabled:
+            return
+        key = self._key(tool_name, student_code, args)
+        expires_at = time.monotonic() + self.ttls.get(tool_name, self.default_ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_students(self, student_codes: Iterable[str]) -> int:
+        """Xoá mọi kết quả của các sinh viên (gọi sau khi import/cập nhật điểm)."""
+        codes = {normalize_student_code(code) for code in student_codes}
+        with self._lock:
+            keys = [key for key in self._entries if key[0] in codes]
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached tool results for {len(codes)} student(s)")
+        return len(keys)
+
+    def invalidate_all(self) -> None:
+        """Xoá toàn bộ cache (ví dụ khi danh mục môn học thay đổi)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries}
+
+
+tool_cache = ToolResultCache(
+    default_ttl=float(os.environ.get("TOOL_CACHE_TTL", "120")),
+    ttls={"get_student_info": float(os.environ.get("TOOL_CACHE_INFO_TTL", "600"))},
+    max_entries=int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", "4096")),
+)
@@ -0,0 +1,26 @@
+"""
+Event loop dùng chung cho các lời gọi agent từ Streamlit.
+
+Streamlit chạy lại script ở mỗi tương tác; nếu mỗi lần gọi agent dùng `asyncio.run` thì một
+event loop mới được tạo và pool asyncpg của các tool điểm (gắn với loop cũ) phải mở lại từ
+đầu. Loop ở đây chạy trong một thread nền, được giữ qua `st.cache_resource` suốt vòng đời
+server, nên pool và các kết nối đã mở được dùng lại giữa các lượt chat.
+"""
+import asyncio
+import threading
+from typing import Any, Coroutine
+
+import streamlit as st
+
+
+@st.cache_resource
+def get_agent_loop() -> asyncio.AbstractEventLoop:
+    """Tạo (một lần cho cả server) event loop chạy trong thread nền."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+
+def run_agent(coro: Coroutine) -> Any:
+    """Chạy coroutine trên loop dùng chung và chờ kết quả."""
+    return asyncio.run_coroutine_threadsafe(coro, get_agent_loop()).result()
@@ -246,6 +246,8 @@ def t(key):
 
 # Import custom components
 from appbar import create_appbar, create_simple_appbar, create_compact_appbar
+# Event loop dùng chung để pool PostgreSQL của các tool được giữ giữa các lượt chat
+from agent_loop import run_agent
 # Import feature selector
 try:
     from feature_selector import render_feature_ui
@@ -1984,7 +1986,7 @@ def main():
                         bot_reply = st.session_state.file_chat_agent.chat(user_query)
                     elif "kma_chat_agent" in st.session_state and st.session_state.kma_chat_agent:
                         # Use KMA chat agent (original behavior from simplified file)
-                        response = asyncio.run(
+                        response = run_agent(
                             st.session_state.kma_chat_agent.chat_with_memory(
                                 st.session_state.conversation_history,
                                 user_query
@@ -2046,7 +2048,6 @@ def main():
                 try:
                     st.session_state.kma_chat_agent = ReActGraph()
                     st.session_state.kma_chat_agent.create_graph()
-                    st.session_state.kma_chat_agent.print_mermaid()
                     
                 except Exception as e:
                     st.error(f"{t('error_initializing')} {str(e)}")
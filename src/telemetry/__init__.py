@@ -0,0 +1,12 @@
+from .recorder import Span, TraceRecorder, recorder, span, increment, current_span
+from .callbacks import TracingCallbackHandler
+
+__all__ = [
+    "Span",
+    "TraceRecorder",
+    "recorder",
+    "span",
+    "increment",
+    "current_span",
+    "TracingCallbackHandler",
+]
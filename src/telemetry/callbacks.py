@@ -0,0 +1,123 @@
+"""
+LangChain callback handler ghi span cho graph node, tool, retriever và LLM call.
+
+Chỉ các run có ý nghĩa với việc tuning được ghi (node của LangGraph, graph gốc, tool,
+retriever, chat model); các runnable nội bộ (prompt, RunnableSequence, ChannelWrite...)
+được bỏ qua và span con được gắn vào span gần nhất phía trên.
+"""
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .recorder import Span, TraceRecorder, current_span, recorder as default_recorder
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Chuyển các sự kiện callback của LangChain/LangGraph thành span của TraceRecorder."""
+
+    # Chạy trong cùng luồng với run để thứ tự start/end luôn đúng
+    run_inline = True
+
+    def __init__(self, recorder: Optional[TraceRecorder] = None, parent: Optional[Span] = None):
+        self.recorder = recorder or default_recorder
+        # Span bao ngoài (ví dụ agent.request) lấy từ context lúc tạo handler
+        self.parent = parent if parent is not None else current_span()
+        self._spans: Dict[UUID, Span] = {}
+        # run không được ghi -> span gần nhất phía trên, để nối span con cho đúng
+        self._anchors: Dict[UUID, Optional[Span]] = {}
+
+    def _parent_for(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is None:
+            return self.parent
+        if parent_run_id in self._spans:
+            return self._spans[parent_run_id]
+        return self._anchors.get(parent_run_id, self.parent)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, **attributes) -> None:
+        span = self.recorder.start_span(name, kind, parent=self._parent_for(parent_run_id), **attributes)
+        self._spans[run_id] = span
+
+    def _skip(self, run_id: UUID, parent_run_id: Optional[UUID]) -> None:
+        self._anchors[run_id] = self._parent_for(parent_run_id)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes) -> None:
+        self._anchors.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.attributes.update(attributes)
+        self.recorder.end_span(span, error)
+
+    # Chains / graph nodes
+    def on_chain_start(self, serialized: Optional[Dict[str, Any]], inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._start(run_id, parent_run_id, name, "graph")
+        elif node is not None and name == node:
+            self._start(run_id, parent_run_id, node, "node", step=(metadata or {}).get("langgraph_step"))
+        else:
+            self._skip(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # GraphInterrupt/ParentCommand là điều khiển luồng của LangGraph, không phải lỗi
+        self._end(run_id, None if type(error).__name__ in ("GraphInterrupt", "ParentCommand") else error)
+
+    # Tools
+    def on_tool_start(self, serialized: Optional[Dict[str, Any]], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, name, "tool")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    # Retrievers
+    def on_retriever_start(self, serialized: Optional[Dict[str, Any]], query: str, *, run_id: UUID,
+                           parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "retriever")
+        self._start(run_id, parent_run_id, name, "retriever")
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, documents=len(documents) if documents is not None else 0)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    # LLM calls
+    def on_chat_model_start(self, serialized: Optional[Dict[str, Any]], messages: List[List[Any]], *,
+                            run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = (metadata or {}).get("ls_model_name") or kwargs.get("name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, parent_run_id, name, "llm", provider=(metadata or {}).get("ls_provider"))
+
+    def on_llm_start(self, serialized: Optional[Dict[str, Any]], prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, parent_run_id, name, "llm")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        input_tokens, output_tokens = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not input_tokens and not output_tokens and response.llm_output:
+            usage = response.llm_output.get("token_usage") or response.llm_output.get("usage_metadata") or {}
+            input_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0))
+            output_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0))
+        self._end(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
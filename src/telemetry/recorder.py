@@ -0,0 +1,278 @@
+"""
+Bộ ghi trace nhẹ chạy trong process.
+
+Mỗi bước (graph node, tool, retriever, LLM, truy vấn Mongo/Postgres) được ghi thành một
+Span có thời lượng, token và thuộc tính tuỳ ý. Span đã kết thúc được giữ trong ring buffer
+để admin endpoint tổng hợp, và có thể export ra file JSONL (TRACE_EXPORT_PATH) hoặc gửi
+theo lô tới collector HTTP (TRACE_COLLECTOR_URL).
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """Một bước đã được đo thời gian trong quá trình xử lý request."""
+    name: str
+    kind: str = "internal"
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    end_time: Optional[float] = None
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _start_monotonic: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end_time = time.time()
+        self.duration_ms = (time.perf_counter() - self._start_monotonic) * 1000
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_start_monotonic", None)
+        return data
+
+
+class JsonlExporter:
+    """Ghi mỗi span thành một dòng JSON vào file bằng một thread nền, không chặn request."""
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name="trace-jsonl-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                # Đĩa chậm thì bỏ span, không để tracing làm chậm request
+                return
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Chờ các span đang xếp hàng được ghi xong (dùng khi tắt ứng dụng)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    f.writelines(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+                                 for span in batch)
+                    f.flush()
+                except Exception as e:
+                    logger.warning(f"Failed to write {len(batch)} spans to {self.path}: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+
+class HttpExporter:
+    """Gửi span theo lô tới collector HTTP bằng một thread nền, không chặn request."""
+
+    def __init__(self, url: str, batch_size: int = 100, flush_interval: float = 2.0):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            try:
+                self._queue.put_nowait(span)
+            except queue.Full:
+                # Collector chậm thì bỏ span, không để tracing làm chậm request
+                return
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                requests.post(self.url, json={"spans": [s.to_dict() for s in batch]}, timeout=5)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} spans to {self.url}: {e}")
+
+
+class TraceRecorder:
+    """Lưu span gần đây, thống kê theo (kind, name) và các counter (ví dụ cache hit)."""
+
+    def __init__(self, max_spans: int = 5000, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._durations: Dict[tuple, Deque[float]] = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._aggregates: Dict[tuple, Dict[str, float]] = defaultdict(
+            lambda: {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                     "input_tokens": 0, "output_tokens": 0})
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._exporters: List[Any] = []
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: Any) -> None:
+        self._exporters.append(exporter)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Chờ các exporter có hàng đợi (JsonlExporter) ghi hết span; gọi khi tắt ứng dụng."""
+        flushed = True
+        for exporter in self._exporters:
+            if hasattr(exporter, "flush"):
+                flushed = exporter.flush(timeout) and flushed
+        return flushed
+
+    def start_span(self, name: str, kind: str = "internal", parent: Optional[Span] = None,
+                   **attributes) -> Span:
+        """Tạo span mới; nếu không truyền parent thì dùng span hiện tại trong context."""
+        parent = parent if parent is not None else _current_span.get()
+        span = Span(name=name, kind=kind, attributes=attributes)
+        if parent is not None:
+            span.trace_id = parent.trace_id
+            span.parent_id = parent.span_id
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """Kết thúc span, cập nhật thống kê và export."""
+        span.finish(error)
+        key = (span.kind, span.name)
+        with self._lock:
+            self._spans.append(span)
+            self._durations[key].append(span.duration_ms)
+            agg = self._aggregates[key]
+            agg["count"] += 1
+            agg["errors"] += 1 if span.status == "error" else 0
+            agg["total_ms"] += span.duration_ms
+            agg["max_ms"] = max(agg["max_ms"], span.duration_ms)
+            agg["input_tokens"] += span.attributes.get("input_tokens", 0) or 0
+            agg["output_tokens"] += span.attributes.get("output_tokens", 0) or 0
+        for exporter in self._exporters:
+            try:
+                exporter.export([span])
+            except Exception as e:
+                logger.warning(f"Trace exporter failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes) -> Iterator[Span]:
+        """Context manager đo một bước; dùng được trong cả code sync và async."""
+        current = self.start_span(name, kind, **attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(current, e)
+            raise
+        _current_span.reset(token)
+        self.end_span(current)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    @staticmethod
+    def _percentile(samples: List[float], q: float) -> float:
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        """Tổng hợp latency (avg/p50/p95/max), lỗi và token theo từng bước."""
+        with self._lock:
+            steps = []
+            for (kind, name), agg in self._aggregates.items():
+                samples = list(self._durations[(kind, name)])
+                steps.append({
+                    "kind": kind,
+                    "name": name,
+                    "count": int(agg["count"]),
+                    "errors": int(agg["errors"]),
+                    "avg_ms": round(agg["total_ms"] / agg["count"], 2),
+                    "p50_ms": round(self._percentile(samples, 0.5), 2),
+                    "p95_ms": round(self._percentile(samples, 0.95), 2),
+                    "max_ms": round(agg["max_ms"], 2),
+                    "input_tokens": int(agg["input_tokens"]),
+                    "output_tokens": int(agg["output_tokens"]),
+                })
+            counters = dict(self._counters)
+        steps.sort(key=lambda s: s["avg_ms"] * s["count"], reverse=True)
+        return {"steps": steps, "counters": counters}
+
+    def recent(self, limit: int = 100, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = [s for s in self._spans if kind is None or s.kind == kind]
+        return [s.to_dict() for s in spans[-limit:]][::-1]
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = [s for s in self._spans if s.trace_id == trace_id]
+        return [s.to_dict() for s in sorted(spans, key=lambda s: s.start_time)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self._durations.clear()
+            self._aggregates.clear()
+            self._counters.clear()
+
+
+def current_span() -> Optional[Span]:
+    """Span đang mở trong context hiện tại (nếu có)."""
+    return _current_span.get()
+
+
+def _create_recorder() -> TraceRecorder:
+    trace_recorder = TraceRecorder(max_spans=int(os.environ.get("TRACE_MAX_SPANS", "5000")))
+    export_path = os.environ.get("TRACE_EXPORT_PATH")
+    if export_path:
+        trace_recorder.add_exporter(JsonlExporter(export_path))
+    collector_url = os.environ.get("TRACE_COLLECTOR_URL")
+    if collector_url:
+        trace_recorder.add_exporter(HttpExporter(collector_url))
+    return trace_recorder
+
+
+recorder = _create_recorder()
+span = recorder.span
+increment = recorder.increment
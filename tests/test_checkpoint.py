@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Annotated, List, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+from agent.checkpoint import BoundedMemorySaver, trim_state_messages
+
+
+class EchoState(TypedDict):
+    messages: Annotated[List[BaseMessage], add_messages]
+
+
+def _echo_graph(checkpointer):
+    def echo(state: EchoState) -> EchoState:
+        return {"messages": [AIMessage(content=f"echo {state['messages'][-1].content}")]}
+
+    workflow = StateGraph(EchoState)
+    workflow.add_node("echo", echo)
+    workflow.set_entry_point("echo")
+    workflow.add_edge("echo", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def _chat(graph, thread_id: str, content: str) -> List[BaseMessage]:
+    config = {"configurable": {"thread_id": thread_id}}
+    return asyncio.run(graph.ainvoke({"messages": [HumanMessage(content=content)]}, config=config))["messages"]
+
+
+def _has_state(graph, thread_id: str) -> bool:
+    snapshot = asyncio.run(graph.aget_state({"configurable": {"thread_id": thread_id}}))
+    return bool(snapshot.values.get("messages"))
+
+
+def test_state_resumes_and_keeps_only_latest_checkpoint():
+    saver = BoundedMemorySaver()
+    graph = _echo_graph(saver)
+
+    _chat(graph, "t1", "a")
+    messages = _chat(graph, "t1", "b")
+
+    assert [m.content for m in messages] == ["a", "echo a", "b", "echo b"]
+    assert len(saver.storage["t1"][""]) == 1
+    assert len([key for key in saver.blobs if key[2] == "messages"]) == 1
+
+
+def test_least_recently_used_thread_is_evicted():
+    saver = BoundedMemorySaver(max_threads=2)
+    graph = _echo_graph(saver)
+
+    _chat(graph, "t1", "a")
+    _chat(graph, "t2", "a")
+    assert _has_state(graph, "t1")  # t1 vừa được dùng, t2 là thread cũ nhất
+    _chat(graph, "t3", "a")
+
+    assert _has_state(graph, "t1") and _has_state(graph, "t3")
+    assert not _has_state(graph, "t2")
+    assert "t2" not in saver.storage
+    assert not [key for key in saver.blobs if key[0] == "t2"]
+
+
+def test_expired_thread_is_dropped():
+    saver = BoundedMemorySaver(ttl_seconds=60)
+    graph = _echo_graph(saver)
+    _chat(graph, "t1", "a")
+
+    saver._last_used["t1"] = time.time() - 120
+
+    assert not _has_state(graph, "t1")
+    assert "t1" not in saver.storage
+
+
+def test_checking_unknown_thread_does_not_create_entries():
+    saver = BoundedMemorySaver()
+    graph = _echo_graph(saver)
+
+    assert not _has_state(graph, "missing")
+    assert "missing" not in saver.storage
+
+
+def test_trim_cuts_at_human_message():
+    messages = [HumanMessage(content="q1", id="1"),
+                AIMessage(content="", id="2", tool_calls=[{"name": "t", "args": {}, "id": "c1"}]),
+                ToolMessage(content="r", tool_call_id="c1", id="3"),
+                AIMessage(content="a1", id="4"),
+                HumanMessage(content="q2", id="5"),
+                AIMessage(content="a2", id="6")]
+
+    removals = trim_state_messages(messages, max_messages=3)
+
+    # Cắt sau ToolMessage sẽ để lại tool result mồ côi nên lùi tới câu hỏi kế tiếp
+    assert [r.id for r in removals] == ["1", "2", "3", "4"]
+    assert trim_state_messages(messages, max_messages=10) == []
+
+
+def test_turns_of_same_thread_are_serialized():
+    from agent.supervisor_agent import ReActGraph
+
+    agent = ReActGraph(checkpointer=BoundedMemorySaver())
+    events = []
+
+    async def turn(thread_id: str, name: str):
+        async with agent.thread_lock(thread_id):
+            events.append(f"start {name}")
+            await asyncio.sleep(0.01)
+            events.append(f"end {name}")
+
+    async def main():
+        await asyncio.gather(turn("t1", "a"), turn("t1", "b"), turn("t2", "c"))
+
+    asyncio.run(main())
+
+    assert events.index("end a") < events.index("start b")
+    # Conversation khác không phải đợi
+    assert events.index("start c") < events.index("end a")
@@ -0,0 +1,69 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.contextualizer import QueryContextualizer
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def _history(*contents):
+    return [(HumanMessage if i % 2 == 0 else AIMessage)(content=c) for i, c in enumerate(contents)]
+
+
+@pytest.mark.parametrize("messages, expected", [
+    ([], (False, "empty")),
+    (_history("Quy định thi lại?"), (False, "no_history")),
+    (_history("Xin chào", "Chào bạn", "Còn học phí?"), (False, "after_greeting")),
+    (_history("Quy định thi lại?", "Được thi lại một lần.", "Còn môn đó thì sao?"), (True, "follow_up_marker")),
+    (_history("Quy định thi lại?", "Được thi lại một lần.", "What about it?"), (True, "follow_up_marker")),
+    (_history("Quy định thi lại?", "Được thi lại một lần.", "Điểm CT060101 kỳ 1"), (False, "student_code")),
+    (_history("Quy định thi lại?", "Được thi lại một lần.", "Điều kiện xét học bổng khuyến khích học tập là gì"),
+     (False, "long_query")),
+    (_history("Quy định thi lại?", "Được thi lại một lần.", "Học phí?"), (True, "short_query")),
+])
+def test_needs_contextualization(messages, expected):
+    assert QueryContextualizer().needs_contextualization(messages) == expected
+
+
+HEADER = "My student code is CT060101"
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("điểm kỳ 2?", (True, "short_query")),
+    ("và môn Toán?", (True, "follow_up_marker")),
+    ("Còn môn đó thì sao?", (True, "follow_up_marker")),
+    ("Điểm CT060102 kỳ 1", (False, "student_code")),
+    ("Điều kiện xét học bổng khuyến khích học tập là gì", (False, "long_query")),
+])
+def test_student_code_header_does_not_decide_for_the_question(question, expected):
+    # Backend ghép mã sinh viên đã lưu liền trước mọi câu hỏi
+    messages = _history(HEADER + "Điểm kỳ 1 2024-2025 của tôi", "Toán: 8.5", HEADER + question)
+    assert QueryContextualizer().needs_contextualization(messages) == expected
+
+
+def test_greeting_with_student_code_header_is_still_a_greeting():
+    messages = _history(HEADER + "Xin chào", "Chào bạn", HEADER + "Học phí?")
+    assert QueryContextualizer().needs_contextualization(messages) == (False, "after_greeting")
+
+
+def test_ambiguous_query_uses_embedding_similarity():
+    history = _history("Quy định thi lại?", "Được thi lại một lần.")
+    embeddings = FakeEmbeddings({"thi lại mấy lần": [1.0, 0.0], "học bổng loại giỏi": [0.0, 1.0],
+                                 "Được thi lại một lần.": [0.9, 0.1]})
+    contextualizer = QueryContextualizer(embeddings)
+
+    assert contextualizer.needs_contextualization(history + [HumanMessage(content="thi lại mấy lần")]) == \
+        (True, "similar_to_previous")
+    assert contextualizer.needs_contextualization(history + [HumanMessage(content="học bổng loại giỏi")]) == \
+        (False, "unrelated_to_previous")
+
+
+def test_embedding_error_falls_back_to_rewrite():
+    history = _history("Quy định thi lại?", "Được thi lại một lần.", "thi lại mấy lần")
+    assert QueryContextualizer(FakeEmbeddings({})).needs_contextualization(history) == (True, "embedding_error")
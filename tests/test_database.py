@@ -0,0 +1,196 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from conftest import FakeConnection, FakePool
+from score.database import Database
+from score.queries import GPA_BY_SEMESTER, GPA_BY_SEMESTER_FROM_VIEW, GPA_VIEW_THRESHOLD, REFRESH_GPA_VIEW, REPLICA_LAG
+from score.subject_catalog import GET_ALL_SUBJECTS, GET_SUBJECTS_BY_IDS
+
+SUBJECTS = {1: {"subject_id": 1, "subject_name": "Toán", "subject_credits": 3},
+            2: {"subject_id": 2, "subject_name": "Vật lý", "subject_credits": 2}}
+
+
+def _record(student_code, subject_id, semester="ki1-2024-2025"):
+    return {"student_code": student_code, "student_name": student_code, "student_class": "CT6A",
+            "subject_id": subject_id, "semester": semester, "score_text": None, "score_first": None,
+            "score_second": None, "score_final": None, "score_over_rall": 8}
+
+
+def _catalog_connection(records, catalog, added_later=None):
+    added_later = added_later or {}
+    return FakeConnection({
+        GET_ALL_SUBJECTS: list(catalog.values()),
+        GET_SUBJECTS_BY_IDS: lambda ids: [added_later[i] for i in ids if i in added_later],
+    }, records=records)
+
+
+def _iter_groups(conn):
+    db = Database()
+
+    @asynccontextmanager
+    async def read_connection():
+        yield conn
+
+    db.read_connection = read_connection
+    resolve_calls = []
+    resolve = db.subjects.resolve
+
+    async def counting_resolve(conn, subject_ids):
+        resolve_calls.append(list(subject_ids))
+        return await resolve(conn, subject_ids)
+
+    db.subjects.resolve = counting_resolve
+
+    async def collect():
+        return [group async for group in db.iter_scores_many(student_class="CT6A")]
+
+    return asyncio.run(collect()), resolve_calls
+
+
+def test_iter_scores_many_loads_catalog_once_and_groups_by_student():
+    records = [_record("CT060101", 1), _record("CT060101", 2), _record("CT060102", 1)] + \
+              [_record("CT060103", subject_id) for subject_id in (1, 2) * 50]
+    conn = _catalog_connection(records, SUBJECTS)
+
+    groups, resolve_calls = _iter_groups(conn)
+
+    assert [g["student_code"] for g in groups] == ["CT060101", "CT060102", "CT060103"]
+    assert len(groups[2]["scores"]) == 100
+    assert conn.queries == [GET_ALL_SUBJECTS]
+    assert resolve_calls == [[]]
+
+
+def test_iter_scores_many_reads_unknown_subject_once():
+    added = {3: {"subject_id": 3, "subject_name": "Hoá", "subject_credits": 2}}
+    records = [_record("CT060101", 3), _record("CT060101", 9), _record("CT060102", 3), _record("CT060102", 9)]
+    conn = _catalog_connection(records, SUBJECTS, added_later=added)
+
+    groups, resolve_calls = _iter_groups(conn)
+
+    # Môn 3 được đọc bổ sung, môn 9 không tồn tại bị bỏ như khi JOIN; mỗi mã chỉ truy vấn một lần
+    assert [[s["subject_id"] for s in g["scores"]] for g in groups] == [[3], [3]]
+    assert conn.queries == [GET_ALL_SUBJECTS, GET_SUBJECTS_BY_IDS, GET_SUBJECTS_BY_IDS]
+    assert resolve_calls == [[], [3], [9]]
+
+
+def _replica_db(monkeypatch, count=2):
+    monkeypatch.setenv("POSTGRES_READ_URIS", ",".join(f"postgresql://reader@replica{i}/kma" for i in range(count)))
+    db = Database()
+    checked = []
+
+    async def check_replica(replica):
+        checked.append(replica.host)
+        replica.checked_at = time.monotonic()
+        replica.pool, replica.lag = replica.pool or FakePool(), 0.5
+
+    db._check_replica = check_replica
+    return db, checked
+
+
+def test_pick_replica_reads_cached_status_only(monkeypatch):
+    db, checked = _replica_db(monkeypatch)
+    first, second = db.replicas
+    for replica in db.replicas:
+        replica.pool, replica.lag, replica.checked_at = object(), 0.5, time.monotonic()
+
+    assert [db._pick_replica().host for _ in range(3)] == ["replica0", "replica1", "replica0"]
+
+    # Kết quả đo quá cũ hoặc độ trễ vượt ngưỡng: bỏ qua, không kiểm tra lại trên đường đọc
+    first.checked_at -= 3 * db.replica_check_interval + 1
+    second.lag = db.max_replica_lag + 1
+    assert db._pick_replica() is None
+    assert checked == []
+
+    second.lag = 0.5
+    db.mark_written()
+    assert db._pick_replica() is None
+
+
+def test_probe_task_refreshes_replicas_until_closed(monkeypatch):
+    db, checked = _replica_db(monkeypatch)
+    db.replica_check_interval = 0.01
+
+    async def run():
+        db._probe_task = asyncio.create_task(db._probe_replicas())
+        await asyncio.sleep(0.05)
+        await db.close()
+        probes = len(checked)
+        await asyncio.sleep(0.03)
+        return probes
+
+    probes = asyncio.run(run())
+
+    assert probes >= 4 and len(checked) == probes
+    assert db._probe_task is None
+    assert all(replica.pool is None for replica in db.replicas)
+
+
+def test_replica_without_streaming_wal_receiver_is_unusable(monkeypatch):
+    monkeypatch.setenv("POSTGRES_READ_URIS", "postgresql://reader@replica0/kma")
+    db = Database()
+    replica = db.replicas[0]
+
+    # REPLICA_LAG trả NULL khi pg_stat_wal_receiver không ở trạng thái streaming
+    conn = FakeConnection({REPLICA_LAG: None})
+    replica.pool = FakePool(conn)
+    asyncio.run(db._check_replica(replica))
+
+    assert conn.queries == [REPLICA_LAG] and "pg_stat_wal_receiver" in REPLICA_LAG
+    assert replica.lag is None and "not streaming" in replica.error
+    assert db._pick_replica() is None
+
+    conn.results[REPLICA_LAG] = 0.2
+    asyncio.run(db._check_replica(replica))
+    assert replica.error is None and db._pick_replica() is replica
+
+
+def _view_connection(comment):
+    """COMMENT của view GPA là câu COMMENT ON cuối cùng refresh_gpa_view đã chạy."""
+    conn = FakeConnection()
+    conn.results[GPA_VIEW_THRESHOLD] = lambda name: next(
+        (sql.split("'")[1] for sql in reversed(conn.executed) if sql.startswith("COMMENT ON")), comment)
+    return conn
+
+
+def _view_db(monkeypatch, conn, threshold="5.0"):
+    monkeypatch.setenv("SCORE_GPA_VIEW", "true")
+    monkeypatch.setenv("SCORE_PASS_THRESHOLD", threshold)
+    db = Database()
+
+    async def connect():
+        return FakePool(conn)
+
+    @asynccontextmanager
+    async def read_connection():
+        yield conn
+
+    db.connect, db.read_connection = connect, read_connection
+    return db
+
+
+def test_gpa_view_built_with_other_threshold_is_rebuilt(monkeypatch):
+    conn = _view_connection("pass_threshold=4.0")
+    db = _view_db(monkeypatch, conn)
+
+    assert asyncio.run(db.refresh_gpa_view())
+    assert conn.executed[0] == "DROP MATERIALIZED VIEW IF EXISTS student_semester_gpa"
+    assert any("score_over_rall >= 5.0" in sql for sql in conn.executed)
+    assert conn.executed[-1] == "COMMENT ON MATERIALIZED VIEW student_semester_gpa IS 'pass_threshold=5.0'"
+
+    rebuilt = len(conn.executed)
+    asyncio.run(db.refresh_gpa_view())
+    assert conn.executed[rebuilt:] == [REFRESH_GPA_VIEW]
+
+
+def test_stale_gpa_view_is_not_read(monkeypatch):
+    conn = _view_connection("pass_threshold=4.0")
+    db = _view_db(monkeypatch, conn)
+
+    asyncio.run(db.get_semester_aggregates("CT060101"))
+    assert conn.queries == [GPA_VIEW_THRESHOLD, GPA_BY_SEMESTER]
+
+    asyncio.run(db.refresh_gpa_view())
+    asyncio.run(db.get_semester_aggregates("CT060101"))
+    # refresh_gpa_view đọc lại COMMENT một lần, sau đó view được đọc trực tiếp
+    assert conn.queries == [GPA_VIEW_THRESHOLD, GPA_BY_SEMESTER, GPA_VIEW_THRESHOLD, GPA_BY_SEMESTER_FROM_VIEW]
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from score import encoding
+from score.encoding import (_parse_formats, dumps, encode_class_scores, encode_student_scores, expand_compact,
+                            score_table)
+
+STUDENT = {"student_code": "CT060101", "student_name": "Nguyễn Văn A", "student_class": "CT6A"}
+
+
+def _score(subject_id, name, credits, overall, semester="ki1-2024-2025", text=None):
+    # Dạng ScoreWithDetails.model_dump()
+    return {"score_text": text, "score_first": None, "score_second": None, "score_final": overall,
+            "score_over_rall": overall, "semester": semester, "student_code": STUDENT["student_code"],
+            "subject_id": subject_id,
+            "subject": {"subject_id": subject_id, "subject_name": name, "subject_credits": credits},
+            "student": STUDENT}
+
+
+SCORES = [_score(1, "Toán cao cấp", 3, 8.5, text="A"), _score(2, "Vật lý", 2, 6.0, semester="ki2-2023-2024")]
+
+
+def _flat(score):
+    return {"semester": score["semester"], "subject_id": score["subject_id"],
+            "subject_name": score["subject"]["subject_name"], "subject_credits": score["subject"]["subject_credits"],
+            "score_final": score["score_final"], "score_over_rall": score["score_over_rall"],
+            "score_text": score["score_text"]}
+
+
+def test_score_table_drops_columns_empty_in_every_row():
+    table = score_table(SCORES)
+
+    assert table["columns"] == ["semester", "subject_id", "subject_name", "subject_credits", "score_final",
+                                "score_over_rall", "score_text"]
+    assert table["rows"][1] == ["ki2-2023-2024", 2, "Vật lý", 2, 6.0, 6.0, None]
+
+
+def test_student_scores_round_trip():
+    encoded = json.loads(dumps(encode_student_scores(SCORES, "ok")))
+
+    assert encoded["student"] == STUDENT
+    assert expand_compact(encoded) == {"scores": [{**STUDENT, **_flat(score)} for score in SCORES],
+                                       "message": "ok"}
+
+
+def test_class_scores_round_trip_with_shared_columns():
+    other = {"student_code": "CT060102", "student_name": "Trần Thị B", "student_class": "CT6A"}
+    groups = [{**STUDENT, "scores": [_flat(score) for score in SCORES]},
+              {**other, "scores": [{**_flat(SCORES[0]), "score_text": None, "score_final": None}]}]
+
+    encoded = json.loads(dumps(encode_class_scores(groups, "ok")))
+    scores = expand_compact(encoded)["scores"]
+
+    assert len(encoded["students"][1]["rows"][0]) == len(encoded["columns"])
+    assert scores[:2] == [{**STUDENT, **_flat(score)} for score in SCORES]
+    assert scores[2]["student_code"] == "CT060102" and scores[2]["score_final"] is None
+
+
+def test_empty_scores_keep_only_message():
+    assert encode_student_scores([], "none") == {"message": "none"}
+    assert expand_compact({"message": "none"}) == {"message": "none"}
+
+
+def test_json_format_is_left_unchanged():
+    data = {"scores": [_flat(SCORES[0])], "message": "ok"}
+    assert expand_compact(data) is data
+
+
+def test_dumps_is_compact_and_keeps_vietnamese():
+    assert dumps({"name": "Nguyễn", "scores": [1, 2]}) == '{"name":"Nguyễn","scores":[1,2]}'
+
+
+def test_output_format_overrides(monkeypatch):
+    assert _parse_formats("get_student_scores=json, get_class_scores=COMPACT,bad=xml,=json") == {
+        "get_student_scores": "json", "get_class_scores": "compact"}
+    monkeypatch.setattr(encoding, "TOOL_FORMATS", {"get_student_scores": "json"})
+    monkeypatch.setattr(encoding, "DEFAULT_FORMAT", "yaml")
+
+    assert encoding.output_format("get_student_scores") == "json"
+    assert encoding.output_format("get_class_scores") == "compact"
+
+
+@pytest.mark.skipif(encoding.orjson is None, reason="orjson is not installed")
+def test_orjson_and_json_produce_same_output(monkeypatch):
+    data = encode_student_scores(SCORES, "ok")
+    with_orjson = dumps(data)
+    monkeypatch.setattr(encoding, "orjson", None)
+    assert dumps(data) == with_orjson
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import math
+import random
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+
+import llm.fake as fake
+from llm.fake import FakeChatModel, FakeEmbeddings, LatencyDistribution
+from llm.fake_server import create_app
+
+ANSWER = "Điểm trung bình tích lũy của bạn là 3.2 trên thang 4."
+
+
+class Confirm(BaseModel):
+    answer: str
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Ghi lại các lần chờ của FakeChatModel/FakeEmbeddings thay vì ngủ thật."""
+    recorded = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        recorded.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(fake, "asyncio", types.SimpleNamespace(sleep=sleep))
+    return recorded
+
+
+def test_latency_distribution_parses_spec_and_rejects_unknown():
+    assert LatencyDistribution("constant:0.5").sample(None) == 0.5
+    assert LatencyDistribution("normal:-5,0").sample(random.Random(0)) == 0.0
+    with pytest.raises(ValueError):
+        LatencyDistribution("poisson:1")
+
+
+def test_chat_model_is_deterministic_and_scripts_tool_calls():
+    model = FakeChatModel(responses=["a", "b", "c"], tool_calls=[{"name": "search", "args": {"q": "{query}"}}])
+    question = [HumanMessage(content="Quy định học lại?")]
+    assert model.invoke(question).content == model.invoke(question).content
+
+    def search(q: str) -> str:
+        """Search."""
+        return q
+
+    message = model.bind_tools([search]).invoke(question)
+    assert message.content == ""
+    assert message.tool_calls[0]["name"] == "search"
+    assert message.tool_calls[0]["args"] == {"q": "Quy định học lại?"}
+    assert model.with_structured_output(Confirm).invoke(question) == Confirm(answer="yes")
+
+
+def test_stream_waits_per_token_only_once(sleeps):
+    model = FakeChatModel(responses=[ANSWER], latency="constant:0.3", tokens_per_second=100)
+    question = [HumanMessage(content="GPA?")]
+
+    message = asyncio.run(model.ainvoke(question))
+    invoke_wait = sum(sleeps)
+    sleeps.clear()
+
+    async def collect():
+        return [chunk async for chunk in model.astream(question)]
+
+    chunks = asyncio.run(collect())
+    assert "".join(str(chunk.content) for chunk in chunks) == ANSWER
+    assert chunks[-1].usage_metadata == message.usage_metadata
+    # Token đầu sau latency + 1 token, sau đó mỗi token 1/tokens_per_second
+    assert sleeps[0] == pytest.approx(0.3)
+    assert all(s == pytest.approx(0.01) for s in sleeps[1:-1])
+    assert invoke_wait == pytest.approx(0.3 + message.usage_metadata["output_tokens"] * 0.01)
+    assert sum(sleeps) == pytest.approx(invoke_wait, abs=0.02)
+
+
+def test_stream_carries_tool_calls_in_last_chunk():
+    model = FakeChatModel(tool_calls=[{"name": "lookup", "args": {"code": "CT060110"}}])
+
+    def lookup(code: str) -> str:
+        """Lookup."""
+        return code
+
+    async def collect():
+        merged = None
+        async for chunk in model.bind_tools([lookup]).astream([HumanMessage(content="điểm")]):
+            merged = chunk if merged is None else merged + chunk
+        return merged
+
+    merged = asyncio.run(collect())
+    assert [(c["name"], c["args"]) for c in merged.tool_calls] == [("lookup", {"code": "CT060110"})]
+
+
+def test_embeddings_are_normalized_and_deterministic():
+    embeddings = FakeEmbeddings(dimensions=64)
+    a, b, c = embeddings.embed_documents(["điểm học phần", "điểm học phần kỳ 1", "lịch thi"])
+    assert math.isclose(sum(v * v for v in a), 1.0)
+    assert embeddings.embed_query("điểm học phần") == a
+    dot = lambda x, y: sum(p * q for p, q in zip(x, y))
+    assert dot(a, b) > dot(a, c)
+
+
+def _client(**kwargs) -> TestClient:
+    return TestClient(create_app(FakeChatModel(responses=[ANSWER], **kwargs), FakeEmbeddings(dimensions=8)))
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.iter_lines() if line]
+
+
+@pytest.mark.parametrize("route,body,field", [
+    ("/api/chat", {"messages": [{"role": "user", "content": "GPA?"}]}, lambda c: c["message"]["content"]),
+    ("/api/generate", {"prompt": "GPA?"}, lambda c: c["response"]),
+])
+def test_server_honours_stream_flag(route, body, field):
+    client = _client()
+
+    single = client.post(route, json={**body, "stream": False}).json()
+    assert single["done"] is True
+    assert field(single) == ANSWER
+
+    with client.stream("POST", route, json=body) as response:
+        chunks = _lines(response)
+    assert len(chunks) > 2
+    assert all(not c["done"] for c in chunks[:-1]) and chunks[-1]["done"]
+    assert "".join(field(c) for c in chunks) == ANSWER
+
+
+def test_server_streams_without_extra_wait(sleeps):
+    client = _client(latency="constant:0.2", tokens_per_second=50)
+
+    with client.stream("POST", "/api/generate", json={"prompt": "GPA?"}) as response:
+        chunks = _lines(response)
+
+    tokens = len(chunks) - 1
+    assert sum(sleeps) == pytest.approx(0.2 + tokens / 50)
+
+
+def test_server_returns_tool_calls_and_embeddings():
+    client = TestClient(create_app(FakeChatModel(tool_calls=[{"name": "lookup", "args": {"q": "{query}"}}]),
+                                   FakeEmbeddings(dimensions=8)))
+    body = {"messages": [{"role": "user", "content": "điểm"}], "stream": False,
+            "tools": [{"type": "function", "function": {"name": "lookup", "parameters": {}}}]}
+    assert client.post("/api/chat", json=body).json()["message"]["tool_calls"] == [
+        {"function": {"name": "lookup", "arguments": {"q": "điểm"}}}]
+
+    with client.stream("POST", "/api/chat", json={**body, "stream": True}) as response:
+        assert "tool_calls" in _lines(response)[-1]["message"]
+
+    vectors = client.post("/api/embed", json={"input": ["a", "b"]}).json()["embeddings"]
+    assert len(vectors) == 2 and len(vectors[0]) == 8
+    assert client.post("/api/embeddings", json={"prompt": "a"}).json()["embedding"] == vectors[0]
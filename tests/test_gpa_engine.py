@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+import pytest
+
+from score.gpa_engine import GPAEngine, ScoreArrays, gpa_engine
+
+
+def _record(student, score, credits, semester="ki1-2024-2025", subject_id=1, **extra):
+    return {"student_code": student, "score_over_rall": score, "subject_credits": credits, "semester": semester,
+            "subject_id": subject_id, **extra}
+
+
+def test_from_records_skips_ungraded_and_reads_nested_subjects():
+    records = [_record("A", 8.0, 3),
+               _record("A", None, 3),
+               {"score_over_rall": 7.0, "semester": "ki2-2024-2025",
+                "subject": {"subject_id": 2, "subject_name": "Vật lý", "subject_credits": 2}}]
+
+    arrays = ScoreArrays.from_records(records, groups={2: "science"}, student_code="A")
+
+    assert arrays.scores.tolist() == [8.0, 7.0]
+    assert arrays.credits.tolist() == [3.0, 2.0]
+    assert arrays.student_labels == ["A"]
+    assert arrays.group_labels == ["other", "science"]
+
+
+@pytest.mark.parametrize("score, points, letter", [
+    (3.9, 0.0, "F"), (3.95, 1.0, "D"), (5.4, 1.5, "D+"), (6.0, 2.0, "C"), (6.5, 2.5, "C+"), (7.0, 3.0, "B"),
+    (8.0, 3.5, "B+"), (8.49, 4.0, "A"),
+])
+def test_four_point_conversion_rounds_to_one_digit(score, points, letter):
+    assert gpa_engine.to_4_point(np.array([score])).tolist() == [points]
+    assert gpa_engine.to_letter(np.array([score])).tolist() == [letter]
+
+
+def test_engine_rejects_mismatched_scale():
+    with pytest.raises(ValueError):
+        GPAEngine(thresholds=(4.0,), points=(0.0,), letters=("F",))
+
+
+def test_summarize_weights_by_credits_per_semester_and_group():
+    arrays = ScoreArrays.from_records([
+        _record("A", 8.0, 3, group="math"),
+        _record("A", 3.0, 1, semester="ki2-2024-2025", subject_id=2, group="math"),
+        _record("A", 9.0, 2, semester="ki2-2024-2025", subject_id=3, group="science"),
+    ])
+
+    summary = gpa_engine.summarize(arrays)
+
+    assert summary["overall"] == {"gpa_10": 7.5, "gpa_4": 3.08, "credits": 6, "credits_passed": 5,
+                                  "credits_failed": 1}
+    assert [(s["semester"], s["gpa_10"]) for s in summary["semesters"]] == [("ki1-2024-2025", 8.0),
+                                                                            ("ki2-2024-2025", 7.0)]
+    assert [(g["group"], g["gpa_10"]) for g in summary["groups"]] == [("math", 6.75), ("science", 9.0)]
+    assert gpa_engine.summarize(ScoreArrays.from_records([])) == {"overall": None, "semesters": [], "groups": []}
+
+
+def test_class_report_ranks_and_classifies_students():
+    arrays = ScoreArrays.from_records([_record("A", 8.0, 3), _record("B", 9.0, 2), _record("C", 5.0, 2)])
+
+    report = gpa_engine.class_report(arrays)
+
+    assert [(s["student_code"], s["rank"], s["classification"]) for s in report["students"]] == [
+        ("A", 2, "gioi"), ("B", 1, "xuat_sac"), ("C", 3, "yeu")]
+    assert report["statistics"]["median_gpa_10"] == 8.0
+    assert report["statistics"]["classifications"] == {"yeu": 1, "trung_binh": 0, "kha": 0, "gioi": 1,
+                                                       "xuat_sac": 1}
+
+
+def test_class_report_excludes_students_without_credits():
+    arrays = ScoreArrays.from_records([_record("A", 8.0, 3), _record("B", 9.0, 0), _record("C", 3.9, 2)])
+
+    report = gpa_engine.class_report(arrays)
+    students = {s["student_code"]: s for s in report["students"]}
+    statistics = report["statistics"]
+
+    assert students["B"] == {"student_code": "B", "gpa_10": None, "gpa_4": None, "credits": 0, "credits_passed": 0,
+                             "classification": None, "rank": None}
+    assert (students["A"]["rank"], students["C"]["rank"]) == (1, 2)
+    assert statistics["graded_students"] == 2
+    assert statistics["mean_gpa_10"] == 5.95 and statistics["mean_gpa_4"] == 1.75
+    assert statistics["classifications"]["xuat_sac"] == 0
+    assert statistics["pass_rate"] == 0.6
+    # Response của admin API phải serialize được
+    json.dumps(report, allow_nan=False)
+
+
+def test_class_report_without_any_credits_has_empty_statistics():
+    report = gpa_engine.class_report(ScoreArrays.from_records([_record("B", 9.0, 0)]))
+
+    assert report["students"][0]["classification"] is None
+    assert report["statistics"]["mean_gpa_10"] is None and report["statistics"]["pass_rate"] is None
+    json.dumps(report, allow_nan=False)
+    assert gpa_engine.class_report(ScoreArrays.from_records([])) == {"students": [], "statistics": {}}
+
+
+def test_what_if_projects_planned_subjects_and_required_average():
+    arrays = ScoreArrays.from_records([_record("A", 7.0, 10)])
+
+    result = gpa_engine.what_if(arrays, planned=[{"credits": 10, "score": 9.0}], target_gpa_10=8.5)
+
+    assert result["current"] == {"gpa_10": 7.0, "gpa_4": 3.0, "credits": 10}
+    assert result["projected"] == {"gpa_10": 8.0, "gpa_4": 3.5, "credits": 20}
+    assert result["required_average_10"] == 10.0
+    assert gpa_engine.what_if(ScoreArrays.from_records([]))["current"]["gpa_10"] is None
@@ -0,0 +1,58 @@
+import pytest
+
+from score.gpa_tool import semester_sort_key, summarize_gpa
+
+
+def _row(semester, weighted_sum, credits, credits_passed=None, credits_failed=0):
+    return {"semester": semester, "weighted_sum": weighted_sum, "credits": credits,
+            "credits_passed": credits if credits_passed is None else credits_passed,
+            "credits_failed": credits_failed, "subjects": 1}
+
+
+AGGREGATES = [
+    _row("ki1-2024-2025", 24.0, 3),                    # 8.0
+    _row("ki1-2023-2024", 35.0, 5, 3, 2),             # 7.0
+    _row("ki2-2023-2024", 18.0, 2),                    # 9.0
+]
+
+
+def test_semester_sort_key_orders_by_school_year_then_term():
+    semesters = ["ki1-2024-2025", "ki2-2023-2024", "k1-2023-2024", "unknown"]
+    assert sorted(semesters, key=semester_sort_key) == ["unknown", "k1-2023-2024", "ki2-2023-2024", "ki1-2024-2025"]
+
+
+def test_summarize_gpa_weights_by_credits():
+    summary = summarize_gpa(AGGREGATES)
+
+    assert [s["semester"] for s in summary["semesters"]] == ["ki1-2023-2024", "ki2-2023-2024", "ki1-2024-2025"]
+    assert [s["gpa"] for s in summary["semesters"]] == [7.0, 9.0, 8.0]
+    assert summary["cumulative"] == {"gpa": 7.7, "credits": 10, "credits_passed": 8, "credits_failed": 2}
+
+
+def test_semester_limits_cumulative_gpa_to_that_semester():
+    summary = summarize_gpa(AGGREGATES, semester="ki2-2023-2024")
+
+    assert [s["semester"] for s in summary["semesters"]] == ["ki2-2023-2024"]
+    # Tích luỹ gồm ki1 và ki2 của 2023-2024, chưa gồm ki1-2024-2025
+    assert summary["cumulative"]["gpa"] == pytest.approx(53.0 / 7, abs=0.01)
+    assert summary["cumulative"]["credits"] == 7
+
+
+def test_semester_without_scores_returns_no_semesters():
+    assert summarize_gpa(AGGREGATES, semester="ki1-2022-2023")["semesters"] == []
+
+
+def test_zero_credits_give_no_gpa():
+    summary = summarize_gpa([_row("ki1-2024-2025", 0.0, 0)])
+
+    assert summary["semesters"][0]["gpa"] is None
+    assert summary["cumulative"]["gpa"] is None
+    assert summarize_gpa([])["cumulative"] == {"gpa": None, "credits": 0, "credits_passed": 0, "credits_failed": 0}
+
+
+def test_short_semester_form_matches_stored_semester():
+    short = summarize_gpa(AGGREGATES, semester="k2-2023-2024")
+
+    assert short == summarize_gpa(AGGREGATES, semester="ki2-2023-2024")
+    assert [s["semester"] for s in short["semesters"]] == ["ki2-2023-2024"]
+    assert short["cumulative"]["credits"] == 7
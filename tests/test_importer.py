@@ -0,0 +1,130 @@
+import asyncio
+import importlib
+
+import pytest
+
+from conftest import FakeConnection, FakePool
+from score.importer import (COUNT_STAGING_KEYS, REJECT_UNKNOWN_REFERENCES, UPSERT_SCORES, UPSERT_SUBJECTS,
+                            ImportFileError, ImportResult, ScoreImporter, read_score_rows)
+
+importer_module = importlib.import_module("score.importer")
+
+HEADER = "Student Code,Student Name,Subject ID,Subject Name,Subject Credits,Semester,Score Over Rall\n"
+
+
+def _write(tmp_path, content, name="scores.csv"):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_read_score_rows_normalizes_values(tmp_path):
+    path = _write(tmp_path, HEADER + " ct060101 ,Nguyễn Văn A,7,Toán,3,KI1-2024-2025,\"8,5\"\n")
+    result = ImportResult()
+
+    rows = list(read_score_rows(path, result))
+
+    assert rows == [(2, "CT060101", "Nguyễn Văn A", None, 7, "Toán", 3, "ki1-2024-2025", None,
+                     None, None, None, 8.5)]
+    assert (result.rows_read, result.rows_rejected) == (1, 0)
+
+
+def test_read_score_rows_rejects_invalid_rows(tmp_path):
+    path = _write(tmp_path, HEADER
+                  + ",Nguyễn Văn A,7,Toán,3,ki1-2024-2025,8\n"
+                  + "CT060101,Nguyễn Văn A,,Toán,3,ki1-2024-2025,8\n"
+                  + "CT060101,Nguyễn Văn A,7,Toán,3,2024,8\n"
+                  + ",,,,,,\n"
+                  + "CT060101,Nguyễn Văn A,7,Toán,3,ki1-2024-2025,abc\n"
+                  + "CT060102,Trần Thị B,7,Toán,3,ki1-2024-2025,9\n")
+    result = ImportResult()
+
+    rows = list(read_score_rows(path, result))
+
+    assert [row[0] for row in rows] == [7]
+    assert result.rows_read == 5 and result.rows_rejected == 4
+    assert [(e["row"], e["error"]) for e in result.errors[:3]] == [
+        (2, "student_code is empty"), (3, "subject_id is empty"), (4, "invalid semester '2024'")]
+    assert result.errors[3]["row"] == 6
+
+
+def test_read_score_rows_keeps_at_most_max_errors(tmp_path):
+    path = _write(tmp_path, HEADER + "CT060101,,1,,,bad,1\n" * 5)
+    result = ImportResult()
+
+    assert list(read_score_rows(path, result, max_errors=2)) == []
+    assert result.rows_rejected == 5 and len(result.errors) == 2
+
+
+def test_read_score_rows_requires_columns_and_known_type(tmp_path):
+    with pytest.raises(ImportFileError, match="subject_id"):
+        list(read_score_rows(_write(tmp_path, "student_code,semester\n"), ImportResult()))
+    with pytest.raises(ImportFileError, match="Unsupported"):
+        list(read_score_rows(_write(tmp_path, HEADER, "scores.txt"), ImportResult()))
+
+
+def test_read_score_rows_from_xlsx(tmp_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    workbook.active.append(["student_code", "subject_id", "semester", "score_over_rall"])
+    workbook.active.append(["CT060101", 7, "ki2-2024-2025", 9])
+    path = tmp_path / "scores.xlsx"
+    workbook.save(path)
+
+    rows = list(read_score_rows(path, ImportResult()))
+
+    assert rows[0][1] == "CT060101" and rows[0][4] == 7 and rows[0][-1] == 9.0
+
+
+class FakeCatalog:
+    def invalidate(self):
+        pass
+
+
+class FakeDatabase:
+    maintenance_timeout = 1.0
+
+    def __init__(self, conn):
+        self.pool = FakePool(conn)
+        self.subjects = FakeCatalog()
+
+    async def connect(self):
+        return self.pool
+
+    def mark_written(self):
+        pass
+
+    async def refresh_gpa_view(self):
+        return False
+
+
+def test_import_reports_unknown_references_and_counts_distinct_keys(tmp_path, monkeypatch):
+    async def upgrade_connection(conn, timeout=None):
+        return []
+
+    monkeypatch.setattr(importer_module, "upgrade_connection", upgrade_connection)
+    path = _write(tmp_path, HEADER
+                  + "CT060101,Nguyễn Văn A,7,Toán,3,ki1-2024-2025,8\n"
+                  + "CT060101,Nguyễn Văn A,7,Toán,3,ki1-2024-2025,8.5\n"
+                  + "CT060102,Trần Thị B,7,Toán,3,ki1-2024-2025,9\n"
+                  + "CT069999,,7,,,ki1-2024-2025,5\n"
+                  + "CT060101,Nguyễn Văn A,99,,,ki1-2024-2025,5\n")
+    conn = FakeConnection({
+        REJECT_UNKNOWN_REFERENCES: [
+            {"row_no": 6, "student_code": "CT060101", "subject_id": 99, "student_exists": True},
+            {"row_no": 5, "student_code": "CT069999", "subject_id": 7, "student_exists": False}],
+        # Hai dòng đầu cùng khoá: còn 2 khoá sau khi loại dòng 5, 6
+        COUNT_STAGING_KEYS: {"score_keys": 2, "students": 2},
+        UPSERT_SCORES: [{"inserted": True}],
+        UPSERT_SUBJECTS: "INSERT 0 0",
+    })
+
+    result = asyncio.run(ScoreImporter(FakeDatabase(conn)).import_file(path))
+
+    assert len(conn.copied) == 5
+    assert (result.rows_read, result.rows_rejected) == (5, 2)
+    assert (result.inserted, result.updated, result.unchanged, result.students) == (1, 0, 1, 2)
+    assert result.errors == [
+        {"row": 5, "error": "student CT069999 is not in the database and has no student_name"},
+        {"row": 6, "error": "subject 99 is not in the database and has no subject_name"}]
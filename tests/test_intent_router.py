@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+
+from agent.intent_router import Intent, IntentRouter, may_need_regulations
+
+
+def _history(*contents):
+    return [(HumanMessage if i % 2 == 0 else AIMessage)(content=c) for i, c in enumerate(contents)]
+
+
+@pytest.mark.parametrize("query, name, args", [
+    ("My student code is CT060101Cho tôi xem điểm kỳ 1 2024-2025", "scores",
+     {"student_code": "CT060101", "semester": "ki1-2024-2025"}),
+    ("Điểm trung bình tích lũy của ct060101", "gpa", {"student_code": "CT060101", "semester": None}),
+    ("Thông tin sinh viên CT060101", "student_info", {"student_code": "CT060101"}),
+    ("Quy định về học phí năm nay như thế nào?", "regulation",
+     {"query": "Quy định về học phí năm nay như thế nào?"}),
+    ("Xin chào bạn", "agent", {}),
+    ("Điểm và thông tin sinh viên CT060101", "agent", {}),
+    ("Quy định về điểm thi lại", "agent", {}),
+])
+def test_classify(query, name, args):
+    intent = IntentRouter().classify([HumanMessage(content=query)])
+    assert (intent.name, intent.args) == (name, args)
+
+
+def test_follow_up_goes_through_agent():
+    messages = _history("Điểm của CT060101", "Điểm của bạn là ...", "Còn kỳ đó thì sao?")
+    assert IntentRouter().classify(messages).reason == "needs_context:follow_up_marker"
+
+
+def test_may_need_regulations():
+    assert may_need_regulations("Quy định thi lại")
+    assert may_need_regulations("Quy chế thi của sinh viên CT060101")
+    assert not may_need_regulations("Cho tôi xem điểm của CT060101")
+
+
+def _scores_tool(result: str):
+    async def get_student_scores(student_code: str, semester: str = None) -> str:
+        return result.format(student_code=student_code)
+    return StructuredTool.from_function(coroutine=get_student_scores, description="scores")
+
+
+def _rag_tool(answer: str):
+    async def search_kma_regulations(query: str) -> str:
+        return answer
+    return StructuredTool.from_function(coroutine=search_kma_regulations, description="rag")
+
+
+def test_dispatch_scores_returns_tool_call_pair():
+    tools = {"get_student_scores": _scores_tool("scores of {student_code}")}
+    intent = Intent("scores", "score_keywords", {"student_code": "CT060101", "semester": None})
+
+    tool_call, result = asyncio.run(IntentRouter().dispatch(intent, tools))
+
+    assert tool_call.tool_calls[0]["args"] == {"student_code": "CT060101"}
+    assert isinstance(result, ToolMessage) and result.content == "scores of CT060101"
+    assert result.tool_call_id == tool_call.tool_calls[0]["id"]
+
+
+def test_dispatch_regulation_returns_final_answer_unless_rag_fails():
+    intent = Intent("regulation", "regulation_keywords", {"query": "Quy định thi lại"})
+    ok = {"search_kma_regulations": _rag_tool("Được thi lại một lần.")}
+    failing = {"search_kma_regulations": _rag_tool("Error searching KMA regulations")}
+
+    assert [type(m) for m in asyncio.run(IntentRouter().dispatch(intent, ok))] == [AIMessage]
+    assert isinstance(asyncio.run(IntentRouter().dispatch(intent, failing))[-1], ToolMessage)
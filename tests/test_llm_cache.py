@@ -0,0 +1,71 @@
+from langchain_core.load import dumps
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.outputs import Generation
+
+from llm.cache import TieredLLMCache, make_cache_key, normalize_prompt
+
+LLM = "gemini-2.0-flash temperature=0"
+
+
+def test_normalize_collapses_whitespace_but_keeps_literal_backslashes():
+    assert normalize_prompt("  Điểm\n\n của tôi\t? ") == "Điểm của tôi ?"
+    # "\\n" do người dùng gõ là nội dung, không phải xuống dòng
+    assert normalize_prompt("print('a\\nb')") != normalize_prompt("print('a b')")
+
+
+def test_normalize_unifies_unicode_forms():
+    decomposed = "Đie\u0302\u0309m"  # "Điểm" viết bằng dấu tổ hợp (NFD)
+    assert normalize_prompt(decomposed) == normalize_prompt("Điểm")
+
+
+def test_key_depends_on_model_parameters_but_not_formatting():
+    assert make_cache_key("a  b", LLM) == make_cache_key("a\nb", LLM)
+    assert make_cache_key("a b", LLM) != make_cache_key("a b", LLM + " top_p=1")
+    assert make_cache_key("a b", LLM) != make_cache_key("a c", LLM)
+
+
+def test_lookup_hits_for_equivalent_prompt_and_returns_copies():
+    cache = TieredLLMCache(max_size=4)
+    cache.update("Câu hỏi:\n  điểm", LLM, [Generation(text="answer")])
+    first = cache.lookup("Câu hỏi: điểm", LLM)
+    assert [g.text for g in first] == ["answer"]
+    first[0].text = "changed"
+    assert cache.lookup("Câu hỏi: điểm", LLM)[0].text == "answer"
+    assert cache.lookup("Câu hỏi khác", LLM) is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["writes"]) == (2, 1, 1)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = TieredLLMCache(max_size=2)
+    for prompt in ("a", "b"):
+        cache.update(prompt, LLM, [Generation(text=prompt)])
+    cache.lookup("a", LLM)
+    cache.update("c", LLM, [Generation(text="c")])
+    assert cache.lookup("b", LLM) is None
+    assert cache.lookup("a", LLM)[0].text == "a"
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    TieredLLMCache(sqlite_path=path).update("a", LLM, [Generation(text="from disk")])
+    cache = TieredLLMCache(sqlite_path=path)
+    assert cache.lookup("a", LLM)[0].text == "from disk"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def _chat_prompt(question: str) -> str:
+    # Chat model của LangChain gọi cache với prompt = dumps(messages), JSON đã escape non-ASCII
+    return dumps([SystemMessage(content="Bạn là KBot.\nTrả lời ngắn gọn."), HumanMessage(content=question)])
+
+
+def test_chat_prompt_is_normalized_inside_the_serialized_messages():
+    nfc, nfd = "Điểm  của tôi", "Đie\u0302\u0309m\ncủa tôi"
+    assert "\\u" in _chat_prompt(nfc)
+    cache = TieredLLMCache(max_size=4)
+
+    cache.update(_chat_prompt(nfc), LLM, [Generation(text="8.5")])
+
+    assert cache.lookup(_chat_prompt(nfd), LLM)[0].text == "8.5"
+    assert cache.lookup(_chat_prompt("Điểm của\\n tôi"), LLM) is None
+    assert cache.lookup(_chat_prompt("Điểm của bạn"), LLM) is None
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph.message import add_messages
+
+import backend.memory as memory
+from agent.checkpoint import SUMMARY_MESSAGE_ID, trim_state_messages
+from backend.memory import ConversationMemory
+
+CONVERSATION_ID = ObjectId()
+START = datetime(2025, 1, 1)
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents = sorted(self.documents, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.documents:
+                yield document
+        return iterate()
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def _matches(self, document, query):
+        for field, condition in query.items():
+            if isinstance(condition, dict):
+                if not document[field] > condition["$gt"]:
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None):
+        return next((doc for doc in self.documents if self._matches(doc, query)), None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([doc for doc in self.documents if self._matches(doc, query)])
+
+    async def update_one(self, query, update):
+        document = await self.find_one(query)
+        document.update(update["$set"])
+
+
+class FakeDB:
+    def __init__(self, turns: int):
+        self.conversations = FakeCollection([{"_id": CONVERSATION_ID}])
+        self.messages = FakeCollection([
+            {"conversation_id": CONVERSATION_ID, "content": f"{'q' if i % 2 == 0 else 'a'}{i // 2}",
+             "is_user": i % 2 == 0, "created_at": START + timedelta(minutes=i)} for i in range(turns * 2)])
+
+
+class RecordingLLM:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return AIMessage(content=self.response)
+
+
+def test_old_turns_are_folded_into_summary_and_reloaded(monkeypatch):
+    llm = RecordingLLM("Sinh viên CT060101 hỏi về điểm kỳ 1.")
+    monkeypatch.setattr(memory, "get_gemini_llm", lambda: llm)
+    db = FakeDB(turns=10)
+    conversation_memory = ConversationMemory(max_turns=6)
+
+    asyncio.run(conversation_memory.update_summary(db, CONVERSATION_ID))
+    history = asyncio.run(conversation_memory.load(db, CONVERSATION_ID))
+
+    # 4 lượt cũ nhất được gộp, 6 lượt gần nhất giữ nguyên văn
+    prompt = llm.prompts[0]
+    assert "[user] q0" in prompt and "[bot] a3" in prompt and "q4" not in prompt
+    assert history[0].id == SUMMARY_MESSAGE_ID
+    assert history[0].content.endswith("Sinh viên CT060101 hỏi về điểm kỳ 1.")
+    assert [m.content for m in history[1:]][:2] == ["q4", "a4"] and len(history) == 13
+
+
+def test_trimmed_state_keeps_summary_and_newer_summary_replaces_it():
+    summary = ConversationMemory.summary_message("cũ")
+    turns = [message for i in range(5) for message in (HumanMessage(content=f"q{i}", id=f"q{i}"),
+                                                       AIMessage(content=f"a{i}", id=f"a{i}"))]
+    state = add_messages([], [summary] + turns)
+
+    state = add_messages(state, trim_state_messages(state, max_messages=4))
+
+    assert [m.id for m in state] == [SUMMARY_MESSAGE_ID, "q3", "a3", "q4", "a4"]
+    # Lượt tiếp theo của thread đã có checkpoint: bản tóm tắt mới ghi đè tại chỗ
+    state = add_messages(state, [ConversationMemory.summary_message("mới"), HumanMessage(content="q5", id="q5")])
+    assert [m.id for m in state] == [SUMMARY_MESSAGE_ID, "q3", "a3", "q4", "a4", "q5"]
+    assert state[0].content.endswith("mới")
+
+
+def test_load_summary_returns_none_without_summary():
+    db = FakeDB(turns=1)
+    assert asyncio.run(ConversationMemory().load_summary(db, CONVERSATION_ID)) is None
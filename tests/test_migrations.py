@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from conftest import FakeConnection
+from score.migrations import DUPLICATE_SCORE_KEYS, INDEX_IS_VALID, MigrationError, upgrade_connection
+
+APPLIED_VERSIONS = "SELECT version, applied_at FROM schema_migrations"
+RECORD_VERSION = "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)"
+
+
+def _connection(applied=(), duplicates=(), index_valid=None):
+    """schema_migrations nằm trong `conn.applied`; pg_index và truy vấn kiểm tra trả về dữ liệu cho trước."""
+    conn = FakeConnection()
+    conn.applied = list(applied)
+    conn.results = {
+        APPLIED_VERSIONS: lambda: [{"version": version, "applied_at": None} for version in conn.applied],
+        RECORD_VERSION: lambda version, name: conn.applied.append(version),
+        DUPLICATE_SCORE_KEYS: list(duplicates),
+        INDEX_IS_VALID: lambda name: (index_valid or {}).get(name),
+    }
+    return conn
+
+
+def _ddl(conn):
+    return [s for s in conn.executed if s.startswith(("CREATE", "DROP"))
+            and "schema_migrations" not in s]
+
+
+def test_upgrade_applies_pending_migrations_in_order():
+    conn = _connection()
+
+    assert asyncio.run(upgrade_connection(conn)) == [1, 2]
+    assert not any("covering_idx" in s for s in conn.executed)
+    assert asyncio.run(upgrade_connection(conn)) == []
+
+
+def test_duplicate_score_keys_block_unique_index():
+    conn = _connection(applied=[1], duplicates=[
+        {"student_code": "CT060101", "subject_id": 7, "semester": "ki1-2024-2025", "copies": 2}])
+
+    with pytest.raises(MigrationError, match="student_code=CT060101, subject_id=7"):
+        asyncio.run(upgrade_connection(conn))
+
+    assert _ddl(conn) == []
+    assert conn.applied == [1]
+    # Advisory lock vẫn được trả
+    assert conn.executed[-1] == "SELECT pg_advisory_unlock($1)"
+
+
+def test_invalid_index_is_dropped_and_rebuilt():
+    conn = _connection(applied=[1], index_valid={"scores_semester_idx": False, "scores_student_semester_idx": True})
+
+    asyncio.run(upgrade_connection(conn, target=2))
+
+    ddl = _ddl(conn)
+    drop = ddl.index("DROP INDEX CONCURRENTLY IF EXISTS scores_semester_idx")
+    assert ddl[drop + 1] == "CREATE INDEX CONCURRENTLY IF NOT EXISTS scores_semester_idx ON scores (semester)"
+    assert sum(s.startswith("DROP") for s in ddl) == 1
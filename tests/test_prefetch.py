@@ -0,0 +1,160 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.retrievers import BaseRetriever
+
+import agent.supervisor_agent as supervisor_agent
+from agent.runtime import AgentRuntime
+from llm.fake import FakeChatModel
+from rag.prefetch import RetrievalPrefetcher, SpeculativeRAG, prefetch_key, speculation_stats
+from telemetry import recorder
+
+
+class RecordingRetriever(BaseRetriever):
+    queries: List[str] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        self.queries.append(query)
+        return [Document(page_content=f"doc for {query}")]
+
+
+class RecordingRuntime:
+    def __init__(self):
+        self.prefetched = []
+
+    def prefetch(self, query: str) -> None:
+        self.prefetched.append(query)
+
+
+@pytest.fixture(autouse=True)
+def reset_recorder():
+    recorder.reset()
+    yield
+    recorder.reset()
+
+
+def test_prefetch_key_folds_diacritics_and_punctuation():
+    assert prefetch_key("  Quy định  thi lại?") == prefetch_key("quy dinh thi lai")
+
+
+def test_take_returns_prefetched_documents_for_same_query():
+    retriever = RecordingRetriever(queries=[])
+    prefetcher = RetrievalPrefetcher(retriever)
+    prefetcher.submit("Quy định thi lại của học viện")
+
+    docs = prefetcher.take("quy dinh thi lai cua hoc vien?", timeout=5)
+
+    assert docs is not None and docs[0].page_content.startswith("doc for")
+    assert len(retriever.queries) == 1
+    # Kết quả chỉ dùng một lần
+    assert prefetcher.take("quy dinh thi lai cua hoc vien", timeout=5) is None
+
+
+def test_take_does_not_reuse_documents_of_a_different_question():
+    prefetcher = RetrievalPrefetcher(RecordingRetriever(queries=[]))
+    prefetcher.submit("Điều kiện thi lại là gì?")
+
+    assert prefetcher.take("Điều kiện học lại là gì?", timeout=5) is None
+    assert prefetcher.take("Quy định thi lại của học viện KMA", timeout=5) is None
+
+
+def _speculative_rag():
+    runs = []
+
+    def run(query, cancel_event):
+        runs.append(query)
+        return f"answer to {query}"
+
+    return SpeculativeRAG(run), runs
+
+
+def test_speculative_answer_is_claimed_only_for_same_question_and_scope():
+    speculative, _ = _speculative_rag()
+    speculative.start("Điều kiện thi lại là gì?", scope="request-1")
+
+    assert speculative.claim("Điều kiện học lại là gì?", scope="request-1") is None
+    assert speculative.claim("Điều kiện thi lại là gì?", scope="request-2") is None
+    future = speculative.claim("dieu kien thi lai la gi", scope="request-1")
+    assert future.result(timeout=5) == "answer to Điều kiện thi lại là gì?"
+    assert speculative.claim("Điều kiện thi lại là gì?", scope="request-1") is None
+
+
+def test_resolve_keeps_speculation_only_when_agent_asks_the_same_question(monkeypatch):
+    monkeypatch.setenv("RAG_SPECULATIVE_MODE", "answer")
+    speculative, _ = _speculative_rag()
+    runtime = AgentRuntime.__new__(AgentRuntime)
+    runtime.rag_tool = SimpleNamespace(name="search_kma_regulations")
+    runtime._rag_agent, runtime._speculative_rag = SimpleNamespace(chat=None), speculative
+
+    def tool_call(query):
+        return AIMessage(content="", tool_calls=[{"name": "search_kma_regulations", "args": {"query": query},
+                                                  "id": "call-1"}])
+
+    assert runtime.speculate("Điều kiện thi lại là gì?", scope=None) is None
+    speculation = runtime.speculate("Điều kiện thi lại là gì?", scope="request-1")
+    runtime.resolve_speculation(speculation, tool_call("Điều kiện học lại là gì?"))
+    assert runtime.claim_speculation("Điều kiện thi lại là gì?", "request-1") is None
+
+    speculation = runtime.speculate("Điều kiện thi lại là gì?", scope="request-1")
+    runtime.resolve_speculation(speculation, tool_call("Điều kiện thi lại là gì"))
+    assert runtime.claim_speculation("Điều kiện thi lại là gì?", "request-1") is not None
+
+
+def test_take_misses_unrelated_query_and_discard_drops_entry():
+    prefetcher = RetrievalPrefetcher(RecordingRetriever(queries=[]))
+    prefetcher.submit("Quy định thi lại")
+
+    assert prefetcher.take("học phí ngành an toàn thông tin") is None
+    prefetcher.discard("quy dinh thi lai")
+    assert prefetcher.take("Quy định thi lại") is None
+
+
+def test_expired_prefetch_is_not_used():
+    prefetcher = RetrievalPrefetcher(RecordingRetriever(queries=[]), ttl_seconds=0)
+    prefetcher.submit("Quy định thi lại")
+    assert prefetcher.take("Quy định thi lại") is None
+
+
+def test_speculation_stats_reports_hit_rate():
+    prefetcher = RetrievalPrefetcher(RecordingRetriever(queries=[]))
+    prefetcher.submit("Quy định thi lại")
+    prefetcher.submit("Điều kiện tốt nghiệp")
+    prefetcher.take("quy dinh thi lai", timeout=5)
+
+    stats = speculation_stats(recorder.summary()["counters"])
+
+    assert stats["prefetch"] == {"started": 2, "hits": 1, "hit_rate": 0.5}
+    assert stats["speculative"] == {"started": 0, "hits": 0, "hit_rate": 0.0}
+
+
+def _summarize(messages, monkeypatch, rewritten: str = "unused"):
+    runtime = RecordingRuntime()
+    monkeypatch.setattr(supervisor_agent, "runtime_from_config", lambda config: runtime)
+    monkeypatch.setattr(supervisor_agent, "get_gemini_llm", lambda **kwargs: FakeChatModel(responses=[rewritten]))
+    result = asyncio.run(supervisor_agent.summarize_conversation({"messages": messages}, {}))
+    return result, runtime.prefetched
+
+
+def test_pass_through_query_is_prefetched(monkeypatch):
+    _, prefetched = _summarize([HumanMessage(content="Quy định về thi lại như thế nào?")], monkeypatch)
+    assert prefetched == ["Quy định về thi lại như thế nào?"]
+
+
+def test_student_lookup_is_not_prefetched(monkeypatch):
+    _, prefetched = _summarize([HumanMessage(content="Cho tôi xem điểm của sinh viên CT060101")], monkeypatch)
+    assert prefetched == []
+
+
+def test_rewritten_query_is_prefetched_instead_of_raw_question(monkeypatch):
+    messages = [HumanMessage(content="Quy định về thi lại như thế nào?", id="1"),
+                AIMessage(content="Sinh viên được thi lại một lần.", id="2"),
+                HumanMessage(content="Còn học phí thì sao?", id="3")]
+
+    result, prefetched = _summarize(messages, monkeypatch, rewritten="Học phí thi lại là bao nhiêu?")
+
+    assert result["messages"][0].content == "Học phí thi lại là bao nhiêu?"
+    assert prefetched == ["Học phí thi lại là bao nhiêu?"]
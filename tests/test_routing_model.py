@@ -0,0 +1,157 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.outputs import ChatResult
+
+import llm.routing_model as routing_model
+from llm.fake import FakeChatModel
+from llm.routing_model import LatencyTracker, RoutingChatModel
+
+
+class FailingChatModel(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "failing"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        raise ConnectionError("provider down")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        raise ConnectionError("provider down")
+
+
+class BlockingChatModel(BaseChatModel):
+    release: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "blocking"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[Any] = None, **kwargs) -> ChatResult:
+        self.release.wait(5)
+        raise ConnectionError("provider hung")
+
+
+def fake(answer: str, latency: float = 0.0) -> FakeChatModel:
+    return FakeChatModel(responses=[answer], latency=f"constant:{latency}")
+
+
+def routing(models, names, **kwargs) -> RoutingChatModel:
+    return RoutingChatModel(models=models, provider_names=names, tracker=LatencyTracker(min_samples=1), **kwargs)
+
+
+QUESTION = [HumanMessage(content="Điểm của tôi?")]
+
+
+def test_primary_answers_without_fallback():
+    model = routing([fake("primary"), fake("fallback")], ["gemini", "ollama"])
+    message = asyncio.run(model.ainvoke(QUESTION))
+    assert message.content == "primary"
+    assert message.response_metadata["routed_provider"] == "gemini"
+    assert model.tracker.stats()["gemini"]["wins"] == 1
+
+
+def test_provider_is_reported_per_response():
+    model = routing([FailingChatModel(), fake("fallback")], ["gemini", "ollama"])
+
+    async def run():
+        return await asyncio.gather(model.agenerate([QUESTION]), routing([fake("primary")], ["gemini"]).agenerate(
+            [QUESTION]))
+
+    fallback, primary = asyncio.run(run())
+
+    assert fallback.generations[0][0].generation_info["routed_provider"] == "ollama"
+    assert primary.generations[0][0].generation_info["routed_provider"] == "gemini"
+    assert "last_provider" not in RoutingChatModel.model_fields
+
+
+def test_failed_provider_falls_back_async():
+    model = routing([FailingChatModel(), fake("fallback")], ["gemini", "ollama"])
+    message = asyncio.run(model.ainvoke(QUESTION))
+    assert message.content == "fallback"
+    stats = model.tracker.stats()
+    assert stats["gemini"]["failures"] == 1
+    assert stats["ollama"]["wins"] == 1
+
+
+def test_failed_provider_falls_back_sync():
+    model = routing([FailingChatModel(), fake("fallback")], ["gemini", "ollama"])
+    assert model.invoke(QUESTION).content == "fallback"
+    assert model.tracker.stats()["gemini"]["failures"] == 1
+
+
+def test_timeout_falls_back():
+    model = routing([fake("slow", latency=1.0), fake("fallback")], ["gemini", "ollama"], timeout=0.05)
+    assert asyncio.run(model.ainvoke(QUESTION)).content == "fallback"
+    assert model.tracker.stats()["gemini"]["failures"] == 1
+
+
+def test_timed_out_sync_calls_hold_threads_until_they_finish(monkeypatch):
+    monkeypatch.setattr(routing_model, "_sync_executor", concurrent.futures.ThreadPoolExecutor(max_workers=1))
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(routing_model, "_sync_slots", slots)
+    release = threading.Event()
+    hung = routing([BlockingChatModel(release=release)], ["gemini"], timeout=0.05)
+
+    with pytest.raises(RuntimeError, match="TimeoutError"):
+        hung.invoke(QUESTION)
+    # Thread của lời gọi quá hạn vẫn bận: request mới lỗi ngay thay vì xếp hàng sau nó
+    with pytest.raises(RuntimeError, match="threads are busy"):
+        routing([fake("ok")], ["ollama"]).invoke(QUESTION)
+
+    release.set()
+    assert slots.acquire(timeout=5)
+    slots.release()
+    assert routing([fake("ok")], ["ollama"]).invoke(QUESTION).content == "ok"
+
+
+def test_all_providers_failing_raises():
+    model = routing([FailingChatModel(), FailingChatModel()], ["gemini", "ollama"])
+    with pytest.raises(RuntimeError, match="All LLM providers failed"):
+        asyncio.run(model.ainvoke(QUESTION))
+
+
+def test_hedge_uses_faster_provider_and_cancelled_loser_is_not_a_failure():
+    model = routing([fake("slow", latency=0.5), fake("hedged")], ["gemini", "ollama"],
+                    hedge=True, hedge_min_delay=0.02, timeout=5.0)
+    # p95 đã biết của gemini thấp hơn nhiều so với lần gọi chậm này
+    model.tracker.record("gemini", 0.02)
+
+    async def run():
+        message = await model.ainvoke(QUESTION)
+        # Cho task thua kịp xử lý việc bị huỷ
+        await asyncio.sleep(0.05)
+        return message
+
+    message = asyncio.run(run())
+    assert message.content == "hedged"
+    stats = model.tracker.stats()
+    assert stats["ollama"]["wins"] == 1
+    assert stats["gemini"]["failures"] == 0
+
+
+def test_hedge_delay_follows_p95():
+    tracker = LatencyTracker(min_samples=3)
+    model = RoutingChatModel(models=[fake("a")], provider_names=["gemini"], tracker=tracker,
+                             hedge_min_delay=0.1, timeout=10.0)
+    # Chưa đủ mẫu: chờ nửa timeout
+    assert model._hedge_delay("gemini") == 5.0
+    for seconds in (0.5, 1.0, 3.0):
+        tracker.record("gemini", seconds)
+    assert model._hedge_delay("gemini") == 3.0
+
+
+@pytest.mark.parametrize("stored", ["ollama, huggingface", ["ollama", " huggingface", ""]])
+def test_fallback_providers_from_string_or_list(monkeypatch, stored):
+    from llm.model_manager import model_manager
+
+    monkeypatch.setattr(model_manager, "_active_model_params", {"fallback_providers": stored})
+    assert model_manager.get_fallback_providers() == ["ollama", "huggingface"]
@@ -0,0 +1,34 @@
+import pytest
+
+from agent.runtime import DEFAULT_TENANT, RuntimeRegistry
+
+
+@pytest.fixture
+def tenants_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_TENANTS_DIR", str(tmp_path))
+    (tmp_path / "khoa-cntt" / "vector_db").mkdir(parents=True)
+    return tmp_path
+
+
+def test_tenant_without_index_is_rejected_without_building_a_runtime(tenants_dir):
+    registry = RuntimeRegistry(max_runtimes=1)
+    default = registry.get()
+
+    with pytest.raises(ValueError, match="has no index"):
+        registry.get(tenant="khoa-khac")
+    with pytest.raises(ValueError, match="Invalid tenant"):
+        registry.get(tenant="../khoa-cntt")
+
+    assert not (tenants_dir / "khoa-khac").exists()
+    # Runtime mặc định vẫn nóng
+    assert registry.get() is default
+
+
+def test_tenant_with_index_gets_its_own_runtime(tenants_dir):
+    registry = RuntimeRegistry()
+
+    runtime = registry.get(tenant="khoa-cntt")
+
+    assert runtime.key.tenant == "khoa-cntt"
+    assert registry.get(tenant="khoa-cntt") is runtime
+    assert registry.get(tenant=None).key.tenant == DEFAULT_TENANT
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import pytest
+
+from score.models import ScoreFilter
+from score.queries import (SCORE_QUERIES, group_by_student, score_query, score_row_to_dict, scores_many_query,
+                           sort_scores)
+
+SUBJECT = {"subject_name": "Toán cao cấp", "subject_credits": 3}
+
+
+def _record(**overrides):
+    record = {"score_text": "B", "score_first": Decimal("7.5"), "score_second": 8, "score_final": None,
+              "score_over_rall": Decimal("7.8"), "semester": "ki1-2024-2025", "student_code": "CT060101",
+              "subject_id": 1, "student_name": "Nguyễn Văn A", "student_class": "CT6A"}
+    record.update(overrides)
+    return record
+
+
+@pytest.mark.parametrize("filter, conditions, params", [
+    (ScoreFilter(), [], []),
+    (ScoreFilter(student_code="CT060101"), ["s.student_code = $1"], ["CT060101"]),
+    (ScoreFilter(semester="ki1-2024-2025", subject_id=7), ["s.semester = $1", "s.subject_id = $2"],
+     ["ki1-2024-2025", 7]),
+    (ScoreFilter(student_code="CT060101", semester="ki1-2024-2025", subject_id=7),
+     ["s.student_code = $1", "s.semester = $2", "s.subject_id = $3"], ["CT060101", "ki1-2024-2025", 7]),
+])
+def test_score_query_numbers_params_in_filter_order(filter, conditions, params):
+    sql, values = score_query(filter)
+
+    assert values == params
+    where = sql.split("WHERE", 1)[1].split("ORDER BY")[0] if "WHERE" in sql else ""
+    assert [c.strip() for c in where.split("AND") if c.strip()] == conditions
+
+
+def test_score_query_text_is_fixed_per_filter_combination():
+    first, _ = score_query(ScoreFilter(student_code="CT060101"))
+    second, _ = score_query(ScoreFilter(student_code="CT060102"))
+
+    # Cùng text để asyncpg dùng lại prepared statement
+    assert first is second
+    assert len(SCORE_QUERIES) == 8
+
+
+def test_score_row_to_dict_matches_model_dump_shape():
+    row = score_row_to_dict(_record(), SUBJECT)
+
+    assert row["score_first"] == 7.5 and isinstance(row["score_first"], float)
+    assert row["score_second"] == 8.0 and row["score_final"] is None
+    assert row["subject"] == {"subject_id": 1, "subject_name": "Toán cao cấp", "subject_credits": 3}
+    assert row["student"] == {"student_code": "CT060101", "student_name": "Nguyễn Văn A", "student_class": "CT6A"}
+
+
+def test_sort_scores_orders_by_semester_then_subject_name():
+    scores = [{"semester": "ki1-2023-2024", "subject_name": "A"},
+              {"semester": "ki2-2024-2025", "subject_name": "C"},
+              {"semester": "ki2-2024-2025", "subject_name": "B"},
+              {"semester": None, "subject_name": "A"}]
+
+    assert [(s["semester"], s["subject_name"]) for s in sort_scores(scores)] == [
+        ("ki2-2024-2025", "B"), ("ki2-2024-2025", "C"), ("ki1-2023-2024", "A"), (None, "A")]
+
+
+def test_scores_many_query_normalizes_and_dedups_student_codes():
+    sql, params = scores_many_query(student_codes=[" ct060102", "CT060101", "ct060101"], semester="ki1-2024-2025")
+
+    assert params == [["CT060101", "CT060102"], "ki1-2024-2025"]
+    assert "s.student_code = ANY($1::text[]) AND s.semester = $2" in sql
+    assert "ORDER BY s.student_code" in sql
+
+
+def test_scores_many_query_by_class():
+    sql, params = scores_many_query(student_class=" CT6A ")
+
+    assert params == ["CT6A"]
+    assert "st.student_class = $1" in sql and "$2" not in sql
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"student_codes": ["CT060101"], "student_class": "CT6A"},
+                                    {"student_codes": []}])
+def test_scores_many_query_requires_exactly_one_selector(kwargs):
+    with pytest.raises(ValueError):
+        scores_many_query(**kwargs)
+
+
+def test_group_by_student_skips_unknown_subjects():
+    records = [_record(subject_id=1, semester="ki1-2023-2024"), _record(subject_id=2),
+               _record(subject_id=99), _record(student_code="CT060102", student_name="Trần Thị B")]
+    subjects = {1: SUBJECT, 2: {"subject_name": "Vật lý", "subject_credits": 2}}
+
+    groups = group_by_student(records, subjects)
+
+    assert [g["student_code"] for g in groups] == ["CT060101", "CT060102"]
+    assert [s["subject_id"] for s in groups[0]["scores"]] == [2, 1]
+    assert groups[0]["scores"][0] == {"semester": "ki1-2024-2025", "subject_id": 2, "subject_name": "Vật lý",
+                                      "subject_credits": 2, "score_text": "B", "score_first": 7.5,
+                                      "score_second": 8.0, "score_final": None, "score_over_rall": 7.8}
@@ -0,0 +1,68 @@
+import json
+import threading
+
+from telemetry.recorder import JsonlExporter, Span, TraceRecorder
+
+
+def test_jsonl_exporter_writes_spans_from_background_thread(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = JsonlExporter(str(path))
+    recorder = TraceRecorder()
+    recorder.add_exporter(exporter)
+
+    with recorder.span("agent", kind="graph_node"):
+        with recorder.span("get_student_scores", kind="tool", student_code="CT060101"):
+            pass
+
+    assert exporter.flush()
+    spans = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [span["name"] for span in spans] == ["get_student_scores", "agent"]
+    assert spans[0]["parent_id"] == spans[1]["span_id"]
+    assert spans[0]["attributes"] == {"student_code": "CT060101"}
+
+
+def test_jsonl_export_does_not_write_on_calling_thread(tmp_path, monkeypatch):
+    exporter = JsonlExporter(str(tmp_path / "spans.jsonl"))
+    writers = []
+    original = Span.to_dict
+
+    def recording_to_dict(span):
+        writers.append(threading.current_thread().name)
+        return original(span)
+
+    monkeypatch.setattr(Span, "to_dict", recording_to_dict)
+    recorder = TraceRecorder()
+    recorder.add_exporter(exporter)
+    with recorder.span("retrieve", kind="retriever"):
+        pass
+    assert exporter.flush()
+    assert writers == ["trace-jsonl-exporter"]
+
+
+def test_summary_aggregates_by_step():
+    recorder = TraceRecorder()
+    for _ in range(3):
+        with recorder.span("agent", kind="graph_node"):
+            pass
+    try:
+        with recorder.span("action", kind="graph_node"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    steps = {step["name"]: step for step in recorder.summary()["steps"]}
+    assert steps["agent"]["count"] == 3
+    assert steps["action"]["errors"] == 1
+
+
+def test_recorder_flush_waits_for_queued_spans(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    recorder = TraceRecorder()
+    recorder.add_exporter(JsonlExporter(str(path)))
+    recorder.add_exporter(object())
+
+    for i in range(50):
+        with recorder.span(f"step-{i}"):
+            pass
+
+    assert recorder.flush()
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 50
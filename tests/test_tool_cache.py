@@ -0,0 +1,87 @@
+import importlib
+
+import pytest
+
+from score.tool_cache import ToolResultCache
+from telemetry import recorder
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # score.tool_cache là singleton được re-export trong score/__init__, không phải module
+    monkeypatch.setattr(importlib.import_module("score.tool_cache").time, "monotonic", clock)
+    return clock
+
+
+def test_key_normalizes_student_code_and_args(clock):
+    cache = ToolResultCache()
+    cache.set("get_student_scores", " ct060101 ", "scores", semester=" KI1-2024-2025 ", subject_id=None)
+
+    assert cache.get("get_student_scores", "CT060101", semester="ki1-2024-2025") == "scores"
+    assert cache.get("get_student_scores", "CT060102", semester="ki1-2024-2025") is None
+    assert cache.get("get_student_info", "CT060101", semester="ki1-2024-2025") is None
+
+
+def test_entries_expire_after_per_tool_ttl(clock):
+    cache = ToolResultCache(default_ttl=10, ttls={"get_student_info": 100})
+    cache.set("get_student_scores", "CT060101", "scores")
+    cache.set("get_student_info", "CT060101", "info")
+
+    clock.now += 11
+
+    assert cache.get("get_student_scores", "CT060101") is None
+    assert cache.get("get_student_info", "CT060101") == "info"
+    assert cache.stats()["entries"] == 1
+
+
+def test_zero_ttl_disables_cache(clock):
+    cache = ToolResultCache(default_ttl=0)
+    cache.set("get_student_scores", "CT060101", "scores")
+    assert cache.get("get_student_scores", "CT060101") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ToolResultCache(max_entries=2)
+    cache.set("get_student_scores", "CT060101", "a")
+    cache.set("get_student_scores", "CT060102", "b")
+    cache.get("get_student_scores", "CT060101")
+    cache.set("get_student_scores", "CT060103", "c")
+
+    assert cache.get("get_student_scores", "CT060102") is None
+    assert cache.get("get_student_scores", "CT060101") == "a"
+
+
+def test_invalidate_students_drops_only_their_entries(clock):
+    cache = ToolResultCache()
+    cache.set("get_student_scores", "CT060101", "a", semester="ki1-2024-2025")
+    cache.set("get_student_info", "CT060101", "info")
+    cache.set("get_student_scores", "CT060102", "b")
+
+    assert cache.invalidate_students(["ct060101"]) == 2
+    assert cache.get("get_student_info", "CT060101") is None
+    assert cache.get("get_student_scores", "CT060102") == "b"
+
+    cache.invalidate_all()
+    assert cache.stats()["entries"] == 0
+
+
+def test_hits_and_misses_are_counted(clock):
+    recorder.reset()
+    cache = ToolResultCache()
+    cache.get("get_student_scores", "CT060101")
+    cache.set("get_student_scores", "CT060101", "a")
+    cache.get("get_student_scores", "CT060101")
+
+    counters = recorder.summary()["counters"]
+    assert counters["tool_cache.get_student_scores.miss"] == 1
+    assert counters["tool_cache.get_student_scores.hit"] == 1
+    recorder.reset()
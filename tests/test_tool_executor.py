@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agent.tool_executor import ParallelToolExecutor, _parse_tool_timeouts
+
+
+@tool
+async def slow_async(seconds: float) -> str:
+    """Sleep asynchronously."""
+    await asyncio.sleep(seconds)
+    return f"async {seconds}"
+
+
+@tool
+def slow_sync(seconds: float) -> str:
+    """Sleep in a worker thread."""
+    time.sleep(seconds)
+    return f"sync {seconds}"
+
+
+@tool
+def broken(value: str) -> str:
+    """Always fail."""
+    raise ValueError("bad input")
+
+
+def calls(*specs):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(specs)])]}
+
+
+def run(executor, state):
+    start = time.perf_counter()
+    result = asyncio.run(executor(state))
+    return result["messages"], time.perf_counter() - start
+
+
+def test_tool_calls_run_concurrently_and_keep_order():
+    executor = ParallelToolExecutor([slow_async, slow_sync], default_timeout=5)
+    messages, elapsed = run(executor, calls(("slow_sync", {"seconds": 0.2}), ("slow_async", {"seconds": 0.2}),
+                                            ("slow_sync", {"seconds": 0.2})))
+    assert [m.tool_call_id for m in messages] == ["call_0", "call_1", "call_2"]
+    assert [m.content for m in messages] == ["sync 0.2", "async 0.2", "sync 0.2"]
+    assert elapsed < 0.5
+
+
+def test_timeout_only_fails_the_slow_tool():
+    executor = ParallelToolExecutor([slow_async, slow_sync], default_timeout=5, timeouts={"slow_async": 0.05})
+    messages, elapsed = run(executor, calls(("slow_async", {"seconds": 1}), ("slow_sync", {"seconds": 0.01})))
+    assert messages[0].status == "error"
+    assert "did not finish within 0.05s" in messages[0].content
+    assert messages[1].status == "success"
+    assert elapsed < 0.5
+
+
+def test_sync_tool_timeout_does_not_wait_for_the_thread():
+    executor = ParallelToolExecutor([slow_sync], default_timeout=0.05)
+    messages, elapsed = run(executor, calls(("slow_sync", {"seconds": 0.5})))
+    assert messages[0].status == "error"
+    assert elapsed < 0.4
+
+
+def test_errors_and_unknown_tools_become_error_messages():
+    executor = ParallelToolExecutor([broken], default_timeout=5)
+    messages, _ = run(executor, calls(("broken", {"value": "x"}), ("missing", {})))
+    assert messages[0].status == "error" and "bad input" in messages[0].content
+    assert messages[1].status == "error" and "not a valid tool" in messages[1].content
+
+
+def test_no_tool_calls():
+    executor = ParallelToolExecutor([broken])
+    assert asyncio.run(executor({"messages": [AIMessage(content="done")]})) == {"messages": []}
+
+
+def test_parse_tool_timeouts():
+    assert _parse_tool_timeouts("search_kma_regulations=45, get_student_scores=10,,bad") == {
+        "search_kma_regulations": 45.0, "get_student_scores": 10.0}